@@ -0,0 +1,270 @@
+"""
+Equivalence check and micro-benchmark for cleanup.clean_output.
+
+Each script used to clean its output with its own marker loop (copied below
+from before the merge as legacy_*). clean_output() keeps the same marker
+set per script but compiles it into one regex, so on every text - the
+test_results.csv outputs and originals, the input pledges, and the pledges
+wrapped in the usual model leaks - this checks:
+
+  1. the compiled scanner cuts exactly where a plain str.find() over the
+     set's markers does, for every script
+  2. each script's old rules give the same result, except where one of the
+     ALLOWED changes explains the difference: the old rules are re-run
+     with the allowed changes applied one at a time until they match
+  3. a leak-wrapped pledge comes back as the bare pledge (humanize_v2 set)
+
+Any mismatch in 1, an unexplained difference in 2 or a leak kept in 3 is
+listed and the script exits 1. Then the old loops and the compiled path
+are timed per script.
+
+Usage: python bench_cleanup.py [repeats]
+"""
+import sys
+import timeit
+
+import pandas as pd
+
+from cleanup import AMBIGUOUS, DEFAULT_SET, MARKER_SETS, QUOTES, clean_output, expand_markers, strip_leading
+
+RESULTS_CSV = "test_results.csv"
+PLEDGES_CSV = "final_pledges_merged.csv"
+PLEDGE_ROWS = None                    # Pledges read from PLEDGES_CSV (None = all)
+
+# Leaks seen in real runs, appended/prepended to clean text
+PREFIXES = ['', 'Rewritten: ', "Here's the rewritten text:\n\n", 'Your natural rewrite: "']
+SUFFIXES = ['', '"', '\n\n(Note: I kept the tone casual.)', ' (I aimed for a natural voice)',
+            '\n\nI hope this helps!', ' Let me know if you want changes.', '\n\nThis version (',
+            "\nHere's why this works: it sounds personal."]
+
+# Labels the old scripts removed wherever they appeared (now only at the start)
+REPLACED_LABELS = ('Rewritten:', 'Your version:', 'Your natural rewrite:', 'Rewrite:', 'Human version:',
+                   'Rewritten pledge:', 'Here is the rewritten text:')
+MASK = '⁣'                       # Invisible separator that hides a phrase from the old rules
+
+
+def split_at(result, markers):
+    for marker in markers:
+        if marker in result:
+            result = result.split(marker)[0].strip()
+    return result
+
+
+def legacy_humanize_v2(result):
+    result = split_at(result.strip(), ['Your natural rewrite:', 'Rewrite:', 'Here is', "Here's", '(Note',
+                                       '(I aimed', '(I tried', '(I used', 'I hope this', 'Let me know',
+                                       'Feel free', 'This version', 'The rewritten', '\n\n(',
+                                       '\n\nNote:', '\n\nI '])
+    result = result.strip('"\'')
+    if result.endswith('('):
+        result = result[:-1].strip()
+    return result
+
+
+def legacy_humanize_csv(result):
+    result = result.strip().replace('Rewritten:', '').strip()
+    result = result.replace('Here is the rewritten text:', '').strip()
+    result = result.strip('"').strip("'")
+    return split_at(result, ['(Note:', '\n\n', 'I aimed'])
+
+
+def legacy_optimize_prompts(result):
+    result = result.strip()
+    for prefix in ['Rewritten:', 'Your version:', 'Your natural rewrite:', 'Rewrite:', 'Human version:']:
+        result = result.replace(prefix, '').strip()
+    result = split_at(result, ['(Note:', '\n\n'])
+    return result.strip('"').strip("'")
+
+
+def legacy_generate_samples(result):
+    result = result.strip().replace('Rewritten pledge:', '').strip()
+    result = split_at(result, ['(Note'])
+    if '(I ' in result and result.count('(') == 1:
+        result = result.split('(I ')[0].strip()
+    result = split_at(result, ['\n\n', 'Here is', "Here's", 'I aimed', 'I tried', 'I used', 'I kept', 'Note:'])
+    return result.strip('"\'')
+
+
+def legacy_generate_test_samples(result):
+    result = split_at(result.strip(), ['Your natural rewrite:', 'Rewrite:', 'Here is', "Here's",
+                                       '(Note', '(I aimed', '(I tried', '\n\n(', '\n\nNote:'])
+    return result.strip('"\'')
+
+
+def legacy_quick_3_samples(result):
+    return split_at(result.strip(), ['Rewrite:', '(Note', 'Here is', '\n\n']).strip('"\'')
+
+
+def legacy_single_test(result):
+    result = result.strip()
+    for marker in ['Rewrite:', 'Here is', "Here's", '(Note', '(I aimed', '(I used', 'I tried']:
+        if marker in result:
+            result = result.split(marker)[0].strip() if marker != 'Rewrite:' else result.replace(marker, '').strip()
+    result = split_at(result, ['\n\n'])
+    return result.strip('"\'')
+
+
+def legacy_test_humanizer(result):
+    result = result.strip().replace('Rewritten:', '').strip()
+    return result.strip('"').strip("'")
+
+
+LEGACY = {
+    'humanize_v2': legacy_humanize_v2,
+    'humanize_csv': legacy_humanize_csv,
+    'optimize_prompts': legacy_optimize_prompts,
+    'generate_samples': legacy_generate_samples,
+    'generate_test_samples': legacy_generate_test_samples,
+    'quick_3_samples': legacy_quick_3_samples,
+    'single_test': legacy_single_test,
+    'test_humanizer': legacy_test_humanizer,
+}
+
+
+def mask(text, phrase, keep=lambda before: False):
+    """Hide `phrase` from the old rules, except where keep(preceding char) says not to"""
+    parts = text.split(phrase)
+    hidden = phrase[0] + MASK + phrase[1:]
+    out = parts[0]
+    for part in parts[1:]:
+        out += (phrase if out and keep(out[-1]) else hidden) + part
+    return out
+
+
+def mask_phrases(text, name):
+    """AMBIGUOUS phrases only cut after a line break or '('"""
+    for phrase in AMBIGUOUS:
+        if phrase in MARKER_SETS[name]:
+            text = mask(text, phrase, keep=lambda before: before in '\n(')
+    return text
+
+
+def mask_labels(text, name):
+    """Labels are only removed at the start"""
+    for label in REPLACED_LABELS:
+        if label not in MARKER_SETS[name]:
+            text = mask(text, label)
+    return text
+
+
+def cut_bracket_notes(text, name):
+    """'(I ' cuts even when the text has other brackets"""
+    return text.split('(I ')[0] if '(I ' in MARKER_SETS[name] else text
+
+
+# Changes from the old rules clean_output() is allowed to make, each a
+# rewrite of the input that makes the old rules behave like the new ones.
+# Quote/bracket tidying is always applied when comparing
+ALLOWED = [
+    ('quotes/bracket', lambda text, name: text),
+    ('leading intro', lambda text, name: strip_leading(text.strip())),
+    ('mid-sentence phrase', mask_phrases),
+    ('mid-text label', mask_labels),
+    ('(I with brackets', cut_bracket_notes),
+]
+
+
+def tidy(text):
+    """Wrapping quotes and a dangling '(' - the same tidying clean_output() does"""
+    text = text.replace(MASK, '').strip().strip(QUOTES).strip()
+    return text[:-1].strip() if text.endswith('(') else text
+
+
+def explain(name, text, new):
+    """Name of the first ALLOWED change that turns the old result into `new`, or None"""
+    for label, rewrite in ALLOWED:
+        text = rewrite(text, name)
+        if tidy(LEGACY[name](text)) == new:
+            return label
+    return None
+
+
+def reference_clean(text, name):
+    """clean_output() with str.find() over the marker literals instead of the compiled scanner"""
+    result = strip_leading(text.strip())
+    cuts = [pos for pos in (result.find(m) for m in expand_markers(MARKER_SETS[name])) if pos >= 0]
+    result = (result[:min(cuts)] if cuts else result).strip().strip(QUOTES).strip()
+    return result[:-1].strip() if result.endswith('(') else result
+
+
+def load_texts():
+    """(model outputs and originals, pledges) from the result and input CSVs"""
+    results = pd.read_csv(RESULTS_CSV)
+    outputs = results['humanized'].dropna().astype(str).tolist()
+    outputs += results['original'].dropna().astype(str).tolist()
+    try:
+        pledges = pd.read_csv(PLEDGES_CSV, usecols=['pledge'], nrows=PLEDGE_ROWS)['pledge'].dropna().astype(str).tolist()
+    except (FileNotFoundError, ValueError):
+        pledges = []
+    return outputs, [p.strip().strip(QUOTES).strip() for p in pledges]
+
+
+def show(label, rows, limit=3):
+    for text, old, new in rows[:limit]:
+        print(f"    {label}:\n      input: {text[-120:]!r}\n      old:   {old[-120:]!r}\n      new:   {new[-120:]!r}")
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    outputs, pledges = load_texts()
+    clean = [t for t in outputs[:len(outputs) // 2] + pledges if t and clean_output(t) == t]
+    wrapped = [(p + t + s, t) for t in clean for p in PREFIXES for s in SUFFIXES]
+    corpus = outputs + pledges + [text for text, _ in wrapped]
+    print(f"Corpus: {len(outputs)} test_results.csv texts, {len(pledges):,} pledges, {len(wrapped):,} leak-wrapped")
+    failed = False
+
+    # 1. Compiled scanner vs str.find
+    print("\n1. Compiled scanner vs str.find reference:")
+    for name in MARKER_SETS:
+        wrong = [(t, reference_clean(t, name), clean_output(t, name)) for t in corpus
+                 if clean_output(t, name) != reference_clean(t, name)]
+        failed |= bool(wrong)
+        print(f"  {'❌' if wrong else '✓'} {name:<22} {len(wrong)} mismatches")
+        show('mismatch', wrong)
+
+    # 2. Old rules vs new, every difference explained
+    print("\n2. Old rules vs clean_output (differences by allowed change):")
+    for name, legacy in LEGACY.items():
+        counts, unexplained = {}, []
+        for text in corpus:
+            new = clean_output(text, name)
+            if legacy(text) == new:
+                continue
+            label = explain(name, text, new)
+            if label is None:
+                unexplained.append((text, legacy(text), new))
+            else:
+                counts[label] = counts.get(label, 0) + 1
+        failed |= bool(unexplained)
+        summary = ', '.join(f"{label} {n:,}" for label, n in counts.items()) or 'identical'
+        print(f"  {'❌' if unexplained else '✓'} {name:<22} {summary}"
+              + (f", UNEXPLAINED {len(unexplained):,}" if unexplained else ''))
+        show('unexplained', unexplained)
+
+    # 3. Leak-wrapped pledges come back clean
+    leaked = [(text, clean_output(t), clean_output(text)) for text, t in wrapped if clean_output(text) != clean_output(t)]
+    failed |= bool(leaked)
+    print(f"\n3. {'❌' if leaked else '✓'} {len(wrapped):,} leak-wrapped texts: {len(leaked)} not cleaned back "
+          f"to the clean text ({DEFAULT_SET})")
+    show('leak kept', leaked)
+
+    # Timing: real text is what the scripts see; on leak-wrapped text the old
+    # rules often stop early because an intro cut everything
+    real, leaky = outputs + pledges, [text for text, _ in wrapped]
+    print(f"\nµs per text, old loop -> compiled (best of {repeats}):")
+    print(f"  {'script':<22} {'real outputs and pledges':>30} {'leak-wrapped':>26}")
+    for name, legacy in LEGACY.items():
+        cells = []
+        for texts in (real, leaky):
+            old = min(timeit.repeat(lambda: [legacy(t) for t in texts], number=1, repeat=repeats)) / len(texts)
+            new = min(timeit.repeat(lambda: [clean_output(t, name) for t in texts], number=1, repeat=repeats)) / len(texts)
+            cells.append(f"{old * 1e6:5.2f} -> {new * 1e6:5.2f} ({old / new:.1f}x)")
+        print(f"  {name:<22} {cells[0]:>30} {cells[1]:>26}")
+    emptied = sum(not legacy_humanize_v2(t) for t in leaky)
+    print(f"  (the old humanize_v2 rules return '' for {emptied / len(leaky):.0%} of the leak-wrapped texts)")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
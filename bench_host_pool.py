@@ -0,0 +1,150 @@
+"""
+Failover check for host_pool.HostPool against mock_ollama.py.
+
+Pass 1 runs ROWS rows over three hosts: a mock that stays up, a mock that is
+shut down after DIE_AFTER rows, and a port nothing listens on. Every row
+must come back exactly once with a result, the dead port must never be
+admitted and the dying host must be dropped.
+
+Pass 2 runs over two healthy mocks with a few rows that fail inside the
+work function (a per-row error, not a host fault). Those rows must use up
+their own attempts and be reported failed, every other row must finish,
+and no host may be dropped.
+
+Exits 1 if any check fails.
+
+Usage: python bench_host_pool.py [rows]
+"""
+import socket
+import sys
+import threading
+import time
+
+from host_pool import HostPool
+from mock_ollama import MockOllama, MODEL
+
+ROWS = 120
+DIE_AFTER = 30                        # Rows finished before the second mock is shut down
+BAD_ROWS = {7, 40, 41}                # Rows whose work function raises in pass 2
+TOKENS_PER_SEC = 2000
+
+
+class RowError(Exception):
+    """A failure that belongs to the row, not the host"""
+
+
+def free_port():
+    """A local port nothing is listening on"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def probe(client):
+    base = MODEL.split(':')[0]
+    return any(base in m.model for m in client.list().models)
+
+
+def generate(client, row):
+    response = client.generate(model=MODEL, prompt=f"Original pledge:\nRow {row} pledge text.\n\nHuman version:")
+    return response['response'], response['eval_count']
+
+
+def run_pool(urls, rows, work_fn, **kwargs):
+    """(results {row: (result, error)}, pool, log lines, seconds)"""
+    log = []
+    results = {}
+    duplicates = []
+    pool = HostPool(urls, probe, workers_per_host=2, cooldown=0.5, max_cooldown=2.0,
+                    log=log.append, **kwargs)
+    admitted = pool.probe_all()
+
+    def on_result(row, result, error):
+        if row in results:
+            duplicates.append(row)
+        results[row] = (result, error)
+
+    start = time.time()
+    if admitted:
+        pool.run(rows, work_fn, on_result)
+    pool.stop()
+    return results, duplicates, pool, log, time.time() - start
+
+
+def check(label, ok, detail=''):
+    print(f"  {'✓' if ok else '❌'} {label}" + (f" ({detail})" if detail else ''))
+    return ok
+
+
+def failover_pass(rows):
+    print(f"Pass 1: {rows} rows, one host dies after {DIE_AFTER} rows, one never up")
+    survivor = MockOllama(tokens_per_sec=TOKENS_PER_SEC, seed=1).start()
+    dying = MockOllama(tokens_per_sec=TOKENS_PER_SEC, seed=2).start()
+    dead_url = f"http://127.0.0.1:{free_port()}"
+    done = []
+
+    def work(client, row):
+        result = generate(client, row)
+        done.append(row)
+        if len(done) == DIE_AFTER:
+            threading.Thread(target=dying.stop, daemon=True).start()
+        return result
+
+    try:
+        results, duplicates, pool, log, elapsed = run_pool([survivor.url, dying.url, dead_url], range(rows), work)
+    finally:
+        survivor.stop()
+    hosts = {h.url: h for h in pool.hosts}
+    failed = [row for row, (_, error) in results.items() if error is not None]
+    ok = all([
+        check("every row finished once", len(results) == rows and not duplicates,
+              f"{len(results)}/{rows} rows, {len(duplicates)} reported twice"),
+        check("no row failed", not failed, f"{len(failed)} failed"),
+        check("dead port never admitted", hosts[dead_url].completed == 0 and not hosts[dead_url].healthy),
+        check("dying host dropped", not hosts[dying.url].healthy
+              and any(line.startswith(f"⚠ {dying.url} dropped") for line in log),
+              f"{hosts[dying.url].completed} rows done before it went"),
+        check("survivor took the rest", hosts[survivor.url].completed >= rows - hosts[dying.url].completed),
+    ])
+    print(f"  {rows / elapsed:.1f} rows/sec\n")
+    return ok
+
+
+def row_error_pass(rows):
+    print(f"Pass 2: {rows} rows over two healthy hosts, rows {sorted(BAD_ROWS)} always fail")
+    mocks = [MockOllama(tokens_per_sec=TOKENS_PER_SEC, seed=n).start() for n in (3, 4)]
+
+    def work(client, row):
+        if row in BAD_ROWS:
+            raise RowError(f"row {row} can't be processed")
+        return generate(client, row)
+
+    try:
+        results, duplicates, pool, log, elapsed = run_pool([m.url for m in mocks], range(rows), work)
+    finally:
+        for mock in mocks:
+            mock.stop()
+    failed = {row for row, (_, error) in results.items() if error is not None}
+    dropped = [line for line in log if ' dropped ' in line]
+    ok = all([
+        check("every row finished once", len(results) == rows and not duplicates,
+              f"{len(results)}/{rows} rows, {len(duplicates)} reported twice"),
+        check("only the bad rows failed", failed == BAD_ROWS, f"failed: {sorted(failed)}"),
+        check("bad rows used their own attempts", all(pool.attempts.get(row) == pool.max_attempts for row in BAD_ROWS)),
+        check("no host dropped", not dropped and all(h.healthy for h in pool.hosts),
+              dropped[0] if dropped else ''),
+    ])
+    print(f"  {rows / elapsed:.1f} rows/sec\n")
+    return ok
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    ok = failover_pass(rows)
+    ok = row_error_pass(rows) and ok
+    print("✓ Host pool checks passed" if ok else "❌ Host pool checks failed")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
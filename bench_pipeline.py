@@ -0,0 +1,308 @@
+"""
+End-to-end benchmark of humanize_v2's pipeline against mock_ollama.py.
+
+Real model time swamps everything else, so this runs the pipeline against
+the local mock (simulated latency and token rate, optionally replaying
+recorded responses) on a sample of INPUT_CSV in a temp directory, with the
+generation cache off and no pacing delay. It reports rows/sec, p50/p95/p99
+request latency, and the time spent in the pipeline's own work:
+
+  CSV I/O      - reading the input, writing the output and stats CSVs
+  cleanup      - clean_output() on every response
+  bookkeeping  - journal writes/fsyncs, stats, token budget, dedupe, scheduling
+
+Each of --repeat runs happens in a fresh interpreter (the pipeline keeps
+its stats at module level) and the medians are reported. Results are saved
+as a JSON baseline (--save) and every later run is compared against it; a
+drop in rows/sec or a rise in p95 latency or overhead per row beyond
+TOLERANCE exits with 1.
+
+    python bench_pipeline.py [--rows 300] [--concurrency 4] [--packed] [--replay test_results.csv]
+                             [--repeat 3] [--save]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from mock_ollama import MockOllama
+
+# ==================== CONFIGURATION ====================
+INPUT_CSV = "final_pledges_merged.csv"
+BASELINE_FILE = "bench_pipeline.baseline.json"
+ROWS = 300                            # Input rows per benchmark run
+REPEAT = 3                            # Runs per benchmark; medians are reported
+TOKENS_PER_SEC = 2000.0               # Mock speed - fast, so pipeline overhead is visible
+TOLERANCE = 0.15                      # Relative change counted as a regression
+MIN_CHANGE_MS_PER_ROW = 0.05          # Overhead changes smaller than this are noise
+
+# Categories timed inside the pipeline
+CATEGORIES = ('csv_io', 'cleanup', 'bookkeeping')
+
+
+class Timers:
+    """Wall time per category; nested timed calls only count once (outermost)"""
+
+    def __init__(self):
+        self.totals = dict.fromkeys(CATEGORIES, 0.0)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def wrap(self, category, func):
+        def timed(*args, **kwargs):
+            if getattr(self.local, 'depth', 0):
+                return func(*args, **kwargs)
+            self.local.depth = 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.local.depth = 0
+                with self.lock:
+                    self.totals[category] += elapsed
+        return timed
+
+    def patch(self, owner, name, category):
+        setattr(owner, name, self.wrap(category, getattr(owner, name)))
+
+
+def percentile(values, q):
+    return float(pd.Series(values).quantile(q)) if values else 0.0
+
+
+def instrument(pipeline, timers, latencies):
+    """Wrap the pipeline's CSV, cleanup and bookkeeping calls with timers"""
+    import journal
+    import packing
+    import run_stats
+
+    for name in ('load_or_resume', 'atomic_write_csv'):
+        timers.patch(pipeline, name, 'csv_io')
+    timers.patch(run_stats.RunStats, 'write_csv', 'csv_io')
+    timers.patch(pipeline, 'clean_output', 'cleanup')
+    timers.patch(packing, 'clean_output', 'cleanup')
+    for name in ('store', 'record_row', 'duplicate_groups', 'pick_representatives',
+                 'fan_out', 'scheduled', 'pending_rows'):
+        timers.patch(pipeline, name, 'bookkeeping')
+    for name in ('record_many', 'sync', 'close'):
+        timers.patch(journal.RowJournal, name, 'bookkeeping')
+
+    # Request latency: per row, or per pack in packed mode
+    record_row = pipeline.record_row
+
+    def record_latency(run, row, text, response, options, latency, occupation=None):
+        latencies.append(latency)
+        return record_row(run, row, text, response, options, latency, occupation)
+    pipeline.record_row = record_latency
+
+    run_pack = packing.Packer.run_pack
+
+    def timed_pack(self, texts, *args, **kwargs):
+        start = time.time()
+        try:
+            return run_pack(self, texts, *args, **kwargs)
+        finally:
+            latencies.append(time.time() - start)
+    packing.Packer.run_pack = timed_pack
+
+
+def run_bench(args):
+    """Run the pipeline once against the mock; returns the result dict"""
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    source = pd.read_csv(INPUT_CSV)
+    source.head(args.rows).to_csv(os.path.join(workdir, 'input.csv'), index=False)
+
+    mock = MockOllama(tokens_per_sec=args.tokens_per_sec, replay=args.replay,
+                      runaway_rate=args.runaway_rate, leak_rate=args.leak_rate, seed=args.seed)
+    mock.start()
+    # Both are read when ollama / gen_cache are imported, so set them first
+    os.environ['OLLAMA_HOST'] = mock.url
+    os.environ['HUMANIZER_CACHE'] = 'off'
+    import humanize_v2 as pipeline
+
+    pipeline.INPUT_CSV = os.path.join(workdir, 'input.csv')
+    pipeline.OUTPUT_CSV = os.path.join(workdir, 'output.csv')
+    pipeline.JOURNAL_FILE = os.path.join(workdir, 'output.journal.jsonl')
+    pipeline.STATS_CSV = os.path.join(workdir, 'output.stats.csv')
+    pipeline.METRICS_FILE = os.path.join(workdir, 'output.metrics.jsonl')
+    pipeline.FAILURES_FILE = os.path.join(workdir, 'output.failures.jsonl')
+    pipeline.PROMETHEUS_FILE, pipeline.PROMETHEUS_PORT = "", 0
+    pipeline.OLLAMA_HOSTS = []
+    pipeline.CONCURRENCY_SWEEP = []
+    pipeline.START_ROW = 0
+    pipeline.RATE_MODE, pipeline.DELAY_MIN, pipeline.DELAY_MAX = 'fixed', 0, 0
+    pipeline.CONCURRENCY = args.concurrency
+    pipeline.PACKED = args.packed
+
+    timers = Timers()
+    latencies = []
+    instrument(pipeline, timers, latencies)
+
+    log = io.StringIO()
+    start = time.perf_counter()
+    try:
+        if args.verbose:
+            pipeline.main()
+        else:
+            with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+                pipeline.main()
+    finally:
+        mock.stop()
+    wall = time.perf_counter() - start
+
+    output = pd.read_csv(pipeline.OUTPUT_CSV)
+    rows = int(output[pipeline.NEW_COLUMN].notna().sum())
+    shutil.rmtree(workdir, ignore_errors=True)
+    overhead = {k: round(v, 4) for k, v in timers.totals.items()}
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {
+            'rows': args.rows, 'concurrency': args.concurrency, 'packed': args.packed,
+            'tokens_per_sec': args.tokens_per_sec, 'replay': args.replay,
+            'runaway_rate': args.runaway_rate, 'leak_rate': args.leak_rate,
+        },
+        'rows_done': rows,
+        'requests': mock.requests,
+        'wall_s': round(wall, 3),
+        'rows_per_sec': round(rows / wall, 2) if wall else 0.0,
+        'latency_ms': {f'p{q}': round(percentile(latencies, q / 100) * 1000, 1) for q in (50, 95, 99)},
+        'overhead_s': overhead,
+        'overhead_ms_per_row': {k: round(v * 1000 / max(rows, 1), 3) for k, v in overhead.items()},
+    }
+
+
+def run_once(args):
+    """run_bench() in a fresh interpreter; returns its result dict"""
+    argv = [sys.executable, os.path.abspath(__file__), '--once', '--rows', str(args.rows),
+            '--concurrency', str(args.concurrency), '--tokens-per-sec', str(args.tokens_per_sec),
+            '--runaway-rate', str(args.runaway_rate), '--leak-rate', str(args.leak_rate),
+            '--seed', str(args.seed)]
+    if args.packed:
+        argv.append('--packed')
+    if args.replay:
+        argv += ['--replay', args.replay]
+    child = subprocess.run(argv, capture_output=True, text=True)
+    if child.returncode != 0:
+        raise RuntimeError(f"benchmark run failed:\n{child.stderr.strip()}")
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def median_result(results):
+    """One result with the median of every measured number across runs"""
+    merged = dict(results[-1], runs=len(results))
+    for key in ('rows_done', 'requests', 'wall_s', 'rows_per_sec'):
+        merged[key] = statistics.median(r[key] for r in results)
+    for key in ('latency_ms', 'overhead_s', 'overhead_ms_per_row'):
+        merged[key] = {k: statistics.median(r[key][k] for r in results) for k in results[-1][key]}
+    return merged
+
+
+def print_result(result):
+    latency = result['latency_ms']
+    print(f"✓ Median of {result.get('runs', 1)} runs: {result['rows_done']:.0f} rows, "
+          f"{result['requests']:.0f} requests in {result['wall_s']:.2f}s | {result['rows_per_sec']:.1f} rows/sec")
+    print(f"✓ Latency: p50 {latency['p50']:.0f}ms | p95 {latency['p95']:.0f}ms | p99 {latency['p99']:.0f}ms")
+    print("✓ Pipeline overhead:")
+    for category in CATEGORIES:
+        seconds = result['overhead_s'][category]
+        share = seconds / result['wall_s'] if result['wall_s'] else 0.0
+        print(f"    {category:<12} {seconds * 1000:>9.1f}ms  {result['overhead_ms_per_row'][category]:>7.3f}ms/row"
+              f"  {share:>6.1%} of wall")
+
+
+def compare(result, baseline, tolerance=TOLERANCE):
+    """Print the change against `baseline`; returns the list of regressions"""
+    if baseline.get('config') != result['config']:
+        print(f"⚠ Baseline config differs ({baseline.get('config')}) - numbers are not comparable")
+    metrics = [
+        ('rows/sec', baseline['rows_per_sec'], result['rows_per_sec'], True),
+        ('p50 latency ms', baseline['latency_ms']['p50'], result['latency_ms']['p50'], False),
+        ('p95 latency ms', baseline['latency_ms']['p95'], result['latency_ms']['p95'], False),
+        ('p99 latency ms', baseline['latency_ms']['p99'], result['latency_ms']['p99'], False),
+    ]
+    metrics += [(f'{c} ms/row', baseline['overhead_ms_per_row'][c], result['overhead_ms_per_row'][c], False)
+                for c in CATEGORIES]
+    gated = {'rows/sec', 'p95 latency ms', *(f'{c} ms/row' for c in CATEGORIES)}
+
+    print(f"\nvs baseline from {baseline.get('timestamp', '?')}:")
+    print(f"  {'metric':<22} {'baseline':>10} {'now':>10} {'change':>8}")
+    regressions = []
+    for name, old, new, higher_is_better in metrics:
+        change = (new - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = ""
+        noise = name.endswith('ms/row') and abs(new - old) < MIN_CHANGE_MS_PER_ROW
+        if name in gated and worse > tolerance and not noise:
+            flag = "  ⚠"
+            regressions.append(name)
+        print(f"  {name:<22} {old:>10.2f} {new:>10.2f} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the humanize pipeline against a mock Ollama")
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--packed', action='store_true')
+    parser.add_argument('--tokens-per-sec', type=float, default=TOKENS_PER_SEC)
+    parser.add_argument('--runaway-rate', type=float, default=0.0)
+    parser.add_argument('--leak-rate', type=float, default=0.0)
+    parser.add_argument('--replay', help="CSV of recorded responses for the mock to serve")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=REPEAT, help="runs to take the median of")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline JSON to compare against / save to")
+    parser.add_argument('--save', action='store_true', help="save this run as the new baseline")
+    parser.add_argument('--verbose', action='store_true', help="one run in this process with the pipeline's output")
+    parser.add_argument('--once', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.once:
+        print(json.dumps(run_bench(args)))
+        return 0
+
+    print("=" * 60)
+    print("PIPELINE BENCHMARK (mock Ollama)")
+    print("=" * 60)
+    if args.verbose:
+        result = median_result([run_bench(args)])
+    else:
+        results = []
+        for run in range(args.repeat):
+            results.append(run_once(args))
+            print(f"  run {run + 1}/{args.repeat}: {results[-1]['rows_per_sec']:.1f} rows/sec")
+        result = median_result(results)
+    print_result(result)
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f))
+    elif not args.save:
+        print(f"\n⚠ No baseline at {args.baseline} - run with --save to create one")
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"\n✓ Saved baseline to {args.baseline}")
+    if regressions:
+        print(f"\n❌ Regressed beyond {TOLERANCE:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
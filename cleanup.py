@@ -0,0 +1,165 @@
+"""
+Shared post-processing for model output.
+
+Every script used to carry its own marker list and walk it with one `in`
+check and `split` per marker. The lists are kept per script (MARKER_SETS,
+the same markers the scripts used to split on), but each one is compiled
+into a single regex shaped like a trie - the alternatives share their
+prefixes - so one scan finds the earliest marker and the text is cut there.
+
+Deliberate differences from the old loops (bench_cleanup.py checks that
+nothing else differs):
+  - echoed labels and intro lines at the very start ("Rewritten:", "Here's
+    the rewritten text:") are removed first, so a leaked intro no longer
+    wipes the whole answer
+  - AMBIGUOUS phrases, which real pledges use too ("Here's to...", "I used
+    to...", "at least I tried to..."), only cut at the start of a line or
+    right after "(" - never in the middle of a sentence
+  - curly quotes around the answer and a bracket left dangling by the cut
+    are removed in every script
+"""
+import re
+
+# Each script's truncation markers: everything from the first one onwards
+# is dropped
+MARKER_SETS = {
+    'humanize_v2': (
+        'Your natural rewrite:', 'Rewrite:', 'Here is', "Here's",
+        '(Note', '(I aimed', '(I tried', '(I used', 'I hope this',
+        'Let me know', 'Feel free', 'This version', 'The rewritten',
+        '\n\n(', '\n\nNote:', '\n\nI ',
+    ),
+    'humanize_csv': ('(Note:', '\n\n', 'I aimed'),
+    'optimize_prompts': ('(Note:', '\n\n'),
+    'generate_samples': ('(Note', '(I ', '\n\n', 'Here is', "Here's",
+                         'I aimed', 'I tried', 'I used', 'I kept', 'Note:'),
+    'generate_test_samples': ('Your natural rewrite:', 'Rewrite:', 'Here is', "Here's",
+                              '(Note', '(I aimed', '(I tried', '\n\n(', '\n\nNote:'),
+    'quick_3_samples': ('Rewrite:', '(Note', 'Here is', '\n\n'),
+    'single_test': ('Here is', "Here's", '(Note', '(I aimed', '(I used', 'I tried', '\n\n'),
+    'test_humanizer': (),
+}
+DEFAULT_SET = 'humanize_v2'
+
+# Markers that open ordinary pledge sentences as well (final_pledges_merged.csv
+# has "I used" 8x, "I tried" 6x, "Here's" 3x, "I kept" 3x, "Note:" 1x) - they
+# only count after a line break or "("
+AMBIGUOUS = ('Here is', "Here's", 'Note:', 'I aimed', 'I tried', 'I used', 'I kept')
+
+# Labels/intros echoed at the start of the output, removed before truncating
+LEADING_LABELS = (
+    'Your natural rewrite:', 'Rewritten pledge:', 'Rewritten:', 'Rewrite:',
+    'Your version:', 'Human version:', 'Rewritten version:',
+)
+
+# Markers that can go to Ollama as server-side `stop` sequences. Everything
+# here is cut by clean_output() anyway, wherever it appears; labels, "Here's"
+# and the bare blank line are left out because they also open a leaked intro
+# ("Here's the rewritten text:\n\n...") that strip_leading() removes
+STOP_SEQUENCES = (
+    '(Note', '\n\nNote:', '(I aimed', '(I tried', '(I used',
+    'I hope this', 'Let me know', 'Feel free',
+)
+
+# Straight and curly quotes wrapped around the whole answer
+QUOTES = '"\'“”‘’'
+
+
+def expand_markers(markers):
+    """The literal strings a marker set cuts at (AMBIGUOUS ones after '\\n' or '(')"""
+    literals = []
+    for marker in markers:
+        literals += [f'\n{marker}', f'({marker}'] if marker in AMBIGUOUS else [marker]
+    return tuple(dict.fromkeys(literals))
+
+
+def trie_pattern(literals):
+    """Regex matching any of `literals`, with shared prefixes factored out"""
+    trie = {}
+    for literal in literals:
+        node = trie
+        for ch in literal:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def emit(node):
+        end = '' in node
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 and not end else '(?:' + '|'.join(branches) + ')'
+        return body + ('?' if end else '')
+
+    return emit(trie)
+
+
+class MarkerScanner:
+    """
+    One marker set compiled into a trie regex. Most outputs contain none of
+    the characters the markers start with ('\n', '(' for the small sets), so
+    a str.find() per first character skips the regex scan for them.
+    """
+
+    def __init__(self, markers):
+        literals = expand_markers(markers)
+        self.heads = tuple(dict.fromkeys(literal[0] for literal in literals))
+        self.regex = re.compile(trie_pattern(literals)) if literals else None
+
+    def search(self, text):
+        """Earliest marker match in text, or None"""
+        for head in self.heads:
+            if head in text:
+                return self.regex.search(text)
+        return None
+
+
+SCANNERS = {name: MarkerScanner(markers) for name, markers in MARKER_SETS.items()}
+MARKER_RE = SCANNERS[DEFAULT_SET].regex
+LEADING_RE = re.compile(
+    r'^(?:\s*(?:'
+    r"Here(?:'s| is)\b[^\n:]{0,120}:"               # "Here's the rewritten text:"
+    r'|' + trie_pattern(LEADING_LABELS) +
+    r'))+\s*',
+    re.IGNORECASE,
+)
+# First letters of everything LEADING_RE can match - a cheap prefilter
+LEADING_HEADS = frozenset(ch for label in ('Here',) + LEADING_LABELS for ch in (label[0].lower(), label[0].upper()))
+
+
+def strip_leading(text):
+    """Remove echoed labels and intro lines from the start of the output"""
+    if text.lstrip()[:1] not in LEADING_HEADS:
+        return text
+    match = LEADING_RE.match(text)
+    return text[match.end():] if match else text
+
+
+def meta_text_started(text):
+    """
+    True once a streamed partial response has real content followed by a
+    cleanup marker - everything generated from here on would be cut anyway.
+    A leaked intro at the start does not count.
+    """
+    body = strip_leading(text.lstrip())
+    match = SCANNERS[DEFAULT_SET].search(body)
+    return match is not None and bool(body[:match.start()].strip().strip(QUOTES).strip())
+
+
+def clean_output(text, markers=DEFAULT_SET):
+    """
+    Full cleanup with one script's MARKER_SETS entry: leading labels, marker
+    truncation, wrapping quotes, dangling '('
+    """
+    if not isinstance(text, str):
+        return text
+    result = strip_leading(text.strip())
+    match = SCANNERS[markers].search(result)
+    if match:
+        result = result[:match.start()]
+    result = result.strip().strip(QUOTES).strip()
+
+    # Remove a bracket left dangling by the cut
+    if result.endswith('('):
+        result = result[:-1].strip()
+
+    return result
@@ -0,0 +1,110 @@
+"""
+Duplicate collapsing for the CSV pipeline.
+
+Pledges are normalized (curly quotes/apostrophes to straight, dashes to
+hyphens, whitespace collapsed, lower-cased) and rows with the same normalized
+text share one group id. The pipeline then generates once per group and fans
+the result out to every row in it.
+
+mask_tokens() widens the groups to pledges that differ only in the
+occupation name or a number ("As a Doctor, I will..." / "As a Farmer, I
+will..."). A copied rewrite then gets the row's own occupation and numbers
+put back; a row where that cannot be done safely is left for its own
+generation, so a rewrite never carries another row's occupation.
+"""
+import re
+
+import pandas as pd
+
+# Typographic characters that differ between otherwise identical exports
+_TRANSLATE = str.maketrans({
+    '‘': "'", '’': "'", '‚': "'", '‛': "'", '′': "'",
+    '“': '"', '”': '"', '„': '"', '‟': '"', '″': '"',
+    '–': '-', '—': '-', '−': '-',
+    ' ': ' ', '…': '...',
+})
+
+
+def normalize_text(series):
+    """Vectorized normalization key for a Series of texts (NaN stays NaN)"""
+    s = series.astype('string')
+    s = s.str.translate(_TRANSLATE)
+    s = s.str.replace(r'\s+', ' ', regex=True).str.strip().str.lower()
+    return s.mask(s == '')
+
+
+def mask_tokens(series, occupations=()):
+    """
+    (masked text, tokens) per row: every occupation name and number is
+    replaced by '#' and the replaced strings are kept in order as a tuple
+    """
+    names = sorted({str(o).strip() for o in occupations if str(o).strip()}, key=len, reverse=True)
+    pattern = r'\b(?:' + ''.join(f'{re.escape(n)}|' for n in names) + r'\d+(?:[.,]\d+)*)\b'
+    text = series.astype('string')
+    tokens = text.str.findall(f'(?i){pattern}').map(lambda t: tuple(t) if isinstance(t, list) else ())
+    return text.str.replace(f'(?i){pattern}', '#', regex=True), tokens
+
+
+def substitute(value, source, target):
+    """
+    `value` (written for a row with tokens `source`) with each token that
+    differs replaced by the row's own from `target`; None if a differing
+    token is missing from `value` or maps to two different tokens
+    """
+    mapping = {}
+    for old, new in zip(source, target):
+        if old.lower() != new.lower() and mapping.setdefault(old.lower(), new) != new:
+            return None
+    if not mapping:
+        return value
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(old) for old in mapping) + r')\b', re.IGNORECASE)
+    if {m.lower() for m in pattern.findall(value)} != set(mapping):
+        return None
+    return pattern.sub(lambda m: mapping[m.group(0).lower()], value)
+
+
+def duplicate_groups(series):
+    """Group id per row (rows with equal normalized text share an id; blanks get -1)"""
+    codes, _ = pd.factorize(normalize_text(series))
+    return pd.Series(codes, index=series.index)
+
+
+def pick_representatives(groups, pending):
+    """
+    Split pending row indices into (representatives, followers): one row per
+    group gets a model call, the rest wait for its result. Blank rows (-1)
+    are always their own representative.
+    """
+    pending_groups = groups.loc[pending]
+    blank = pending_groups == -1
+    first = ~pending_groups.duplicated() | blank
+    reps = pending_groups.index[first].tolist()
+    followers = pending_groups.index[~first].tolist()
+    return reps, followers
+
+
+def fan_out(df, groups, column, tokens=None):
+    """
+    Copy each group's first finished value to rows of that group that are
+    still empty. With `tokens` (from mask_tokens) the copy gets the row's
+    own tokens substituted in, and rows where substitute() fails stay empty.
+    Returns the filled values as a Series indexed by row.
+    """
+    values = df[column]
+    text = values.astype('string').str.strip()
+    has_value = (text.notna() & (text != '')).fillna(False).astype(bool)
+    done = has_value & (groups != -1)
+    missing = ~has_value & (groups != -1)
+    if not missing.any() or not done.any():
+        return pd.Series(dtype=object)
+    firsts = done[done].groupby(groups[done]).head(1).index
+    source = pd.Series(firsts, index=groups[firsts])
+    filled = groups[missing].map(source).dropna().astype(int)
+    if tokens is None:
+        filled = filled.map(values)
+    else:
+        filled = pd.Series({i: substitute(values[src], tokens[src], tokens[i])
+                            for i, src in filled.items()}, dtype=object)
+    filled = filled[filled.notna()]
+    df.loc[filled.index, column] = filled
+    return filled
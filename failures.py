@@ -0,0 +1,234 @@
+"""
+Failure handling for the humanize scripts.
+
+A row whose generation fails is no longer filled with its original text -
+that made resume treat it as done. It is left empty and appended to a
+JSONL failure queue with the error class; a later success (a normal resume
+or a --retry-failed pass that reprocesses only queued rows) marks it
+resolved.
+
+Before a row is given up on, its request is retried with exponential
+backoff and full jitter. A circuit breaker shared by all requests opens
+after BREAKER_THRESHOLD consecutive failures and pauses dispatch while the
+server is down, re-trying with a single probe request after a cooldown
+that doubles for as long as the probes keep failing.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import httpx
+import ollama
+
+# ==================== CONFIGURATION ====================
+RETRIES = 3                           # Extra attempts per row after the first failure
+BACKOFF_BASE = 1.0                    # Seconds; attempt n waits up to BACKOFF_BASE * 2**n
+BACKOFF_MAX = 30.0
+BREAKER_THRESHOLD = 5                 # Consecutive failures that open the circuit
+BREAKER_COOLDOWN = 10.0               # First pause while open; doubles while probes fail
+BREAKER_MAX_COOLDOWN = 300.0
+
+# What a model call raises when the server or the connection fails, as
+# opposed to a bug in the calling code
+MODEL_ERRORS = (ollama.ResponseError, httpx.HTTPError, ConnectionError, TimeoutError)
+
+
+def error_class(error):
+    """Error class for the failure queue, with the HTTP status when Ollama sent one"""
+    name = type(error).__name__
+    status = getattr(error, 'status_code', None)
+    return f"{name}({status})" if status not in (None, -1) else name
+
+
+def is_transient(error):
+    """False for request errors a retry cannot fix (e.g. model not found)"""
+    if isinstance(error, ollama.ResponseError):
+        status = getattr(error, 'status_code', -1)
+        return status == -1 or status >= 500 or status in (408, 429)
+    return True
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures -> one probe -> closed or open again"""
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN,
+                 max_cooldown=BREAKER_MAX_COOLDOWN, log=print):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.log = log
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def _delay(self):
+        """Seconds the caller must wait before sending (0 = go ahead)"""
+        with self.lock:
+            if self.failures < self.threshold:
+                return 0.0
+            now = time.time()
+            if now < self.open_until:
+                return self.open_until - now
+            if self.probing:
+                return min(1.0, self.cooldown)    # A probe is out; check back shortly
+            self.probing = True                   # This caller is the probe
+            return 0.0
+
+    def wait(self):
+        """Block while the circuit is open"""
+        while (delay := self._delay()) > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        while (delay := self._delay()) > 0:
+            await asyncio.sleep(delay)
+
+    def record(self, ok):
+        """Result of one request"""
+        with self.lock:
+            if ok:
+                if self.failures >= self.threshold:
+                    self.log("✓ Ollama is answering again - resuming dispatch")
+                self.failures = 0
+                self.cooldown = self.base_cooldown
+                self.probing = False
+                return
+            self.failures += 1
+            if self.failures < self.threshold:
+                return
+            if self.probing or self.failures == self.threshold:
+                if self.probing:
+                    self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+                self.probing = False
+                self.opened += 1
+                self.open_until = time.time() + self.cooldown
+                self.log(f"⚠ Circuit open after {self.failures} consecutive failures - "
+                         f"pausing dispatch for {self.cooldown:.0f}s")
+
+
+def call_with_retry(fn, breaker=None, retries=RETRIES, on_error=None):
+    """fn() with backoff retries on transient errors; returns (result, attempts) or raises"""
+    for attempt in range(retries + 1):
+        if breaker:
+            breaker.wait()
+        try:
+            result = fn()
+        except Exception as e:
+            if breaker:
+                breaker.record(False)
+            if on_error:
+                on_error(e)
+            if attempt == retries or not is_transient(e):
+                e.attempts = attempt + 1
+                raise
+            time.sleep(backoff_delay(attempt))
+            continue
+        if breaker:
+            breaker.record(True)
+        return result, attempt + 1
+
+
+async def call_with_retry_async(fn, breaker=None, retries=RETRIES, on_error=None):
+    """call_with_retry() for a coroutine function"""
+    for attempt in range(retries + 1):
+        if breaker:
+            await breaker.wait_async()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if breaker:
+                breaker.record(False)
+            if on_error:
+                on_error(e)
+            if attempt == retries or not is_transient(e):
+                e.attempts = attempt + 1
+                raise
+            await asyncio.sleep(backoff_delay(attempt))
+            continue
+        if breaker:
+            breaker.record(True)
+        return result, attempt + 1
+
+
+class FailureQueue:
+    """JSONL queue of failed rows; later entries for a row win on replay"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._failed = None                   # row -> latest failure entry, read on first use
+        self.recorded = 0
+
+    @property
+    def failed(self):
+        if self._failed is None:
+            self._failed = self._replay()
+        return self._failed
+
+    def _replay(self):
+        failed = {}
+        if not os.path.exists(self.path):
+            return failed
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue                  # Torn last line after a crash
+                if entry.get('resolved'):
+                    failed.pop(entry['row'], None)
+                else:
+                    failed[entry['row']] = entry
+        return failed
+
+    def _append(self, entry):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def record(self, row, error, attempts=None):
+        """Queue a row that failed every attempt"""
+        entry = {'row': int(row), 'error': error_class(error), 'message': str(error)[:300],
+                 'attempts': attempts or getattr(error, 'attempts', 1), 'time': round(time.time(), 3)}
+        with self.lock:
+            self.failed[entry['row']] = entry
+            self.recorded += 1
+            self._append(entry)
+
+    def resolve(self, row):
+        """Mark a queued row as done (no-op for rows that never failed)"""
+        with self.lock:
+            if self.failed.pop(int(row), None) is not None:
+                self._append({'row': int(row), 'resolved': True, 'time': round(time.time(), 3)})
+
+    def __contains__(self, row):
+        with self.lock:
+            return int(row) in self.failed
+
+    def rows(self):
+        with self.lock:
+            return set(self.failed)
+
+    def report(self):
+        """Summary line of the rows still queued"""
+        with self.lock:
+            entries = list(self.failed.values())
+        if not entries:
+            return "Failure queue: empty"
+        counts = {}
+        for entry in entries:
+            counts[entry['error']] = counts.get(entry['error'], 0) + 1
+        kinds = ", ".join(f"{name} x{n}" for name, n in sorted(counts.items(), key=lambda kv: -kv[1]))
+        return f"Failure queue: {len(entries)} rows ({kinds}) in {self.path} - rerun with --retry-failed"
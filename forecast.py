@@ -0,0 +1,122 @@
+"""
+Measured ETA for the humanize scripts.
+
+Per-row cost is modelled as a + b * input_tokens and fitted by exponentially
+weighted least squares on the rows actually generated (cache hits and blank
+rows cost nothing and are not observed), so the estimate follows the server
+as it speeds up or slows down. Wall time is the summed row cost divided by
+how many requests were effectively in flight over the last WINDOW rows -
+which also folds in pacing delays and idle time.
+
+The remaining time is predicted for the rows still pending, from their own
+input lengths, rather than from a fixed seconds-per-row guess.
+"""
+import threading
+import time
+from collections import deque
+
+from token_budget import estimate_tokens
+
+# ==================== CONFIGURATION ====================
+ALPHA = 0.05                          # Weight of the newest row in the running estimate
+MIN_ROWS = 5                          # Rows to observe before forecasting
+WINDOW = 50                           # Recent rows used to measure requests in flight
+
+
+def format_duration(seconds):
+    """Compact duration: 45s, 12.3 min, 2.4 h"""
+    if seconds < 90:
+        return f"{seconds:.0f}s"
+    if seconds < 5400:
+        return f"{seconds / 60:.1f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+class CostForecaster:
+    """EWMA per-row cost model plus measured parallelism; safe to feed from worker threads"""
+
+    def __init__(self, alpha=ALPHA, min_rows=MIN_ROWS, window=WINDOW):
+        self.alpha = alpha
+        self.min_rows = min_rows
+        self.observed = 0
+        self.mean_x = self.mean_y = 0.0
+        self.var_x = self.cov_xy = 0.0
+        self.recent = deque(maxlen=window)        # (start, finish) of recent live rows
+        self.pending = {}                         # row -> input tokens
+        self.pending_tokens = 0
+        self.lock = threading.Lock()
+
+    def add_pending(self, df, rows, column):
+        """Rows about to be processed (their input lengths drive the forecast)"""
+        with self.lock:
+            for i in rows:
+                tokens = estimate_tokens(df.at[i, column])
+                self.pending_tokens += tokens - self.pending.get(i, 0)
+                self.pending[i] = tokens
+
+    def done(self, row):
+        """A row finished (generated, cached or blank)"""
+        with self.lock:
+            self.pending_tokens -= self.pending.pop(row, 0)
+
+    def observe(self, text, seconds):
+        """Feed the model time of one generated (non-cached) row"""
+        x, y = estimate_tokens(text), seconds
+        now = time.time()
+        with self.lock:
+            a = self.alpha if self.observed else 1.0
+            dx, dy = x - self.mean_x, y - self.mean_y
+            self.mean_x += a * dx
+            self.mean_y += a * dy
+            self.var_x = (1 - a) * (self.var_x + a * dx * dx)
+            self.cov_xy = (1 - a) * (self.cov_xy + a * dx * dy)
+            self.observed += 1
+            self.recent.append((now - seconds, now))
+
+    def coefficients(self):
+        """(seconds per row, seconds per input token)"""
+        slope = max(self.cov_xy / self.var_x, 0.0) if self.var_x > 1e-9 else 0.0
+        intercept = self.mean_y - slope * self.mean_x
+        if intercept < 0:                         # Keep every prediction positive
+            slope, intercept = self.mean_y / self.mean_x if self.mean_x else 0.0, 0.0
+        return intercept, slope
+
+    def in_flight(self):
+        """Average requests in flight over the recent window (< 1 when pacing or idle)"""
+        with self.lock:
+            recent = list(self.recent)
+        if len(recent) < 2:
+            return 1.0
+        wall = time.time() - min(s for s, _ in recent)
+        busy = sum(f - s for s, f in recent)
+        return busy / wall if wall > 0 else 1.0
+
+    def ready(self):
+        return self.observed >= self.min_rows
+
+    def remaining(self):
+        """Forecast seconds for the pending rows, or None before MIN_ROWS observations"""
+        if not self.ready():
+            return None
+        intercept, slope = self.coefficients()
+        busy = len(self.pending) * intercept + self.pending_tokens * slope
+        return busy / max(self.in_flight(), 1e-3)
+
+    def rows_per_sec(self):
+        """Forecast throughput for rows of average length"""
+        cost = sum(c * x for c, x in zip(self.coefficients(), (1, self.mean_x)))
+        return self.in_flight() / cost if cost > 0 else 0.0
+
+    def eta(self):
+        """Short ETA for progress bars"""
+        remaining = self.remaining()
+        return "ETA …" if remaining is None else f"ETA {format_duration(remaining)}"
+
+    def summary(self):
+        """One-line forecast for batch summaries and dry runs"""
+        if not self.ready():
+            return f"Forecast: {len(self.pending)} rows left (needs {self.min_rows} generated rows to estimate)"
+        intercept, slope = self.coefficients()
+        return (f"Forecast: {len(self.pending)} rows left ≈ {format_duration(self.remaining())} | "
+                f"{intercept:.2f}s/row + {slope * 1000:.1f}ms/input token | "
+                f"{self.in_flight():.1f} in flight | {self.rows_per_sec():.2f} rows/sec")
@@ -0,0 +1,300 @@
+"""
+Persistent content-addressed cache for Ollama generations.
+
+Entries are keyed by a SHA-256 of (model, prompt template, sampling options
+including any seed, input text, extra request fields), so re-running a script
+after a crash or on overlapping CSVs only pays for text the model has not seen
+with those exact settings. The raw response is stored, not the cleaned one, so
+changing the cleanup rules never needs a cache flush.
+
+num_predict is left out of the key: a response that finished on its own is
+valid for any budget, and one cut at its budget (done_reason 'length') is
+only reused when the new budget is no bigger.
+
+Set HUMANIZER_CACHE to a path to move the database, or to "off" to disable it.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import ollama
+
+# ==================== CONFIGURATION ====================
+CACHE_PATH = os.environ.get('HUMANIZER_CACHE', 'generation_cache.sqlite')
+MAX_ENTRIES = 200_000                 # Least recently used entries beyond this are evicted
+MAX_AGE_DAYS = 90                     # Entries unused for longer than this are evicted
+EVICT_EVERY = 1000                    # Run eviction after this many writes
+
+# Response fields worth keeping (text plus the timing/token counters)
+RESPONSE_FIELDS = (
+    'response', 'done_reason', 'eval_count', 'eval_duration',
+    'prompt_eval_count', 'prompt_eval_duration', 'load_duration', 'total_duration',
+)
+
+# Options that only limit the response, not what it says (see module docstring)
+KEY_IGNORED_OPTIONS = ('num_predict',)
+# Request fields that never change the response (how long the model stays loaded)
+KEY_IGNORED_FIELDS = ('keep_alive',)
+
+
+class GenerationCache:
+    """SQLite-backed cache of raw generate() responses, safe to share across threads"""
+
+    def __init__(self, path=CACHE_PATH, max_entries=MAX_ENTRIES, max_age_days=MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS generations (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                value TEXT,
+                created_at REAL,
+                used_at REAL,
+                hit_count INTEGER DEFAULT 0
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_used_at ON generations(used_at)")
+        self.db.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(model, template, text, options=None, **extra):
+        """Hash of everything that determines the model output"""
+        payload = {
+            'model': model,
+            'template': template,
+            'text': str(text),
+            'options': {k: v for k, v in (options or {}).items() if k not in KEY_IGNORED_OPTIONS},
+            'extra': {k: v for k, v in extra.items() if v is not None and k not in KEY_IGNORED_FIELDS},
+        }
+        blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    def get(self, key, num_predict=None):
+        """Cached response dict, or None (also None if it was cut below num_predict)"""
+        with self.lock:
+            row = self.db.execute("SELECT value FROM generations WHERE key = ?", (key,)).fetchone()
+            value = json.loads(row[0]) if row is not None else None
+            if value is None or (num_predict and value.get('done_reason') == 'length'
+                                 and (value.get('eval_count') or 0) < num_predict):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute(
+                "UPDATE generations SET used_at = ?, hit_count = hit_count + 1 WHERE key = ?",
+                (time.time(), key))
+            self.db.commit()
+        value['cached'] = True
+        return value
+
+    def put(self, key, model, response):
+        """Store the interesting fields of a generate() response"""
+        value = {f: response.get(f) for f in RESPONSE_FIELDS if response.get(f) is not None}
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO generations (key, model, value, created_at, used_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, json.dumps(value, ensure_ascii=False), now, now))
+            self.db.commit()
+            self.writes += 1
+            due = self.writes % EVICT_EVERY == 0
+        if due:
+            self.evict()
+        return value
+
+    def evict(self):
+        """Drop entries unused for MAX_AGE_DAYS, then the least recently used over MAX_ENTRIES"""
+        with self.lock:
+            cur = self.db.execute("DELETE FROM generations WHERE used_at < ?",
+                                  (time.time() - self.max_age,))
+            removed = cur.rowcount
+            cur = self.db.execute("""
+                DELETE FROM generations WHERE key IN (
+                    SELECT key FROM generations ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                )""", (self.max_entries,))
+            removed += cur.rowcount
+            self.db.commit()
+        return removed
+
+    def stats(self):
+        with self.lock:
+            entries, lifetime_hits = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hit_count), 0) FROM generations").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'lifetime_hits': lifetime_hits,
+            'size_bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+    def report(self):
+        """One-line summary for end-of-run output"""
+        s = self.stats()
+        return (f"Cache: {s['hits']} hits / {s['misses']} misses ({s['hit_rate']:.0%} hit rate) | "
+                f"{s['entries']:,} entries, {s['size_bytes'] / 1e6:.1f} MB")
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache instance, or None when HUMANIZER_CACHE=off"""
+    global _cache
+    if _cache is None and CACHE_PATH.lower() != 'off':
+        with _cache_lock:
+            # Worker threads can get here together; only the first opens the database
+            if _cache is None:
+                _cache = GenerationCache()
+    return _cache
+
+
+def _stream_state():
+    return {'parts': [], 'tokens': 0, 'start': time.perf_counter(), 'first': None, 'final': None}
+
+
+def _stream_step(state, chunk, early_stop):
+    """Consume one streamed chunk; True when the stream should end"""
+    if chunk.get('done'):
+        state['final'] = chunk
+        return True
+    state['parts'].append(chunk.get('response') or '')
+    state['tokens'] += 1
+    if state['first'] is None:
+        state['first'] = time.perf_counter()
+    return early_stop(''.join(state['parts']))
+
+
+def _stream_result(state):
+    """Response dict for a finished or cancelled stream"""
+    final = state['final']
+    if final is not None:
+        value = {f: final.get(f) for f in RESPONSE_FIELDS if final.get(f) is not None}
+        value['response'] = ''.join(state['parts'])
+        return value
+    # Cancelled client-side: Ollama sends no counters, so count the chunks (one token each)
+    now = time.perf_counter()
+    return {
+        'response': ''.join(state['parts']),
+        'done_reason': 'early_stop',
+        'eval_count': state['tokens'],
+        'eval_duration': int((now - (state['first'] or now)) * 1e9),
+        'total_duration': int((now - state['start']) * 1e9),
+    }
+
+
+def stream_generate(client, model, prompt, options=None, early_stop=None, **kwargs):
+    """
+    generate() with stream=True that stops reading, and closes the connection
+    so Ollama aborts the request, as soon as early_stop(text_so_far) is true.
+    Returns the same fields as a non-streamed response; done_reason is
+    'early_stop' when the client cancelled.
+    """
+    state = _stream_state()
+    stream = client.generate(model=model, prompt=prompt, options=options, stream=True, **kwargs)
+    try:
+        for chunk in stream:
+            if _stream_step(state, chunk, early_stop):
+                break
+    finally:
+        stream.close()
+    return _stream_result(state)
+
+
+async def stream_generate_async(client, model, prompt, options=None, early_stop=None, **kwargs):
+    """stream_generate() for an ollama.AsyncClient"""
+    state = _stream_state()
+    stream = await client.generate(model=model, prompt=prompt, options=options, stream=True, **kwargs)
+    try:
+        async for chunk in stream:
+            if _stream_step(state, chunk, early_stop):
+                break
+    finally:
+        await stream.aclose()
+    return _stream_result(state)
+
+
+def cached_generate(model, template, text, options=None, client=None, on_miss=None,
+                    early_stop=None, refresh=False, **kwargs):
+    """
+    ollama.generate(model, template.format(text=text), options) behind the cache.
+    Returns a dict with 'response' and the token/timing counters; 'cached' is
+    True when no model call was made. on_miss() runs just before a real call
+    (e.g. a rate limiter's wait), so cache hits are never throttled.
+    With early_stop the call is streamed and cut short (see stream_generate);
+    those truncated responses are cached under their own key.
+    refresh=True skips the lookup and replaces the entry (e.g. regenerating a
+    row whose cached answer failed the quality gate).
+    """
+    cache = get_cache()
+    key = None
+    if cache:
+        key = GenerationCache.make_key(model, template, text, options,
+                                       early_stop=True if early_stop else None, **kwargs)
+        hit = None if refresh else cache.get(key, (options or {}).get('num_predict'))
+        if hit is not None:
+            return hit
+
+    if on_miss:
+        on_miss()
+    prompt = template.format(text=text)
+    if early_stop:
+        response = stream_generate(client or ollama, model, prompt, options, early_stop, **kwargs)
+    else:
+        response = (client or ollama).generate(model=model, prompt=prompt, options=options, **kwargs)
+    if cache:
+        value = cache.put(key, model, response)
+    else:
+        value = {f: response.get(f) for f in RESPONSE_FIELDS if response.get(f) is not None}
+    value['cached'] = False
+    return value
+
+
+async def cached_generate_async(client, model, template, text, options=None, on_miss=None,
+                                early_stop=None, refresh=False, **kwargs):
+    """cached_generate() for an ollama.AsyncClient; on_miss is a coroutine function"""
+    cache = get_cache()
+    key = None
+    if cache:
+        key = GenerationCache.make_key(model, template, text, options,
+                                       early_stop=True if early_stop else None, **kwargs)
+        hit = None if refresh else cache.get(key, (options or {}).get('num_predict'))
+        if hit is not None:
+            return hit
+
+    if on_miss:
+        await on_miss()
+    prompt = template.format(text=text)
+    if early_stop:
+        response = await stream_generate_async(client, model, prompt, options, early_stop, **kwargs)
+    else:
+        response = await client.generate(model=model, prompt=prompt, options=options, **kwargs)
+    if cache:
+        value = cache.put(key, model, response)
+    else:
+        value = {f: response.get(f) for f in RESPONSE_FIELDS if response.get(f) is not None}
+    value['cached'] = False
+    return value
+
+
+def cache_report():
+    """Summary line if the cache is enabled, else an empty string"""
+    cache = get_cache()
+    return cache.report() if cache else ""
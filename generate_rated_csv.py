@@ -2,13 +2,31 @@
 Generate rated CSVs from manual review results.
 This script encodes the quality ratings determined through manual reading
 of each entry and outputs CSVs with quality_rating column.
+
+The Clean sheet is streamed once with openpyxl in read-only mode into a
+columnar .npz cache next to the workbook, keyed by the workbook's SHA-256,
+so later runs neither load openpyxl nor re-read the sheet until the file
+changes. Every shard is then written from that cache in one pass
+(WORKERS > 1 writes them in parallel processes).
 """
 import sys, io, csv
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-import openpyxl
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
-wb = openpyxl.load_workbook('Copy of Aff2 original.xlsx')
-ws = wb['Clean']
+# ==================== CONFIGURATION ====================
+XLSX_FILE = 'Copy of Aff2 original.xlsx'
+SHEET = 'Clean'
+CACHE_FILE = f'{XLSX_FILE}.{SHEET}.npz'
+COLUMNS = ('gender', 'pledge_text', 'phone')   # Sheet columns A-C
+WORKERS = 1                                     # Processes writing shards (1 = in this process)
+SHARDS = [
+    ('rated_clean_001_500.csv', 1, 500),
+    ('rated_clean_501_1000.csv', 501, 1000),
+    ('rated_clean_1001_1450.csv', 1001, 1450),
+]
 
 # ===== ENTRIES 1-100 (fully rated from plan) =====
 excellent_1_100 = {11, 31, 39, 48, 54, 57, 84}
@@ -59,26 +77,89 @@ def get_rating(row):
     return 'UNREVIEWED'
 
 
-# Generate CSV batch 1: rows 1-500
-def write_batch(filename, start, end):
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_sheet(path, sheet):
+    """Stream the sheet's first columns as CSV-ready strings (None -> '')"""
+    import openpyxl
+
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        columns = [[] for _ in COLUMNS]
+        for values in wb[sheet].iter_rows(max_col=len(COLUMNS), values_only=True):
+            for column, value in zip(columns, values):
+                column.append('' if value is None else str(value))
+    finally:
+        wb.close()
+    return {name: np.array(column, dtype=str) for name, column in zip(COLUMNS, columns)}
+
+
+def load_sheet(path=XLSX_FILE, sheet=SHEET, cache_file=CACHE_FILE):
+    """Sheet columns from the .npz cache, rebuilt when the workbook's hash changes"""
+    sha256 = file_sha256(path)
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as cached:
+            if str(cached['sha256']) == sha256:
+                print(f'✓ Cache hit: {cache_file}')
+                return {name: cached[name] for name in COLUMNS}
+    columns = read_sheet(path, sheet)
+    tmp = f'{cache_file}.tmp.npz'
+    np.savez_compressed(tmp, sha256=np.array(sha256), **columns)
+    os.replace(tmp, cache_file)
+    print(f'✓ Cached {sheet} sheet ({len(columns[COLUMNS[0]])} rows) to {cache_file}')
+    return columns
+
+
+def cell(column, index):
+    """Value at a 0-based index ('' past the end, like an empty cell)"""
+    return column[index] if index < len(column) else ''
+
+
+def write_batch(filename, start, end, columns, first_row=1):
+    """Write sheet rows start..end; `columns` begin at sheet row first_row. Returns rating counts"""
+    gender, text, phone = (columns[name] for name in COLUMNS)
+    counts = {}
     with open(filename, 'w', newline='', encoding='utf-8') as f:
         writer = csv.writer(f)
         writer.writerow(['row_num', 'gender', 'pledge_text', 'phone', 'source_sheet', 'quality_rating'])
-        counts = {}
         for row in range(start, end + 1):
-            gender = ws.cell(row=row, column=1).value
-            text = ws.cell(row=row, column=2).value
-            phone = ws.cell(row=row, column=3).value
+            i = row - first_row
             rating = get_rating(row)
-            writer.writerow([row, gender, text, phone, 'Clean', rating])
+            writer.writerow([row, cell(gender, i), cell(text, i), cell(phone, i), 'Clean', rating])
             counts[rating] = counts.get(rating, 0) + 1
-    print(f'{filename}: {end - start + 1} entries')
-    for k, v in sorted(counts.items()):
-        print(f'  {k}: {v}')
+    return counts
+
+
+def write_shard(shard, columns):
+    """Worker entry point: write one shard from its own slice of the columns"""
+    filename, start, end = shard
+    return write_batch(filename, start, end, columns, first_row=start)
+
+
+def main():
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+    columns = load_sheet()
+    if WORKERS > 1:
+        with ProcessPoolExecutor(WORKERS) as executor:
+            # Send each worker only its shard's rows
+            parts = [{name: column[start - 1:end] for name, column in columns.items()}
+                     for _, start, end in SHARDS]
+            results = list(executor.map(write_shard, SHARDS, parts))
+    else:
+        results = [write_batch(filename, start, end, columns) for filename, start, end in SHARDS]
+    for (filename, start, end), counts in zip(SHARDS, results):
+        print(f'{filename}: {end - start + 1} entries')
+        for k, v in sorted(counts.items()):
+            print(f'  {k}: {v}')
 
+    print('\nDone! All rated CSVs generated.')
 
-write_batch('rated_clean_001_500.csv', 1, 500)
-write_batch('rated_clean_501_1000.csv', 501, 1000)
-write_batch('rated_clean_1001_1450.csv', 1001, 1450)
 
-print('\nDone! All rated CSVs generated.')
+if __name__ == "__main__":
+    main()
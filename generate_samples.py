@@ -2,7 +2,9 @@
 Generate humanized samples for AI detection testing
 """
 import pandas as pd
-import ollama
+from gen_cache import cached_generate, cache_report
+from sampler import sample_indices
+from cleanup import clean_output
 
 df = pd.read_csv("final_pledges_merged.csv")
 
@@ -23,27 +25,16 @@ Original pledge: {text}
 Rewritten pledge:"""
 
 def humanize(text):
-    response = ollama.generate(
-        model='llama3:8b',
-        prompt=BEST_PROMPT.format(text=text),
+    response = cached_generate(
+        'llama3:8b',
+        BEST_PROMPT,
+        text,
         options={'temperature': 0.9, 'top_p': 0.92, 'num_predict': 400}
     )
-    result = response['response'].strip()
-    
-    # Aggressive cleanup
-    result = result.replace('Rewritten pledge:', '').strip()
-    if '(Note' in result: result = result.split('(Note')[0].strip()
-    if '(I ' in result and result.count('(') == 1: result = result.split('(I ')[0].strip()
-    if '\n\n' in result: result = result.split('\n\n')[0].strip()
-    for marker in ['Here is', 'Here\'s', 'I aimed', 'I tried', 'I used', 'I kept', 'Note:']:
-        if marker in result:
-            result = result.split(marker)[0].strip()
-    result = result.strip('"\'')
-    
-    return result
+    return clean_output(response['response'], 'generate_samples')
 
-# Test on 5 diverse samples
-samples = [0, 50, 100, 500, 1000]
+# Test on 5 diverse samples (stratified by occupation, gender and length)
+samples = sample_indices(df, 5, seed=42)
 results = []
 
 print("Generating humanized samples...")
@@ -69,6 +60,8 @@ pd.DataFrame(results).to_csv("samples_to_test.csv", index=False)
 
 print("\n" + "=" * 70)
 print("SAMPLES SAVED TO: samples_to_test.csv")
+if cache_report():
+    print(cache_report())
 print("=" * 70)
 print("\nCopy each 'humanized' text and test at:")
 print("  - https://gptzero.me/")
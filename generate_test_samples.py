@@ -3,7 +3,9 @@ Generate 10 test samples with optimized humanization
 These will be saved for you to test on AI detectors
 """
 import pandas as pd
-import ollama
+from gen_cache import cached_generate, cache_report
+from sampler import sample_indices
+from cleanup import clean_output
 
 INPUT_CSV = "final_pledges_merged.csv"
 df = pd.read_csv(INPUT_CSV)
@@ -33,9 +35,10 @@ Your natural rewrite:"""
 
 
 def humanize(text):
-    response = ollama.generate(
-        model='llama3:8b',
-        prompt=PROMPT.format(text=text),
+    response = cached_generate(
+        'llama3:8b',
+        PROMPT,
+        text,
         options={
             'temperature': 0.95,
             'top_p': 0.92,
@@ -44,20 +47,12 @@ def humanize(text):
             'num_predict': 450,
         }
     )
-    result = response['response'].strip()
-    
-    # Cleanup
-    for marker in ['Your natural rewrite:', 'Rewrite:', 'Here is', "Here's", 
-                   '(Note', '(I aimed', '(I tried', '\n\n(', '\n\nNote:']:
-        if marker in result:
-            result = result.split(marker)[0].strip()
-    result = result.strip('"\'""''')
-    
-    return result
+    return clean_output(response['response'], 'generate_test_samples')
 
 
-# Test on 10 diverse samples
-test_indices = [0, 25, 50, 100, 200, 500, 1000, 2000, 3000, 4000]
+# Test on 10 diverse samples (stratified by occupation, gender and length)
+SAMPLE_SEED = 42
+test_indices = sample_indices(df, 10, seed=SAMPLE_SEED)
 results = []
 
 print("=" * 70)
@@ -96,6 +91,8 @@ print("SAMPLES SAVED!")
 print("=" * 70)
 print(f"\nFile: {output_file}")
 print(f"Total samples: {len(results)}")
+if cache_report():
+    print(cache_report())
 print("\n" + "-" * 70)
 print("NEXT STEPS:")
 print("-" * 70)
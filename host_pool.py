@@ -0,0 +1,236 @@
+"""
+Multi-host Ollama pool for the humanize pipeline.
+
+Each endpoint gets its own ollama.Client and worker threads. Rows are split
+across hosts in proportion to their measured tokens/sec, a worker whose queue
+runs dry steals from the back of the longest queue, and a host that fails is
+dropped, its rows handed to the others, and re-probed after a cooldown
+(doubling on each consecutive failure) until it passes the model check again.
+
+Only errors that say the host itself is unusable (connection and timeout
+errors, 5xx, model not found) drop it at once; any other error only costs
+the row an attempt, unless the host fails `drop_after` rows in a row.
+"""
+import threading
+import time
+from collections import deque
+
+import ollama
+
+from failures import MODEL_ERRORS
+
+
+def host_fault(error):
+    """True if `error` means the host is down or lacks the model, not that one row failed"""
+    if isinstance(error, ollama.ResponseError):
+        status = getattr(error, 'status_code', -1)
+        return status == -1 or status >= 500 or status == 404
+    return isinstance(error, MODEL_ERRORS)
+
+
+class Host:
+    """One Ollama endpoint and its live stats"""
+
+    def __init__(self, url):
+        self.url = url
+        self.client = ollama.Client(host=url)
+        self.queue = deque()
+        self.healthy = False
+        self.tokens_per_sec = None        # EWMA of measured generation speed
+        self.failures = 0                 # Consecutive failures
+        self.row_errors = 0               # Rows failed since the last completed one
+        self.retry_at = 0.0               # When a dropped host may be re-probed
+        self.completed = 0
+
+    def record_speed(self, tokens, seconds, alpha=0.3):
+        if not tokens or seconds <= 0:
+            return
+        speed = tokens / seconds
+        if self.tokens_per_sec is None:
+            self.tokens_per_sec = speed
+        else:
+            self.tokens_per_sec = alpha * speed + (1 - alpha) * self.tokens_per_sec
+
+
+class HostPool:
+    """
+    Run work_fn(client, item) -> (result, eval_tokens) over many Ollama hosts.
+    eval_tokens is None when the host did no generating (e.g. a cache hit), so
+    it doesn't count towards the host's measured speed.
+
+    probe(client) -> bool decides whether a host is admitted (the same model
+    check check_ollama() does). on_result(item, result, error) is called under
+    a lock, one item at a time, so callers can write into a DataFrame safely.
+    Items that fail on max_attempts different tries are reported with error set.
+    """
+
+    def __init__(self, urls, probe, workers_per_host=1, cooldown=5.0,
+                 max_cooldown=120.0, max_attempts=3, drop_after=5, log=print):
+        self.hosts = [Host(url) for url in urls]
+        self.probe = probe
+        self.workers_per_host = workers_per_host
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_attempts = max_attempts
+        self.drop_after = drop_after      # Consecutive failed rows that drop a host
+        self.log = log
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.in_flight = 0
+        self.attempts = {}
+
+    # ---------- health ----------
+
+    def check_host(self, host):
+        """Probe a host; admit it if the model is there, otherwise schedule a retry"""
+        try:
+            ok = self.probe(host.client)
+        except Exception as e:
+            self.log(f"⚠ {host.url}: {e}")
+            ok = False
+        with self.lock:
+            if ok:
+                # failures is only reset by a completed row, so a host that
+                # passes the probe but keeps failing real work backs off further
+                if not host.healthy and host.failures:
+                    self.log(f"✓ {host.url} re-admitted")
+                host.healthy = True
+            else:
+                self._drop(host)
+        return ok
+
+    def _drop(self, host):
+        """Mark host down and hand its queued rows to healthy hosts (lock held)"""
+        host.healthy = False
+        host.failures += 1
+        host.row_errors = 0
+        wait = min(self.max_cooldown, self.cooldown * 2 ** (host.failures - 1))
+        host.retry_at = time.time() + wait
+        orphans = list(host.queue)
+        host.queue.clear()
+        self._spread(orphans)
+        self.log(f"⚠ {host.url} dropped ({len(orphans)} rows moved), re-probe in {wait:.0f}s")
+
+    def probe_all(self):
+        """Initial health check; returns the number of admitted hosts"""
+        for host in self.hosts:
+            if self.check_host(host):
+                self.log(f"✓ {host.url} ready")
+        return sum(h.healthy for h in self.hosts)
+
+    # ---------- scheduling ----------
+
+    def _weights(self, hosts):
+        """Share of rows per host, by measured tokens/sec (unmeasured hosts get the mean)"""
+        known = [h.tokens_per_sec for h in hosts if h.tokens_per_sec]
+        default = sum(known) / len(known) if known else 1.0
+        speeds = [h.tokens_per_sec or default for h in hosts]
+        total = sum(speeds)
+        return [s / total for s in speeds]
+
+    def _spread(self, items):
+        """Deal items to healthy hosts in proportion to their speed (lock held)"""
+        hosts = [h for h in self.hosts if h.healthy] or self.hosts
+        weights = self._weights(hosts)
+        credit = [0.0] * len(hosts)
+        for item in items:
+            # Weighted round-robin: give the item to the host most owed a row
+            for k, w in enumerate(weights):
+                credit[k] += w
+            k = max(range(len(hosts)), key=credit.__getitem__)
+            credit[k] -= 1.0
+            hosts[k].queue.append(item)
+
+    def _next_item(self, host):
+        """Own queue first; if empty, steal from the back of the longest queue"""
+        with self.lock:
+            if host.queue:
+                item = host.queue.popleft()
+            else:
+                victim = max(self.hosts, key=lambda h: len(h.queue))
+                if not victim.queue:
+                    return None
+                item = victim.queue.pop()
+            self.in_flight += 1
+            return item
+
+    def _finished(self):
+        with self.lock:
+            return self.in_flight == 0 and not any(h.queue for h in self.hosts)
+
+    # ---------- workers ----------
+
+    def _worker(self, host, work_fn, on_result):
+        while not self.stop_event.is_set():
+            if not host.healthy:
+                with self.lock:
+                    due = time.time() >= host.retry_at
+                    if due:
+                        host.retry_at = float('inf')    # Only one worker re-probes
+                if not due:
+                    if self._finished():
+                        return
+                    time.sleep(0.2)
+                    continue
+                if not self.check_host(host):
+                    continue
+
+            item = self._next_item(host)
+            if item is None:
+                if self._finished():
+                    return
+                time.sleep(0.05)
+                continue
+
+            start = time.time()
+            try:
+                result, tokens = work_fn(host.client, item)
+            except Exception as e:
+                with self.lock:
+                    self.in_flight -= 1
+                    tries = self.attempts[item] = self.attempts.get(item, 0) + 1
+                    if tries >= self.max_attempts:
+                        on_result(item, None, e)
+                    else:
+                        host.queue.appendleft(item)
+                    host.row_errors += 1
+                    if host.healthy and (host_fault(e) or host.row_errors >= self.drop_after):
+                        self._drop(host)
+                continue
+
+            if tokens:
+                host.record_speed(tokens, time.time() - start)
+            with self.lock:
+                self.in_flight -= 1
+                host.completed += 1
+                host.row_errors = 0
+                if tokens:
+                    host.failures = 0             # Cache hits don't show the host is healthy
+                on_result(item, result, None)
+
+    def run(self, items, work_fn, on_result):
+        """Process all items; blocks until done or stop() is called"""
+        with self.lock:
+            self._spread(list(items))
+        threads = [
+            threading.Thread(target=self._worker, args=(host, work_fn, on_result), daemon=True)
+            for host in self.hosts for _ in range(self.workers_per_host)
+        ]
+        for t in threads:
+            t.start()
+        while any(t.is_alive() for t in threads):
+            # join() with a timeout keeps the main thread responsive to Ctrl+C
+            for t in threads:
+                t.join(timeout=0.2)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def summary(self):
+        """One line per host: state, rows done, measured speed"""
+        lines = []
+        for h in self.hosts:
+            speed = f"{h.tokens_per_sec:.1f} tok/s" if h.tokens_per_sec else "n/a"
+            state = "up" if h.healthy else "down"
+            lines.append(f"  {h.url:<32} {state:<5} {h.completed:>6} rows | {speed}")
+        return "\n".join(lines)
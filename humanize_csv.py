@@ -7,14 +7,22 @@ Processes your CSV file in batches, saves progress, and can resume if interrupte
 import pandas as pd
 import ollama
 import time
-import random
 from tqdm import tqdm
 from datetime import datetime
+from rate_control import make_pacer
+from gen_cache import cached_generate, cache_report
+from journal import RowJournal, apply_journal, atomic_write_csv
+from cleanup import clean_output
+from token_budget import TokenBudget
+from forecast import CostForecaster
+from failures import FailureQueue, CircuitBreaker, call_with_retry, error_class
 
 # ==================== CONFIGURATION ====================
 # File paths
 INPUT_CSV = "final_pledges_merged.csv"
 OUTPUT_CSV = "final_pledges_humanized.csv"
+JOURNAL_FILE = "final_pledges_humanized.journal.jsonl"   # Each finished row is appended here
+FAILURES_FILE = "final_pledges_humanized.failures.jsonl" # Rows that failed every retry
 
 # Column settings
 PLEDGE_COLUMN = 'pledge'              # Column to humanize
@@ -30,6 +38,10 @@ BATCH_SIZE = 100                      # Save progress every N rows
 START_ROW = 0                         # Resume from this row if interrupted
 DELAY_MIN = 0.5                       # Min seconds between calls
 DELAY_MAX = 1.5                       # Max seconds between calls
+RATE_MODE = 'adaptive'                # 'adaptive' = speed up while Ollama is healthy
+                                      # 'fixed' = always sleep DELAY_MIN..DELAY_MAX
+NUM_PREDICT = 300                     # Max tokens for response
+TOKEN_BUDGET = True                   # Size num_predict per row from the input length
 
 # ==================== HUMANIZATION PROMPT ====================
 # This prompt is optimized for bypassing AI detectors
@@ -49,56 +61,85 @@ Rewritten:"""
 
 # ==================== MAIN SCRIPT ====================
 
-def load_or_create_output():
-    """Load existing output or create new dataframe"""
-    try:
-        # Try to load existing output (for resuming)
-        df = pd.read_csv(OUTPUT_CSV)
-        print(f"✓ Resuming from existing output file ({len(df)} rows)")
-    except FileNotFoundError:
-        # Load fresh input
-        df = pd.read_csv(INPUT_CSV)
-        df[NEW_COLUMN] = pd.NA
-        print(f"✓ Starting fresh with input file ({len(df)} rows)")
+def load_or_create_output(journal):
+    """Load input data and replay already-finished rows from the journal"""
+    df = pd.read_csv(INPUT_CSV)
+    df[NEW_COLUMN] = pd.NA
+    
+    stale = journal.stale()
+    if stale:
+        print(f"⚠ {JOURNAL_FILE} was written for a different {INPUT_CSV} - ignoring it")
+    if journal.exists() and not stale:
+        # Resume: apply journaled rows instead of re-reading the whole output
+        applied = apply_journal(df, NEW_COLUMN, journal.replay())
+        print(f"✓ Resuming from journal ({applied} of {len(df)} rows done)")
+    else:
+        try:
+            # Output of a finished run (or from before the journal existed) -
+            # migrate it once, only where the pledge still matches the input
+            old = pd.read_csv(OUTPUT_CSV, usecols=[PLEDGE_COLUMN, NEW_COLUMN])
+            old = old[old.index < len(df)]
+            same = old[PLEDGE_COLUMN].astype('string').eq(df[PLEDGE_COLUMN].astype('string').reindex(old.index))
+            old = old.loc[same.fillna(False).astype(bool), NEW_COLUMN].dropna()
+            df.loc[old.index, NEW_COLUMN] = old
+            journal.record_many(old.items())
+            journal.sync()
+            print(f"✓ Resuming from existing output file ({len(df)} rows)")
+        except FileNotFoundError:
+            print(f"✓ Starting fresh with input file ({len(df)} rows)")
     return df
 
 
-def humanize_text(text, model):
-    """Humanize a single text using Ollama"""
+def humanize_text(text, model, pacer=None, budget=None, forecast=None, failures=None, row=None,
+                  breaker=None):
+    """Humanize a single text using Ollama; None (row queued in failures) if every retry fails"""
     if pd.isna(text) or not text or str(text).strip() == '':
         return text
     
-    prompt = PROMPT_TEMPLATE.format(text=text)
+    start = time.time()
+    
+    def pace():
+        nonlocal start
+        pacer.wait()
+        start = time.time()
+    
+    def failed_attempt(e):
+        print(f"\n⚠ Error: {error_class(e)}: {e}")
+        if pacer:
+            pacer.record(time.time() - start, ok=False)
+    
+    options = {
+        'temperature': 0.8,      # Adds creativity/variation
+        'top_p': 0.9,
+        'num_predict': budget.budget(text) if budget else NUM_PREDICT,
+    }
+    def generate(options):
+        response, _ = call_with_retry(
+            lambda: cached_generate(model, PROMPT_TEMPLATE, text, options=options,
+                                    on_miss=pace if pacer else None,
+                                    refresh=failures is not None and row is not None and row in failures),
+            breaker, on_error=failed_attempt)
+        return response
     
     try:
-        response = ollama.generate(
-            model=model,
-            prompt=prompt,
-            options={
-                'temperature': 0.8,      # Adds creativity/variation
-                'top_p': 0.9,
-                'num_predict': 300,      # Max tokens for response
-            }
-        )
-        result = response['response'].strip()
-        
-        # Clean up common LLM quirks
-        result = result.replace('Rewritten:', '').strip()
-        result = result.replace('Here is the rewritten text:', '').strip()
-        result = result.strip('"').strip("'")
-        
-        # Remove any notes/explanations the model might add
-        if '(Note:' in result:
-            result = result.split('(Note:')[0].strip()
-        if '\n\n' in result:
-            result = result.split('\n\n')[0].strip()
-        if 'I aimed' in result:
-            result = result.split('I aimed')[0].strip()
-        
-        return result
+        response = generate(options)
+        if budget and budget.rerun_needed(response, options['num_predict']):
+            # The row's reduced budget cut it short: once more at the full one
+            if not response['cached']:
+                budget.observe(text, response)
+            options = dict(options, num_predict=NUM_PREDICT)
+            response = generate(options)
     except Exception as e:
-        print(f"\n⚠ Error: {e}")
-        return text  # Return original on error
+        if failures and row is not None:
+            failures.record(row, e)
+        return None  # Left empty so resume retries it
+    if pacer and not response['cached']:
+        pacer.record(time.time() - start, ok=True)
+    if budget and not response['cached']:
+        budget.observe(text, response)
+    if forecast and not response['cached']:
+        forecast.observe(text, time.time() - start)
+    return clean_output(response['response'], 'humanize_csv')
 
 
 def check_ollama_running():
@@ -145,7 +186,8 @@ def main():
         return
     
     # Load data
-    df = load_or_create_output()
+    journal = RowJournal(JOURNAL_FILE, INPUT_CSV)
+    df = load_or_create_output(journal)
     total_rows = len(df)
     
     # Count already processed
@@ -155,7 +197,13 @@ def main():
     print(f"✓ Total rows: {total_rows}")
     print(f"✓ Already processed: {already_done}")
     print(f"✓ Remaining: {remaining}")
-    print(f"✓ Estimated time: {remaining * 2 / 60:.1f} - {remaining * 3 / 60:.1f} minutes")
+    forecast = CostForecaster()
+    failures = FailureQueue(FAILURES_FILE)
+    breaker = CircuitBreaker(log=tqdm.write)
+    pending = [i for i in range(START_ROW, total_rows)
+               if not (pd.notna(df.at[i, NEW_COLUMN]) and str(df.at[i, NEW_COLUMN]).strip())]
+    forecast.add_pending(df, pending, PLEDGE_COLUMN)
+    print(f"✓ Estimated time: measured once {forecast.min_rows} rows are generated")
     print()
     print("Processing... (Press Ctrl+C to stop safely)")
     print("-" * 60)
@@ -163,6 +211,8 @@ def main():
     # Process in batches
     processed = 0
     start_time = time.time()
+    pacer = make_pacer(RATE_MODE, DELAY_MIN, DELAY_MAX, log=tqdm.write)
+    budget = TokenBudget(NUM_PREDICT) if TOKEN_BUDGET else None
     
     try:
         for start in range(START_ROW, total_rows, BATCH_SIZE):
@@ -178,8 +228,13 @@ def main():
                     continue
                 
                 original = df.at[i, PLEDGE_COLUMN]
-                humanized = humanize_text(original, MODEL)
+                humanized = humanize_text(original, MODEL, pacer, budget, forecast,
+                                          failures, row=i, breaker=breaker)
                 df.at[i, NEW_COLUMN] = humanized
+                journal.record(i, humanized)
+                if humanized is not None:
+                    failures.resolve(i)
+                forecast.done(i)
                 
                 batch_processed += 1
                 processed += 1
@@ -187,27 +242,28 @@ def main():
                 # Update progress bar with sample
                 if humanized:
                     preview = humanized[:40] + "..." if len(str(humanized)) > 40 else humanized
-                    pbar.set_postfix_str(f"'{preview}'")
-                
-                # Random delay
-                time.sleep(random.uniform(DELAY_MIN, DELAY_MAX))
+                    pbar.set_postfix_str(f"{forecast.eta()} | '{preview}'")
             
-            # Save after each batch
-            df.to_csv(OUTPUT_CSV, index=False)
+            # Rows are journaled as they finish; make the batch durable
+            journal.sync()
             
             elapsed = time.time() - start_time
             rate = processed / elapsed if elapsed > 0 else 0
             print(f"\n✓ Batch saved! Progress: {end}/{total_rows} | Rate: {rate:.1f} rows/sec")
+            print(f"  {forecast.summary()}")
     
     except KeyboardInterrupt:
         print("\n\n⚠ Interrupted! Saving progress...")
-        df.to_csv(OUTPUT_CSV, index=False)
+        journal.close()
+        atomic_write_csv(df, OUTPUT_CSV)
         print(f"✓ Progress saved to {OUTPUT_CSV}")
         print(f"✓ Resume by running the script again")
         return
     
-    # Final save
-    df.to_csv(OUTPUT_CSV, index=False)
+    # Build the final CSV once (temp file + atomic rename)
+    journal.close()
+    atomic_write_csv(df, OUTPUT_CSV)
+    journal.delete()                      # OUTPUT_CSV now holds every finished row
     
     elapsed = time.time() - start_time
     print()
@@ -216,6 +272,12 @@ def main():
     print(f"✓ Total processed: {processed} rows")
     print(f"✓ Time taken: {elapsed/60:.1f} minutes")
     print(f"✓ Output saved to: {OUTPUT_CSV}")
+    if cache_report():
+        print(f"✓ {cache_report()}")
+    if failures.rows():
+        print(f"⚠ {failures.report()}")
+    if budget:
+        print(f"✓ {budget.report()}")
     print("=" * 60)
 
 
@@ -6,16 +6,47 @@ Based on research on what bypasses AI detectors in 2025:
 3. Human quirks - typos, filler words, incomplete thoughts
 4. Emotional authenticity - personal voice
 """
+import asyncio
+import json
+import os
 import pandas as pd
 import ollama
 import time
-import random
 from tqdm import tqdm
 from datetime import datetime
+from rate_control import make_pacer
+from host_pool import HostPool
+from gen_cache import cached_generate, cached_generate_async, cache_report
+from dedupe import duplicate_groups, mask_tokens, pick_representatives, fan_out
+from journal import RowJournal, apply_journal, atomic_write_csv
+from cleanup import clean_output, meta_text_started, STOP_SEQUENCES
+from run_stats import RunStats
+from token_budget import TokenBudget
+from scheduler import schedule, describe
+from packing import Packer
+from warmup import ModelKeeper
+from forecast import CostForecaster
+from junk_filter import classify as classify_junk, summary as junk_summary
+from failures import (FailureQueue, CircuitBreaker, call_with_retry, call_with_retry_async,
+                      error_class, MODEL_ERRORS, RETRIES)
 
 # ==================== CONFIGURATION ====================
 INPUT_CSV = "final_pledges_merged.csv"
 OUTPUT_CSV = "final_pledges_humanized.csv"
+JOURNAL_FILE = "final_pledges_humanized.journal.jsonl"   # Append-only log of finished rows
+STATS_CSV = "final_pledges_humanized.stats.csv"         # Per-row tokens/latency/early-stop savings
+METRICS_FILE = "final_pledges_humanized.metrics.jsonl"  # Per-row Ollama timings, appended as rows finish
+FAILURES_FILE = "final_pledges_humanized.failures.jsonl"  # Rows that failed every retry (failures.py)
+
+# Failed requests are retried RETRIES times with exponential backoff and jitter
+# (failures.py); a circuit breaker pauses dispatch while Ollama is down. Rows
+# that still fail stay empty and are queued in FAILURES_FILE, as are rows
+# quality_gate.py --requeue rejects; queued rows skip the generation cache
+RETRY_FAILED = False                  # Reprocess only the rows in FAILURES_FILE
+
+# Prometheus export of the running totals (run_stats.py)
+PROMETHEUS_FILE = ""                  # Textfile-collector path, rewritten every batch ("" = off)
+PROMETHEUS_PORT = 0                   # Serve /metrics on this port during the run (0 = off)
 
 PLEDGE_COLUMN = 'pledge'
 NEW_COLUMN = 'humanized_pledge'
@@ -25,10 +56,79 @@ BATCH_SIZE = 50
 START_ROW = 0
 DELAY_MIN = 0.5
 DELAY_MAX = 1.0
+RATE_MODE = 'adaptive'                # 'adaptive' (AIMD on latency/errors) or 'fixed' (DELAY_MIN..DELAY_MAX)
+
+# Concurrency (1 = original one-row-at-a-time loop with delays)
+CONCURRENCY = 4                       # Max in-flight requests to Ollama
+CONCURRENCY_SWEEP = []                # e.g. [1, 2, 4, 8] - measure rows/sec per level first
+SWEEP_ROWS = 20                       # Rows processed at each sweep level
+
+# Processing order of pending rows (scheduler.py); output order is unaffected
+# 'file' = file order, 'shortest' = shortest first, 'round_robin' = one row
+# from each length bucket in turn (steady per-batch rates)
+SCHEDULE = 'round_robin'
+
+# Generate once per distinct pledge (after normalizing quotes/whitespace/case)
+# and copy the result to every duplicate row
+DEDUPE = True
+
+# With DEDUPE, also share one generation between pledges that differ only in
+# the occupation name or numbers. Each copy gets the row's own occupation and
+# numbers put back; rows where that can't be done safely are generated
+NEAR_DEDUPE = False
+
+# Junk pre-filter (junk_filter.py): ultra-short, template and circular pledges
+# are flagged in JUNK_COLUMN before generation. 'skip' = leave them
+# unhumanized (no model call), 'tag' = flag but still humanize, 'off'
+JUNK_FILTER = 'skip'
+JUNK_COLUMN = 'junk_reason'
+
+# Dry run: humanize this many rows (a length-balanced sample of the pending
+# rows), print a forecast for the whole INPUT_CSV and exit without writing
+# the output. The sample's generations stay in the cache. 0 = normal run
+DRY_RUN_ROWS = 0
+
+# Streaming mode for inputs too big for memory: read INPUT_CSV this many rows
+# at a time and append finished chunks to the output (0 = load the whole file)
+STREAM_CHUNK_ROWS = 0
+
+# Multi-host pool: comma-separated endpoints, e.g. http://gpu1:11434,http://gpu2:11434
+# Empty = single host (OLLAMA_HOST or localhost). CONCURRENCY applies per host.
+OLLAMA_HOSTS = [h.strip() for h in os.environ.get('OLLAMA_HOSTS', '').split(',') if h.strip()]
+
+# Stream tokens and cancel a request as soon as meta-text ("(Note", "Here's",
+# a blank line...) follows the rewrite, instead of generating up to num_predict
+# and cutting it off afterwards. Also sends the safe markers as `stop` sequences.
+EARLY_STOP = True
+
+# Per-row num_predict sized from the input length and an output/input ratio
+# calibrated on finished rows (token_budget.py); False = fixed num_predict
+TOKEN_BUDGET = True
+
+# Packed mode (packing.py): send several pledges per request with one copy of
+# the instructions and a JSON `format`. Runs one pack at a time (CONCURRENCY
+# and OLLAMA_HOSTS are not used); the first PACK_BASELINE_ROWS rows run
+# single-row so the summary can compare throughput and prompt tokens
+PACKED = False
+PACK_SIZE = 4                         # Starting K
+PACK_MAX = 8                          # Largest K auto-tuning may try
+PACK_AUTO = True                      # Tune K from measured rows/sec
+PACK_BASELINE_ROWS = 10
+
+# Prompt prefix reuse: the rules go in a fixed system prompt and the model is
+# kept loaded, so Ollama can reuse the evaluated prefix between requests and
+# only the pledge itself is evaluated each time
+KEEP_ALIVE = '30m'                    # How long Ollama keeps MODEL loaded after a request
+WARM_UP = True                        # Load MODEL before the first row and alert on mid-run reloads
+OCCUPATION_COLUMN = 'occupation'
+OCCUPATION_PREFIX = False             # Add the speaker's occupation to the system prompt;
+                                      # rows are then processed grouped by occupation so each
+                                      # group's prefix is evaluated once
 
 # ==================== OPTIMIZED PROMPT ====================
 # v5_best - Tested and produces natural human-like output
-HUMANIZE_PROMPT = """Transform this work pledge into authentic human speech. 
+# The constant rules are the system prompt; only HUMANIZE_PROMPT changes per row
+HUMANIZE_SYSTEM = """Transform the work pledge you are given into authentic human speech.
 
 Rules:
 - Preserve EXACT emotional meaning about work doubts/struggles
@@ -37,82 +137,319 @@ Rules:
 - Mix sentence lengths: some very short (3-5 words), some long rambling ones
 - Sound like a tired professional venting to a close friend
 - Include slight self-doubt phrasing
-- NO explanations, NO markdown, NO quotes - ONLY output the rewritten pledge
+- NO explanations, NO markdown, NO quotes - ONLY output the rewritten pledge"""
+
+OCCUPATION_LINE = "\n\nThe speaker works as: {occupation}"
 
-Original pledge:
+HUMANIZE_PROMPT = """Original pledge:
 {text}
 
 Human version:"""
 
+# Same rules for packed mode; {items} is a numbered list of pledges
+PACKED_PROMPT = """Transform each numbered work pledge below into authentic human speech.
+
+Rules:
+- Preserve EXACT emotional meaning about work doubts/struggles
+- Use natural speech patterns: "honestly", "like", "you know", "I mean", "right?"
+- Heavy contractions: I'm, can't, won't, it's, that's, don't, you're
+- Mix sentence lengths: some very short (3-5 words), some long rambling ones
+- Sound like a tired professional venting to a close friend
+- Include slight self-doubt phrasing
+- Rewrite every pledge on its own - never merge or skip one
+- Answer ONLY with JSON: {{"rewrites": [{{"id": <pledge number>, "text": "<rewrite>"}}, ...]}}
+
+Pledges:
+{items}"""
+
 # ==================== FUNCTIONS ====================
 
-def load_or_resume():
-    """Load existing output or start fresh"""
-    try:
-        df = pd.read_csv(OUTPUT_CSV)
-        done = df[NEW_COLUMN].notna().sum()
-        print(f"✓ Resuming: {done}/{len(df)} already done")
-    except FileNotFoundError:
-        df = pd.read_csv(INPUT_CSV)
-        df[NEW_COLUMN] = pd.NA
-        print(f"✓ Starting fresh: {len(df)} rows")
+def load_or_resume(journal):
+    """Load the input and replay finished rows from the journal (or the output CSV)"""
+    df = pd.read_csv(INPUT_CSV)
+    df[NEW_COLUMN] = pd.NA
+    
+    stale = journal.stale()
+    if stale:
+        print(f"⚠ {JOURNAL_FILE} was written for a different {INPUT_CSV} - ignoring it "
+              f"(moved to {JOURNAL_FILE}.stale)")
+    if journal.exists() and not stale:
+        applied = apply_journal(df, NEW_COLUMN, journal.replay())
+        print(f"✓ Resuming from journal: {applied}/{len(df)} already done")
+    else:
+        try:
+            # A finished run (or one from before the journal existed) - carry its
+            # rows over once, only where the pledge still matches the input
+            old = pd.read_csv(OUTPUT_CSV, usecols=[PLEDGE_COLUMN, NEW_COLUMN])
+            old = old[old.index < len(df)]
+            same = old[PLEDGE_COLUMN].astype('string').eq(df[PLEDGE_COLUMN].astype('string').reindex(old.index))
+            old = old.loc[same.fillna(False).astype(bool), NEW_COLUMN].dropna()
+            df.loc[old.index, NEW_COLUMN] = old
+            journal.record_many(old.items())
+            journal.sync()
+            print(f"✓ Resuming: {len(old)}/{len(df)} already done")
+        except FileNotFoundError:
+            print(f"✓ Starting fresh: {len(df)} rows")
     return df
 
 
-def humanize(text):
-    """Humanize single text with optimized settings"""
+def store(run, df, journal, i, value):
+    """Record a finished row in the DataFrame and the journal"""
+    df.at[i, NEW_COLUMN] = value
+    journal.record(i, value)
+    run.keeper.row_done()
+    run.forecast.done(i)
+    if value is not None and pd.notna(value):
+        run.failures.resolve(i)
+
+
+GENERATE_OPTIONS = {
+    'temperature': 0.95,      # Higher = more creative/unpredictable
+    'top_p': 0.92,            # Nucleus sampling
+    'top_k': 50,              # Limit vocabulary for each token
+    'repeat_penalty': 1.15,   # Avoid repetitive patterns
+    'num_predict': 450,       # Allow longer responses
+}
+
+
+class RunState:
+    """Per-run stats, token budget, model keeper, forecast, failure queue and breaker"""
+
+    def __init__(self):
+        self.stats = RunStats(GENERATE_OPTIONS['num_predict'], METRICS_FILE)
+        self.budget = TokenBudget(GENERATE_OPTIONS['num_predict']) if TOKEN_BUDGET else None
+        self.keeper = ModelKeeper(MODEL, KEEP_ALIVE, log=tqdm.write)
+        self.forecast = CostForecaster()
+        self.failures = FailureQueue(FAILURES_FILE)
+        self.breaker = CircuitBreaker(log=tqdm.write)
+
+
+def init_run():
+    """
+    Build the run state from the configuration. main() calls this, so settings
+    changed after import (humanizer.py, bench_pipeline.py) are picked up.
+    """
+    if EARLY_STOP:
+        GENERATE_OPTIONS['stop'] = list(STOP_SEQUENCES)
+    else:
+        GENERATE_OPTIONS.pop('stop', None)
+    return RunState()
+
+# Progress bars show the measured forecast (postfix) instead of tqdm's rows-left guess
+BAR_FORMAT = "{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}, {rate_fmt}{postfix}]"
+
+
+def row_options(run, text):
+    """GENERATE_OPTIONS with this row's num_predict budget"""
+    return run.budget.options(text, GENERATE_OPTIONS) if run.budget else GENERATE_OPTIONS
+
+
+def full_budget_rerun(run, text, response, options):
+    """
+    Options for one more attempt at the full num_predict if the row's reduced
+    budget cut `response` short (None otherwise). The cut response still
+    counts towards the budget's truncation stats.
+    """
+    if not run.budget or not run.budget.rerun_needed(response, options['num_predict']):
+        return None
+    if not response['cached']:
+        run.budget.observe(text, response)
+    return GENERATE_OPTIONS
+
+
+def record_row(run, row, text, response, options, latency, occupation=None):
+    """Feed a finished generation to the stats and the budget calibration"""
+    if not response['cached']:
+        run.keeper.record(response)
+        run.forecast.observe(text, latency)
+    if run.budget and not response['cached']:
+        run.budget.observe(text, response)
+    run.stats.record(row, response, latency, options['num_predict'], prefix=occupation or '')
+
+
+def row_occupation(df, i):
+    """Occupation of row i for the system prompt (None unless OCCUPATION_PREFIX)"""
+    if not OCCUPATION_PREFIX or OCCUPATION_COLUMN not in df.columns:
+        return None
+    value = df.at[i, OCCUPATION_COLUMN]
+    return str(value).strip() if pd.notna(value) and str(value).strip() else None
+
+
+def batch_saved(run, log=tqdm.write):
+    """After a batch is saved: summarize its inference timings and refresh PROMETHEUS_FILE"""
+    line = run.stats.batch_summary()
+    if line:
+        log(f"  {line}")
+    log(f"  {run.forecast.summary()}")
+    if PROMETHEUS_FILE:
+        run.stats.write_prometheus(PROMETHEUS_FILE)
+
+
+def show_progress(run, pbar, humanized=None):
+    """Put the forecast ETA, and a preview of the latest row, in the bar's postfix"""
+    postfix = run.forecast.eta()
+    if humanized and isinstance(humanized, str):
+        postfix += " | " + (humanized[:35] + "..." if len(humanized) > 35 else humanized)
+    pbar.set_postfix_str(postfix)
+
+
+def request_kwargs(occupation=None):
+    """Per-request generate() arguments: system prompt, keep_alive, early stop"""
+    system = HUMANIZE_SYSTEM
+    if occupation:
+        system += OCCUPATION_LINE.format(occupation=occupation)
+    return {
+        'system': system,
+        'keep_alive': KEEP_ALIVE,
+        'early_stop': meta_text_started if EARLY_STOP else None,
+    }
+
+
+def dedupe_key(df):
+    """Text rows are deduplicated on (the occupation joins it when it is in the prompt)"""
+    if OCCUPATION_PREFIX and OCCUPATION_COLUMN in df.columns:
+        return df[PLEDGE_COLUMN].astype('string') + ' | ' + df[OCCUPATION_COLUMN].astype('string').fillna('')
+    return df[PLEDGE_COLUMN]
+
+
+def dedupe_groups(df):
+    """
+    (group id per row, masked tokens per row) for DEDUPE - the tokens are
+    None unless NEAR_DEDUPE masks occupations and numbers
+    """
+    if NEAR_DEDUPE:
+        occupations = df[OCCUPATION_COLUMN].dropna().unique() if OCCUPATION_COLUMN in df.columns else ()
+        masked, tokens = mask_tokens(dedupe_key(df), occupations)
+        return duplicate_groups(masked), tokens
+    return duplicate_groups(dedupe_key(df)), None
+
+
+def fill_copies(run, df, groups, tokens, journal, pacer, pool=None):
+    """
+    Fan finished rows out to their duplicates. With NEAR_DEDUPE, duplicates
+    whose copy could not take their own occupation/numbers are generated
+    instead. Returns (rows copied, rows generated).
+    """
+    filled = fan_out(df, groups, NEW_COLUMN, tokens)
+    journal.record_many(filled.items())
+    if tokens is None:
+        return len(filled), 0
+    done = df[NEW_COLUMN].astype('string').str.strip().fillna('') != ''
+    finished = set(groups[done & (groups != -1)])
+    left = [i for i in pending_rows(df) if groups[i] in finished]
+    if not left:
+        return len(filled), 0
+    return len(filled), process_rows(run, df, scheduled(df, left), pacer, journal, pool)
+
+
+def scheduled(df, rows):
+    """Apply SCHEDULE, grouped by occupation when it is part of the prompt prefix"""
+    return schedule(df, rows, PLEDGE_COLUMN, SCHEDULE,
+                    group_by=OCCUPATION_COLUMN if OCCUPATION_PREFIX else None)
+
+
+def humanize(run, text, pacer=None, row=None, occupation=None):
+    """
+    Humanize single text with optimized settings. Returns None if every
+    retry fails; the row is then queued in FAILURES_FILE and left empty.
+    """
     if pd.isna(text) or not str(text).strip():
         return text
     
+    start = time.time()
+    
+    def pace():
+        nonlocal start
+        pacer.wait()
+        start = time.time()
+    
+    def failed_attempt(e):
+        tqdm.write(f"⚠ Error: {error_class(e)}: {e}")
+        if pacer:
+            pacer.record(time.time() - start, ok=False)
+    
+    def generate(options):
+        response, _ = call_with_retry(
+            lambda: cached_generate(MODEL, HUMANIZE_PROMPT, text, options, on_miss=pace if pacer else None,
+                                    refresh=row is not None and row in run.failures,
+                                    **request_kwargs(occupation)),
+            run.breaker, RETRIES, on_error=failed_attempt)
+        return response
+    
+    options = row_options(run, text)
     try:
-        response = ollama.generate(
-            model=MODEL,
-            prompt=HUMANIZE_PROMPT.format(text=text),
-            options={
-                'temperature': 0.95,      # Higher = more creative/unpredictable
-                'top_p': 0.92,            # Nucleus sampling
-                'top_k': 50,              # Limit vocabulary for each token
-                'repeat_penalty': 1.15,   # Avoid repetitive patterns
-                'num_predict': 450,       # Allow longer responses
-            }
-        )
-        result = response['response'].strip()
-        
-        # Aggressive cleanup of any meta-text
-        cleanup_markers = [
-            'Your natural rewrite:', 'Rewrite:', 'Here is', "Here's", 
-            '(Note', '(I aimed', '(I tried', '(I used', 'I hope this',
-            'Let me know', 'Feel free', 'This version', 'The rewritten',
-            '\n\n(', '\n\nNote:', '\n\nI '
-        ]
-        for marker in cleanup_markers:
-            if marker in result:
-                result = result.split(marker)[0].strip()
-        
-        # Remove surrounding quotes
-        result = result.strip('"\'""''')
-        
-        # Remove any trailing incomplete sentences from cleanup
-        if result.endswith('('):
-            result = result[:-1].strip()
-            
-        return result
-        
+        response = generate(options)
+        rerun = full_budget_rerun(run, text, response, options)
+        if rerun:
+            options, response = rerun, generate(rerun)
     except Exception as e:
-        print(f"\n⚠ Error: {e}")
+        if row is not None:
+            run.failures.record(row, e)
+        return None
+    if pacer and not response['cached']:
+        pacer.record(time.time() - start, ok=True)
+    record_row(run, row, text, response, options, time.time() - start, occupation)
+    return clean_output(response['response'])
+
+
+async def humanize_async(run, client, text, pacer=None, pace=None, row=None, occupation=None):
+    """Async twin of humanize() used by the concurrent engine"""
+    if pd.isna(text) or not str(text).strip():
         return text
+    
+    start = time.time()
+    
+    async def paced():
+        nonlocal start
+        await pace()
+        start = time.time()
+    
+    def failed_attempt(e):
+        tqdm.write(f"⚠ Error: {error_class(e)}: {e}")
+        if pacer:
+            pacer.record(time.time() - start, ok=False)
+    
+    async def generate(options):
+        response, _ = await call_with_retry_async(
+            lambda: cached_generate_async(client, MODEL, HUMANIZE_PROMPT, text, options,
+                                          on_miss=paced if pace else None,
+                                          refresh=row is not None and row in run.failures,
+                                          **request_kwargs(occupation)),
+            run.breaker, RETRIES, on_error=failed_attempt)
+        return response
+    
+    options = row_options(run, text)
+    try:
+        response = await generate(options)
+        rerun = full_budget_rerun(run, text, response, options)
+        if rerun:
+            options, response = rerun, await generate(rerun)
+    except Exception as e:
+        if row is not None:
+            run.failures.record(row, e)
+        return None
+    if pacer and not response['cached']:
+        pacer.record(time.time() - start, ok=True)
+    record_row(run, row, text, response, options, time.time() - start, occupation)
+    return clean_output(response['response'])
+
+
+def model_available(client=ollama):
+    """True if the Ollama behind `client` has MODEL pulled"""
+    models = client.list()
+    if hasattr(models, 'models'):
+        names = [m.model for m in models.models]
+    else:
+        names = [m.get('model', m.get('name', '')) for m in models.get('models', [])]
+    
+    model_base = MODEL.split(':')[0]
+    return any(model_base in str(n) for n in names)
 
 
 def check_ollama():
     """Verify Ollama is running"""
     try:
-        models = ollama.list()
-        if hasattr(models, 'models'):
-            names = [m.model for m in models.models]
-        else:
-            names = [m.get('model', m.get('name', '')) for m in models.get('models', [])]
-        
-        if not any('llama3' in str(n) for n in names):
+        if not model_available():
             print(f"❌ Model '{MODEL}' not found. Run: ollama pull {MODEL}")
             return False
         print(f"✓ Ollama ready with {MODEL}")
@@ -122,73 +459,570 @@ def check_ollama():
         return False
 
 
+def is_done(df, i):
+    """True if row i already has a humanized value"""
+    value = df.at[i, NEW_COLUMN]
+    return pd.notna(value) and bool(str(value).strip())
+
+
+def screen_junk(df):
+    """Flag junk pledges in JUNK_COLUMN before any generation"""
+    if JUNK_FILTER == 'off':
+        return
+    df[JUNK_COLUMN] = classify_junk(df[PLEDGE_COLUMN])
+    action = "skipped" if JUNK_FILTER == 'skip' else "tagged (still humanized)"
+    print(f"✓ Junk filter: {junk_summary(df[JUNK_COLUMN])} {action}")
+
+
+def pending_rows(df):
+    """Row indices from START_ROW onward that still need humanizing"""
+    skip_junk = JUNK_FILTER == 'skip' and JUNK_COLUMN in df
+    return [i for i in df.index if i >= START_ROW and not is_done(df, i)
+            and not (skip_junk and df.at[i, JUNK_COLUMN])]
+
+
+def process_sequential(run, df, rows, pacer, journal):
+    """Original loop: one blocking request at a time, journal synced every batch"""
+    total = len(df)
+    processed = 0
+    start_time = time.time()
+    
+    for batch_start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[batch_start:batch_start + BATCH_SIZE]
+        
+        pbar = tqdm(batch, 
+                   desc=f"Batch {batch_start//BATCH_SIZE + 1}",
+                   unit="row", bar_format=BAR_FORMAT)
+        
+        for i in pbar:
+            original = df.at[i, PLEDGE_COLUMN]
+            humanized = humanize(run, original, pacer, row=i,   # Paces itself before real model calls
+                                 occupation=row_occupation(df, i))
+            store(run, df, journal, i, humanized)
+            processed += 1
+            show_progress(run, pbar, humanized)
+        
+        # Rows are journaled as they finish; make the batch durable
+        journal.sync()
+        
+        elapsed = time.time() - start_time
+        rate = processed / elapsed if elapsed > 0 else 0
+        done = df[NEW_COLUMN].notna().sum()
+        print(f"✓ Saved! {done}/{total} done | {rate:.1f} rows/sec")
+        batch_saved(run, print)
+        print()
+    
+    return processed
+
+
+async def process_concurrent(run, df, rows, concurrency, pacer, journal, desc="Concurrent"):
+    """
+    Humanize `rows` with up to `concurrency` requests in flight.
+    Results land in df by row index, so NEW_COLUMN keeps file order no matter
+    which request finishes first. The pacer spaces out real requests, and
+    each row is journaled as it completes.
+    """
+    client = ollama.AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    dispatch_lock = asyncio.Lock()
+    total = len(df)
+    completed = 0
+    start_time = time.time()
+    pbar = tqdm(total=len(rows), desc=desc, unit="row", bar_format=BAR_FORMAT)
+    
+    async def pace():
+        # Space out real requests; cache hits skip this entirely
+        async with dispatch_lock:
+            delay = pacer.next_delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+    
+    async def work(i):
+        async with semaphore:
+            return i, await humanize_async(run, client, df.at[i, PLEDGE_COLUMN], pacer, pace,
+                                           row=i, occupation=row_occupation(df, i))
+    
+    tasks = [asyncio.create_task(work(i)) for i in rows]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            i, humanized = await finished
+            store(run, df, journal, i, humanized)
+            completed += 1
+            pbar.update(1)
+            show_progress(run, pbar, humanized)
+            
+            if completed % BATCH_SIZE == 0:
+                journal.sync()
+                elapsed = time.time() - start_time
+                done = df[NEW_COLUMN].notna().sum()
+                pbar.write(f"✓ Saved! {done}/{total} done | {completed / elapsed:.1f} rows/sec")
+                batch_saved(run, pbar.write)
+    finally:
+        # Ctrl+C cancels the run - drop queued requests so nothing lingers
+        for task in tasks:
+            task.cancel()
+        pbar.close()
+    
+    return completed
+
+
+def humanize_on(run, client, text, row=None, occupation=None):
+    """Pool worker: humanize via one host's client, letting errors reach the pool"""
+    start = time.time()
+    options = row_options(run, text)
+    response = cached_generate(MODEL, HUMANIZE_PROMPT, text, options, client=client,
+                               refresh=row is not None and row in run.failures, **request_kwargs(occupation))
+    rerun = full_budget_rerun(run, text, response, options)
+    if rerun:
+        options = rerun
+        response = cached_generate(MODEL, HUMANIZE_PROMPT, text, options, client=client,
+                                   refresh=row is not None and row in run.failures, **request_kwargs(occupation))
+    record_row(run, row, text, response, options, time.time() - start, occupation)
+    return clean_output(response['response']), None if response['cached'] else response.get('eval_count')
+
+
+def process_pool(run, df, rows, pool, journal):
+    """
+    Humanize `rows` across every host in the pool. Rows that fail on all
+    attempts are left empty and queued in FAILURES_FILE, as in humanize().
+    """
+    total = len(df)
+    completed = 0
+    start_time = time.time()
+    pbar = tqdm(total=len(rows), desc="Pool", unit="row", bar_format=BAR_FORMAT)
+    
+    def on_result(i, humanized, error):
+        nonlocal completed
+        if error is not None:
+            pbar.write(f"⚠ Row {i} failed on every attempt: {error}")
+            run.failures.record(i, error, pool.max_attempts)
+            humanized = None
+        store(run, df, journal, i, humanized)
+        completed += 1
+        pbar.update(1)
+        show_progress(run, pbar)
+        
+        if completed % BATCH_SIZE == 0:
+            journal.sync()
+            elapsed = time.time() - start_time
+            done = df[NEW_COLUMN].notna().sum()
+            pbar.write(f"✓ Saved! {done}/{total} done | {completed / elapsed:.1f} rows/sec")
+            batch_saved(run, pbar.write)
+    
+    # Blank rows need no model call
+    work = []
+    for i in rows:
+        text = df.at[i, PLEDGE_COLUMN]
+        if pd.isna(text) or not str(text).strip():
+            on_result(i, text, None)
+        else:
+            work.append(i)
+    
+    try:
+        pool.run(work, lambda client, i: humanize_on(run, client, df.at[i, PLEDGE_COLUMN], row=i,
+                                                     occupation=row_occupation(df, i)), on_result)
+    finally:
+        pool.stop()
+        pbar.close()
+    print("\nHosts:\n" + pool.summary())
+    return completed
+
+
+def process_packed(run, df, rows, pacer, journal):
+    """
+    Humanize `rows` K pledges per request. Pledges a pack loses (missing,
+    empty or duplicated in the JSON reply) are retried single-row; a pack
+    that errors outright is retried single-row as a whole.
+    """
+    todo = []                             # (row, text) of the pack in flight
+    
+    def record_item(pos, response, latency):
+        # Each pledge's share of the pack goes to the stats and the forecast
+        i, text = todo[pos]
+        if not response['cached']:
+            run.forecast.observe(text, latency)
+        num_predict = run.budget.budget(text) if run.budget else GENERATE_OPTIONS['num_predict']
+        run.stats.record(i, response, latency, num_predict)
+    
+    packer = Packer(MODEL, PACKED_PROMPT, {k: v for k, v in GENERATE_OPTIONS.items() if k != 'stop'},
+                    k=PACK_SIZE, k_max=PACK_MAX, auto=PACK_AUTO, keep_alive=KEEP_ALIVE,
+                    on_response=run.keeper.record, on_item=record_item, log=tqdm.write)
+    total = len(df)
+    completed = 0
+    start_time = time.time()
+    pbar = tqdm(total=len(rows), desc="Packed", unit="row", bar_format=BAR_FORMAT)
+    
+    def finish(i, humanized):
+        nonlocal completed
+        store(run, df, journal, i, humanized)
+        completed += 1
+        pbar.update(1)
+        show_progress(run, pbar)
+        if completed % BATCH_SIZE == 0:
+            journal.sync()
+            elapsed = time.time() - start_time
+            done = df[NEW_COLUMN].notna().sum()
+            pbar.write(f"✓ Saved! {done}/{total} done | {completed / elapsed:.1f} rows/sec")
+            batch_saved(run, pbar.write)
+    
+    # Single-row baseline for the comparison (model time only, like the packs)
+    baseline, rows = rows[:PACK_BASELINE_ROWS], rows[PACK_BASELINE_ROWS:]
+    live_before, before = run.stats.live_totals()
+    for i in baseline:
+        finish(i, humanize(run, df.at[i, PLEDGE_COLUMN], pacer, row=i, occupation=row_occupation(df, i)))
+    live_after, after = run.stats.live_totals()
+    single = live_after - live_before
+    baseline_rate = baseline_prompt = None
+    if single:
+        baseline_rate = single / ((after['latency_ms'] - before['latency_ms']) / 1000)
+        baseline_prompt = (after['prompt_tokens'] - before['prompt_tokens']) / single
+    
+    try:
+        pos = 0
+        while pos < len(rows):
+            pack = rows[pos:pos + packer.k]
+            pos += len(pack)
+            todo = []
+            for i in pack:
+                text = df.at[i, PLEDGE_COLUMN]
+                if pd.isna(text) or not str(text).strip():
+                    finish(i, text)           # Blank rows need no model call
+                else:
+                    todo.append((i, text))
+            if not todo:
+                continue
+            
+            limit = sum(run.budget.budget(t) for _, t in todo) if run.budget else None
+            pacer.wait()
+            start = time.time()
+            try:
+                results = packer.run_pack([t for _, t in todo], limit,
+                                          refresh={pos for pos, (i, _) in enumerate(todo) if i in run.failures})
+                pacer.record((time.time() - start) / len(todo), ok=True)
+            except MODEL_ERRORS as e:
+                # Unparseable replies and missing items come back as None and are
+                # retried below; anything else is a bug and propagates
+                pbar.write(f"⚠ Pack failed ({e}) - retrying its rows one by one")
+                pacer.record(time.time() - start, ok=False)
+                results = [None] * len(todo)
+            
+            for (i, text), humanized in zip(todo, results):
+                if humanized is None:
+                    humanized = humanize(run, text, pacer, row=i, occupation=row_occupation(df, i))
+                finish(i, humanized)
+    finally:
+        pbar.close()
+        for line in packer.report(baseline_rate, baseline_prompt):
+            print(f"✓ {line}")
+    return completed
+
+
+def sweep_concurrency(run, df, rows, pacer, journal):
+    """
+    Process SWEEP_ROWS real rows at each CONCURRENCY_SWEEP level and report
+    rows/sec, to find where the Ollama server saturates. Returns the rows
+    that are still pending afterwards.
+    """
+    print("Concurrency sweep:")
+    report = []
+    for level in CONCURRENCY_SWEEP:
+        chunk, rows = rows[:SWEEP_ROWS], rows[SWEEP_ROWS:]
+        if not chunk:
+            break
+        start = time.time()
+        asyncio.run(process_concurrent(run, df, chunk, level, pacer, journal, desc=f"Sweep x{level}"))
+        report.append((level, len(chunk) / (time.time() - start)))
+    
+    journal.sync()
+    print("\n  In-flight | rows/sec")
+    for level, rate in report:
+        print(f"  {level:>9} | {rate:.2f}")
+    if report:
+        best_level, best_rate = max(report, key=lambda r: r[1])
+        print(f"✓ Best: {best_level} in flight ({best_rate:.2f} rows/sec)\n")
+    return rows
+
+
+def process_rows(run, df, rows, pacer, journal, pool=None):
+    """Run `rows` through the configured engine (pool, packed, concurrent or sequential)"""
+    if pool:
+        return process_pool(run, df, rows, pool, journal)
+    if PACKED:
+        return process_packed(run, df, rows, pacer, journal)
+    if CONCURRENCY > 1:
+        asyncio.run(process_concurrent(run, df, rows, CONCURRENCY, pacer, journal))
+        return len(rows)
+    return process_sequential(run, df, rows, pacer, journal)
+
+
+def report_stats(run):
+    """Print the generation summary and write the per-row STATS_CSV"""
+    run.keeper.stop()
+    run.stats.close()
+    if run.failures.rows():
+        print(f"⚠ {run.failures.report()}")
+    if PROMETHEUS_FILE:
+        run.stats.write_prometheus(PROMETHEUS_FILE)
+    for line in run.stats.report():
+        print(f"✓ {line}")
+    if run.budget:
+        print(f"✓ {run.budget.report()}")
+    for line in run.keeper.report():
+        print(f"✓ {line}")
+    run.stats.write_csv(STATS_CSV)
+
+
+def dry_run(run, pacer, pool=None):
+    """
+    Humanize DRY_RUN_ROWS pending rows - one from each length bucket in turn,
+    so the sample has the file's length mix - and forecast the rest of
+    INPUT_CSV from their timings. Rows go to a scratch journal: nothing is
+    written to OUTPUT_CSV or JOURNAL_FILE, but the generations are cached.
+    """
+    df = pd.read_csv(INPUT_CSV)
+    df[NEW_COLUMN] = pd.NA
+    apply_journal(df, NEW_COLUMN, RowJournal(JOURNAL_FILE, INPUT_CSV).replay())
+    screen_junk(df)
+    rows = pending_rows(df)
+    copies = 0
+    if DEDUPE:
+        rows, followers = pick_representatives(dedupe_groups(df)[0], rows)
+        copies = len(followers)
+    sample = schedule(df, rows, PLEDGE_COLUMN, 'round_robin')[:DRY_RUN_ROWS]
+    run.forecast.add_pending(df, rows, PLEDGE_COLUMN)
+    print(f"✓ Dry run: calibrating on {len(sample)} of {len(rows)} pending rows "
+          f"({describe(df, sample, PLEDGE_COLUMN)})\n")
+    
+    scratch = RowJournal(f"{JOURNAL_FILE}.dryrun")
+    start_time = time.time()
+    try:
+        process_rows(run, df, sample, pacer, scratch, pool)
+    except KeyboardInterrupt:
+        print("\n\n⚠ Calibration stopped early - forecasting from the rows done so far")
+    finally:
+        scratch.close()
+        if scratch.exists():
+            os.remove(scratch.path)
+        run.keeper.stop()
+    
+    print("=" * 60)
+    calibrated = sum(1 for i in sample if i not in run.forecast.pending)
+    print(f"✓ Calibration: {calibrated} rows in {time.time() - start_time:.1f}s")
+    print(f"✓ {run.forecast.summary()}")
+    if copies:
+        print(f"✓ Plus {copies} duplicate rows copied without a model call")
+    for line in run.stats.report():
+        print(f"✓ {line}")
+    print(f"✓ Nothing written to {OUTPUT_CSV}" + (" - the sample is cached for the real run" if cache_report() else ""))
+    print("=" * 60)
+
+
+def run_streaming(run, pacer, pool=None):
+    """
+    Humanize INPUT_CSV in STREAM_CHUNK_ROWS-row chunks so memory stays flat.
+    
+    Finished chunks are appended to OUTPUT_CSV.partial; OUTPUT_CSV.stream.json
+    records how many input rows and output bytes are committed. The journal
+    only holds rows of the chunk in progress, so resume skips committed chunks
+    without parsing them, trims any half-written tail of the partial file and
+    replays just the current chunk.
+    """
+    partial = f"{OUTPUT_CSV}.partial"
+    state_file = f"{OUTPUT_CSV}.stream.json"
+    state = {'rows_done': 0, 'bytes_done': 0}
+    if os.path.exists(state_file):
+        with open(state_file) as f:
+            state = json.load(f)
+        print(f"✓ Resuming stream: {state['rows_done']} rows already written")
+    
+    # Drop anything written after the last committed chunk
+    if os.path.exists(partial):
+        os.truncate(partial, state['bytes_done'])
+    
+    journal = RowJournal(JOURNAL_FILE, INPUT_CSV)
+    pos = state['rows_done']
+    processed = 0
+    start_time = time.time()
+    reader = pd.read_csv(INPUT_CSV, chunksize=STREAM_CHUNK_ROWS,
+                         skiprows=range(1, pos + 1))
+    
+    try:
+        for chunk in reader:
+            chunk.index = range(pos, pos + len(chunk))
+            chunk[NEW_COLUMN] = pd.NA
+            apply_journal(chunk, NEW_COLUMN, journal.replay())
+            
+            screen_junk(chunk)
+            rows = pending_rows(chunk)
+            groups = tokens = None
+            if DEDUPE:
+                groups, tokens = dedupe_groups(chunk)
+                journal.record_many(fan_out(chunk, groups, NEW_COLUMN, tokens).items())
+                rows, _ = pick_representatives(groups, pending_rows(chunk))
+            rows = scheduled(chunk, rows)
+            run.forecast.add_pending(chunk, rows, PLEDGE_COLUMN)  # ETA covers the current chunk
+            
+            processed += process_rows(run, chunk, rows, pacer, journal, pool)
+            if groups is not None:
+                processed += fill_copies(run, chunk, groups, tokens, journal, pacer, pool)[1]
+            journal.sync()
+            
+            # Commit: append the chunk, then move the high-water mark past it
+            with open(partial, 'a', newline='', encoding='utf-8') as f:
+                chunk.to_csv(f, header=(pos == 0), index=False)
+                f.flush()
+                os.fsync(f.fileno())
+            pos += len(chunk)
+            state = {'rows_done': pos, 'bytes_done': os.path.getsize(partial)}
+            with open(f"{state_file}.tmp", 'w') as f:
+                json.dump(state, f)
+            os.replace(f"{state_file}.tmp", state_file)
+            journal.compact(lambda row: row >= pos)
+            
+            elapsed = time.time() - start_time
+            print(f"✓ Chunk committed: {pos} rows written | {processed / elapsed:.1f} rows/sec\n")
+    
+    except KeyboardInterrupt:
+        journal.close()
+        print("\n\n⚠ Stopping... finished rows of this chunk are in the journal")
+        print(f"✓ {pos} rows committed to {partial}")
+        print(f"✓ Resume anytime - it will continue from row {pos}")
+        report_stats(run)
+        return
+    
+    journal.close()
+    os.replace(partial, OUTPUT_CSV)
+    os.remove(state_file)
+    journal.delete()
+    elapsed = time.time() - start_time
+    
+    print("=" * 60)
+    print("✓ COMPLETE!")
+    print(f"✓ Processed: {processed} rows in {elapsed/60:.1f} min")
+    print(f"✓ Output: {OUTPUT_CSV}")
+    if cache_report():
+        print(f"✓ {cache_report()}")
+    report_stats(run)
+    print("=" * 60)
+
+
 def main():
     print("=" * 60)
     print("AI HUMANIZER v2.0 - Optimized for Undetectability")
     print("=" * 60)
     print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
     
-    if not check_ollama():
+    run = init_run()
+    pool = None
+    if OLLAMA_HOSTS:
+        pool = HostPool(OLLAMA_HOSTS, model_available, workers_per_host=CONCURRENCY, log=tqdm.write)
+        if not pool.probe_all():
+            print(f"❌ No host in OLLAMA_HOSTS has {MODEL}. Run: ollama pull {MODEL}")
+            return
+    elif not check_ollama():
+        return
+    
+    if WARM_UP:
+        if pool:
+            run.keeper.clients = [h.client for h in pool.hosts if h.healthy]
+        try:
+            run.keeper.warm_up()
+        except Exception as e:
+            print(f"⚠ Warm-up failed ({e}) - the first row will load the model")
+        run.keeper.start()
+    
+    if PROMETHEUS_PORT:
+        run.stats.serve_prometheus(PROMETHEUS_PORT)
+        print(f"✓ Prometheus metrics at http://localhost:{PROMETHEUS_PORT}/metrics")
+    
+    pacer = make_pacer(RATE_MODE, DELAY_MIN, DELAY_MAX, log=tqdm.write)
+    if DRY_RUN_ROWS:
+        dry_run(run, pacer, pool)
+        return
+    if STREAM_CHUNK_ROWS:
+        print(f"✓ Streaming {INPUT_CSV} in chunks of {STREAM_CHUNK_ROWS} rows (Ctrl+C to stop safely)\n")
+        run_streaming(run, pacer, pool)
         return
     
-    df = load_or_resume()
+    journal = RowJournal(JOURNAL_FILE, INPUT_CSV)
+    df = load_or_resume(journal)
+    screen_junk(df)
     total = len(df)
     done = df[NEW_COLUMN].notna().sum()
     remaining = total - done
     
     print(f"✓ Rows remaining: {remaining}")
-    print(f"✓ Est. time: {remaining * 1.5 / 60:.1f} min")
+    print(f"✓ Est. time: measured once {run.forecast.min_rows} rows are generated "
+          f"(set DRY_RUN_ROWS for an up-front forecast)")
     print(f"\nProcessing... (Ctrl+C to stop safely)\n")
     
-    processed = 0
+    groups = tokens = None
+    prefilled = {}
+    if DEDUPE:
+        groups, tokens = dedupe_groups(df)
+        prefilled = fan_out(df, groups, NEW_COLUMN, tokens)
+        journal.record_many(prefilled.items())
+    rows = pending_rows(df)
+    
+    if RETRY_FAILED:
+        queued = run.failures.rows()
+        for i in queued:
+            if i in df.index and is_done(df, i):
+                run.failures.resolve(i)           # Done since it was queued (e.g. copied from a duplicate)
+        rows = [i for i in rows if i in queued]
+        print(f"✓ Retry failed: {len(rows)} queued rows to reprocess from {FAILURES_FILE}")
+    
+    if DEDUPE:
+        # Picked from the rows actually queued, so every group in `rows` keeps a representative
+        rows, followers = pick_representatives(groups, rows)
+        print(f"✓ Dedupe: {len(rows)} distinct pledges to generate, "
+              f"{len(followers)} duplicates to copy afterwards, {len(prefilled)} filled from finished rows")
+    
+    rows = scheduled(df, rows)
+    grouping = f" grouped by {OCCUPATION_COLUMN}" if OCCUPATION_PREFIX else ""
+    print(f"✓ Schedule: {SCHEDULE}{grouping} | {describe(df, rows, PLEDGE_COLUMN)}")
+    run.forecast.add_pending(df, rows, PLEDGE_COLUMN)
+    
     start_time = time.time()
+    copied = generated = 0
     
     try:
-        for batch_start in range(START_ROW, total, BATCH_SIZE):
-            batch_end = min(batch_start + BATCH_SIZE, total)
-            
-            pbar = tqdm(range(batch_start, batch_end), 
-                       desc=f"Batch {batch_start//BATCH_SIZE + 1}",
-                       unit="row")
-            
-            for i in pbar:
-                # Skip if already done
-                if pd.notna(df.at[i, NEW_COLUMN]) and str(df.at[i, NEW_COLUMN]).strip():
-                    continue
-                
-                original = df.at[i, PLEDGE_COLUMN]
-                humanized = humanize(original)
-                df.at[i, NEW_COLUMN] = humanized
-                processed += 1
-                
-                # Show preview
-                if humanized:
-                    preview = str(humanized)[:35] + "..." if len(str(humanized)) > 35 else humanized
-                    pbar.set_postfix_str(preview)
-                
-                time.sleep(random.uniform(DELAY_MIN, DELAY_MAX))
-            
-            # Save after each batch
-            df.to_csv(OUTPUT_CSV, index=False)
-            
-            elapsed = time.time() - start_time
-            rate = processed / elapsed if elapsed > 0 else 0
-            print(f"✓ Saved! {batch_end}/{total} done | {rate:.1f} rows/sec\n")
+        if CONCURRENCY_SWEEP and not pool:
+            processed = len(rows)
+            rows = sweep_concurrency(run, df, rows, pacer, journal)
+            process_rows(run, df, rows, pacer, journal)
+        else:
+            processed = process_rows(run, df, rows, pacer, journal, pool)
+        if groups is not None:
+            copied, generated = fill_copies(run, df, groups, tokens, journal, pacer, pool)
+            processed += generated
     
     except KeyboardInterrupt:
         print("\n\n⚠ Stopping... Saving progress...")
-        df.to_csv(OUTPUT_CSV, index=False)
-        print(f"✓ Saved to {OUTPUT_CSV}")
+        if groups is not None:
+            journal.record_many(fan_out(df, groups, NEW_COLUMN, tokens).items())
+        journal.close()
+        atomic_write_csv(df, OUTPUT_CSV)
+        print(f"✓ Saved to {OUTPUT_CSV} (every finished row is also in {JOURNAL_FILE})")
         print(f"✓ Resume anytime - it will continue from where it stopped")
+        report_stats(run)
         return
     
-    df.to_csv(OUTPUT_CSV, index=False)
+    journal.close()
+    atomic_write_csv(df, OUTPUT_CSV)
+    journal.delete()                      # OUTPUT_CSV now holds every finished row
     elapsed = time.time() - start_time
     
     print("=" * 60)
     print("✓ COMPLETE!")
     print(f"✓ Processed: {processed} rows in {elapsed/60:.1f} min")
+    if groups is not None:
+        regenerated = f" ({generated} near-duplicates generated instead)" if generated else ""
+        print(f"✓ Dedupe: {copied + len(prefilled)} model calls saved{regenerated}")
     print(f"✓ Output: {OUTPUT_CSV}")
+    if cache_report():
+        print(f"✓ {cache_report()}")
+    report_stats(run)
     print("=" * 60)
 
 
@@ -0,0 +1,157 @@
+"""
+Humanizer command line - one entry point for the common jobs.
+
+    python humanizer.py run [--concurrency N] [--packed] [--stream-chunk-rows N] [--start-row N] [--dry-run N]
+                            [--retry-failed]
+    python humanizer.py sample [n] [--seed S]
+    python humanizer.py check [--model M]
+    python humanizer.py gate [--requeue]
+    python humanizer.py bench [--repeat N]
+
+Only the standard library is imported up front. pandas, ollama and tqdm are
+loaded inside the subcommand that needs them, so `--help` and `check`
+(a plain HTTP call to Ollama) cost little more than starting Python itself -
+handy for cron jobs and health checks. `bench` times the cold start of each
+subcommand in a fresh interpreter.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_MODEL = 'llama3:8b'
+CHECK_TIMEOUT = 5                     # Seconds before `check` gives up on Ollama
+
+
+def ollama_url():
+    """Base URL of the Ollama server from OLLAMA_HOST (same default as the ollama client)"""
+    host = os.environ.get('OLLAMA_HOST', '').strip() or '127.0.0.1:11434'
+    if '://' not in host:
+        host = f"http://{host}"
+    return host.rstrip('/')
+
+
+def cmd_run(args):
+    import humanize_v2 as pipeline
+
+    if args.concurrency is not None:
+        pipeline.CONCURRENCY = args.concurrency
+    if args.packed:
+        pipeline.PACKED = True
+    if args.stream_chunk_rows is not None:
+        pipeline.STREAM_CHUNK_ROWS = args.stream_chunk_rows
+    if args.start_row is not None:
+        pipeline.START_ROW = args.start_row
+    if args.dry_run is not None:
+        pipeline.DRY_RUN_ROWS = args.dry_run
+    if args.retry_failed:
+        pipeline.RETRY_FAILED = True
+    pipeline.main()
+    return 0
+
+
+def cmd_sample(args):
+    import sampler
+
+    sampler.main(args.n if args.n is not None else sampler.DEFAULT_SIZE,
+                 args.seed if args.seed is not None else sampler.DEFAULT_SEED)
+    return 0
+
+
+def cmd_check(args):
+    """Is Ollama up and is the model pulled? Exit code 0 = ready"""
+    import urllib.error
+    import urllib.request
+
+    url = f"{ollama_url()}/api/tags"
+    try:
+        with urllib.request.urlopen(url, timeout=CHECK_TIMEOUT) as response:
+            models = json.load(response).get('models', [])
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        print(f"❌ Ollama not reachable at {ollama_url()}: {e}")
+        print("   Start it with: ollama serve")
+        return 1
+
+    names = [m.get('model') or m.get('name', '') for m in models]
+    base = args.model.split(':')[0]
+    if not any(base in name for name in names):
+        print(f"❌ Model '{args.model}' not found. Run: ollama pull {args.model}")
+        return 1
+    print(f"✓ Ollama ready at {ollama_url()} with {args.model}")
+    return 0
+
+
+def cmd_gate(args):
+    import quality_gate
+
+    return quality_gate.main(['--requeue'] if args.requeue else [])
+
+
+def cmd_bench(args):
+    """Cold-start time of each subcommand in a fresh interpreter"""
+    script = os.path.abspath(__file__)
+    cases = [
+        ("python (empty interpreter)", ['-c', 'pass']),
+        ("humanizer --help", [script, '--help']),
+        ("humanizer run --help", [script, 'run', '--help']),
+        ("humanizer sample --help", [script, 'sample', '--help']),
+        ("humanizer check", [script, 'check']),
+        ("import sampler (sample)", ['-c', 'import sampler']),
+        ("import humanize_v2 (run)", ['-c', 'import humanize_v2']),
+    ]
+    print(f"Cold start, best/median of {args.repeat} runs:\n")
+    print(f"  {'command':<28} {'best':>8} {'median':>8}")
+    for label, argv in cases:
+        times = []
+        for run in range(args.repeat + 1):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *argv], stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL, cwd=os.path.dirname(script))
+            if run:                       # First run only warms the OS file cache
+                times.append((time.perf_counter() - start) * 1000)
+        print(f"  {label:<28} {min(times):>6.0f}ms {statistics.median(times):>6.0f}ms")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='humanizer', description="Humanize pledges with a local Ollama model")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help="humanize the input CSV (humanize_v2.py)")
+    run.add_argument('--concurrency', type=int, help="requests in flight (overrides CONCURRENCY)")
+    run.add_argument('--packed', action='store_true', help="several pledges per request")
+    run.add_argument('--stream-chunk-rows', type=int, help="process the CSV in chunks of N rows")
+    run.add_argument('--start-row', type=int, help="skip rows before this one")
+    run.add_argument('--dry-run', type=int, metavar='N', help="calibrate on N rows and forecast the whole CSV")
+    run.add_argument('--retry-failed', action='store_true', help="reprocess only the rows in the failure queue")
+    run.set_defaults(func=cmd_run)
+
+    sample = sub.add_parser('sample', help="write a stratified evaluation sample (sampler.py)")
+    sample.add_argument('n', nargs='?', type=int, help="rows to sample")
+    sample.add_argument('--seed', type=int, help="random seed")
+    sample.set_defaults(func=cmd_sample)
+
+    check = sub.add_parser('check', help="check Ollama is running and the model is pulled")
+    check.add_argument('--model', default=DEFAULT_MODEL)
+    check.set_defaults(func=cmd_check)
+
+    gate = sub.add_parser('gate', help="score the output CSV and requeue failing rows (quality_gate.py)")
+    gate.add_argument('--requeue', action='store_true', help="queue failing rows for `run --retry-failed`")
+    gate.set_defaults(func=cmd_gate)
+
+    bench = sub.add_parser('bench', help="time the cold start of each subcommand")
+    bench.add_argument('--repeat', type=int, default=5)
+    bench.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
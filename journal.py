@@ -0,0 +1,154 @@
+"""
+Append-only checkpoint journal for the humanize scripts.
+
+Each finished row is appended as one JSON line ({"row": i, "value": "..."})
+the moment it completes, instead of rewriting the whole output CSV every
+batch. Resume replays the journal on top of the input CSV; the output CSV is
+written once at the end through a temp file and an atomic rename, so a crash
+can never leave a half-written copy behind, and the journal is then deleted.
+
+Given the input file, a new journal starts with a header line holding its
+SHA-256 ({"input": "..."}). A journal written for a different input is never
+replayed: it is moved aside to <path>.stale when the next row is recorded.
+"""
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+
+def file_fingerprint(path, block=1 << 20):
+    """SHA-256 of a file, read in 1 MB blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RowJournal:
+    """JSONL journal of finished rows; later entries for a row win on replay"""
+
+    def __init__(self, path, source=None):
+        self.path = path
+        self.source = source              # Input file the rows belong to (None = unchecked)
+        self.fingerprint = None
+        self.file = None
+
+    def _input_fingerprint(self):
+        if self.fingerprint is None and self.source and os.path.exists(self.source):
+            self.fingerprint = file_fingerprint(self.source)
+        return self.fingerprint
+
+    def header(self):
+        """Input fingerprint from the journal's header line (None for headerless journals)"""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, encoding='utf-8') as f:
+            try:
+                first = json.loads(f.readline())
+            except json.JSONDecodeError:
+                return None
+        return first.get('input') if isinstance(first, dict) else None
+
+    def stale(self):
+        """True if the journal's header names a different input than `source`"""
+        header = self.header()
+        return header is not None and self._input_fingerprint() not in (None, header)
+
+    def _open(self):
+        if self.file is None:
+            if self.stale():
+                os.replace(self.path, f"{self.path}.stale")
+            torn = False
+            fresh = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            if not fresh:
+                with open(self.path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b'\n'
+            self.file = open(self.path, 'a', encoding='utf-8')
+            if torn:
+                # Crash mid-line: start fresh so the next entry isn't glued to it
+                self.file.write('\n')
+            if fresh and self._input_fingerprint():
+                self.file.write(json.dumps({'input': self.fingerprint}) + '\n')
+        return self.file
+
+    def record(self, row, value):
+        """Append one finished row (blank/NaN values are not journaled)"""
+        if value is None or pd.isna(value):
+            return
+        f = self._open()
+        f.write(json.dumps({'row': int(row), 'value': str(value)}, ensure_ascii=False) + '\n')
+        f.flush()
+
+    def record_many(self, items):
+        for row, value in items:
+            self.record(row, value)
+
+    def sync(self):
+        """fsync so journaled rows survive a power cut, not just a crash"""
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def replay(self):
+        """{row: value} from the journal; a torn last line from a crash is skipped"""
+        entries = {}
+        if not os.path.exists(self.path) or self.stale():
+            return entries
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if 'row' in entry:
+                    entries[entry['row']] = entry['value']
+        return entries
+
+    def compact(self, keep):
+        """Rewrite the journal keeping only rows where keep(row) is true"""
+        entries = {r: v for r, v in self.replay().items() if keep(r)}
+        header = self.header()
+        self.close()
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            if header is not None:
+                f.write(json.dumps({'input': header}) + '\n')
+            for row, value in entries.items():
+                f.write(json.dumps({'row': row, 'value': value}, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def delete(self):
+        """Remove the journal once the output CSV holds every finished row"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def close(self):
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+
+def apply_journal(df, column, entries):
+    """Write replayed {row: value} entries into df[column]; returns how many applied"""
+    rows = [r for r in entries if r in df.index]
+    if rows:
+        df.loc[rows, column] = [entries[r] for r in rows]
+    return len(rows)
+
+
+def atomic_write_csv(df, path):
+    """Write df to path via a temp file + os.replace, never leaving a partial CSV"""
+    tmp = f"{path}.tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
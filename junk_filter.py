@@ -0,0 +1,150 @@
+"""
+Rule-based junk pre-filter for pledges.
+
+Junk rows (about 5.7% in the manual review, see junk_entries_log.txt) used
+to be found by hand and still cost a full generation each. This scores the
+whole pledge column in one vectorized pandas pass and names a reason per row:
+
+  short        fewer than MIN_WORDS words ("help india grow.")
+  template     the pledge with its Title-case words masked is shared by
+               TEMPLATE_MIN_COUNT+ rows ("As a X, I will make sure my work
+               helps build a better world.") - counted by template hash
+  boilerplate  most sentences are stock lines seen in BOILERPLATE_MIN_COUNT+
+               rows ("Together we can build a better India.")
+  circular     "gifts are bribes, bribes is subtle, subtle is legal" chains
+  repetitive   zlib compression ratio below MIN_COMPRESSION on a long pledge
+
+The template and boilerplate counts are relative to the column being
+screened, so screen a whole file (or a large chunk) at once.
+
+    python junk_filter.py                 # precision/recall against the rated CSVs
+    python junk_filter.py --csv FILE      # reasons for one file
+"""
+import argparse
+import os
+import zlib
+
+import pandas as pd
+
+# ==================== CONFIGURATION ====================
+MIN_WORDS = 12
+TEMPLATE_MIN_COUNT = 3
+BOILERPLATE_MIN_COUNT = 5
+BOILERPLATE_SHARE = 0.5               # Share of a pledge's sentences that are stock lines
+CIRCULAR_LINKS = 2                    # "..., X is" links that make a chain
+MIN_COMPRESSION = 0.5                 # Compressed/raw bytes; repeated text compresses well
+COMPRESSION_MIN_WORDS = 20            # Short text never compresses well - only judge long ones
+
+RATED_FILES = ['all_pledges_rated.csv']
+RATED_TEXT_COLUMN = 'pledge_text'
+RATING_COLUMN = 'quality_rating'
+JUNK_RATING = 'JUNK'
+
+REASONS = ('short', 'template', 'boilerplate', 'circular', 'repetitive')
+WORD_RE = r"[a-z0-9']+"
+TITLE_WORDS_RE = r"(?<!^)\b[A-Z]\w*(?:[ -][A-Z]\w*)*"   # Occupations, places, "I" - not the first word
+CIRCULAR_RE = r"(?i)\b(\w+)\s*,\s*\1\s+(?:is|are|was|means)\b"
+
+
+def compression_ratio(text):
+    """zlib-compressed size over raw size per row"""
+    raw = text.str.encode('utf-8')
+    return raw.map(lambda b: len(zlib.compress(b)) / len(b) if b else 1.0).astype(float)
+
+
+def template_counts(text):
+    """Rows sharing each row's template (Title-case words masked), via pandas hashing"""
+    template = (text.str.replace(TITLE_WORDS_RE, 'X', regex=True).str.lower()
+                .str.replace(r"[^a-z ]+", ' ', regex=True).str.split().str.join(' '))
+    hashes = pd.util.hash_pandas_object(template, index=False)
+    return hashes.map(hashes.value_counts()).set_axis(text.index)
+
+
+def boilerplate_share(text):
+    """Share of each row's sentences that appear in BOILERPLATE_MIN_COUNT+ rows"""
+    sentences = (text.str.lower().str.replace(r"[^a-z.!? ]+", '', regex=True)
+                 .str.split(r"[.!?]+", regex=True).explode().str.strip())
+    sentences = sentences[sentences.str.len() > 0]
+    if sentences.empty:
+        return pd.Series(0.0, index=text.index)
+    stock = sentences.map(sentences.value_counts()) >= BOILERPLATE_MIN_COUNT
+    return stock.groupby(level=0).mean().reindex(text.index, fill_value=0.0)
+
+
+def features(text):
+    """Per-row feature frame for a Series of pledges"""
+    text = text.astype('string').fillna('')
+    result = pd.DataFrame(index=text.index)
+    result['words'] = text.str.lower().str.count(WORD_RE)
+    result['compression'] = compression_ratio(text)
+    result['template_count'] = template_counts(text)
+    result['boilerplate_share'] = boilerplate_share(text)
+    result['circular_links'] = text.str.count(CIRCULAR_RE)
+    return result
+
+
+def classify(text):
+    """Junk reason per row ('' = keep); blank pledges are left to the humanizer"""
+    f = features(text)
+    blank = f['words'] == 0
+    flags = pd.DataFrame({
+        'short': f['words'] < MIN_WORDS,
+        'template': f['template_count'] >= TEMPLATE_MIN_COUNT,
+        'boilerplate': f['boilerplate_share'] >= BOILERPLATE_SHARE,
+        'circular': f['circular_links'] >= CIRCULAR_LINKS,
+        'repetitive': (f['compression'] < MIN_COMPRESSION) & (f['words'] >= COMPRESSION_MIN_WORDS),
+    }, index=text.index)
+    flags = flags[list(REASONS)] & ~blank.to_numpy()[:, None]
+    return flags.dot(pd.Index([f"{r}," for r in REASONS])).str.rstrip(',')
+
+
+def summary(reasons):
+    """'N rows (short x, template y, ...)' for progress output"""
+    flagged = reasons[reasons != '']
+    counts = flagged.str.split(',').explode().value_counts()
+    kinds = ", ".join(f"{name} {n}" for name, n in counts.items())
+    return f"{len(flagged)} rows" + (f" ({kinds})" if kinds else "")
+
+
+def evaluate(paths=RATED_FILES):
+    """Precision/recall of the filter against the manual JUNK ratings"""
+    for path in paths:
+        df = pd.read_csv(path)
+        truth = df[RATING_COLUMN].eq(JUNK_RATING)
+        reasons = classify(df[RATED_TEXT_COLUMN])
+        flagged = reasons != ''
+        hits = (flagged & truth).sum()
+        print(f"{path}: {len(df)} rows, {truth.sum()} rated {JUNK_RATING}")
+        print(f"  {'reason':<12} {'flagged':>8} {'precision':>10} {'recall':>8}")
+        for reason in REASONS + ('any',):
+            mask = flagged if reason == 'any' else reasons.str.contains(reason)
+            tp = (mask & truth).sum()
+            precision = tp / mask.sum() if mask.sum() else 0.0
+            print(f"  {reason:<12} {mask.sum():>8} {precision:>10.1%} {tp / max(truth.sum(), 1):>8.1%}")
+        wrong = df.loc[flagged & ~truth, RATING_COLUMN].value_counts()
+        if len(wrong):
+            print("  False positives by rating: " + ", ".join(f"{k} {v}" for k, v in wrong.items()))
+        print(f"✓ Precision {hits / max(flagged.sum(), 1):.1%} | recall {hits / max(truth.sum(), 1):.1%}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flag junk pledges before generation")
+    parser.add_argument('--csv', help="screen this CSV instead of evaluating against the rated files")
+    parser.add_argument('--column', default='pledge', help="text column of --csv")
+    parser.add_argument('--out', help="write --csv with a junk_reason column to this path")
+    args = parser.parse_args(argv)
+
+    if not args.csv:
+        evaluate([p for p in RATED_FILES if os.path.exists(p)])
+        return
+    df = pd.read_csv(args.csv)
+    reasons = classify(df[args.column])
+    print(f"✓ {args.csv}: {summary(reasons)} flagged as junk out of {len(df)}")
+    if args.out:
+        df['junk_reason'] = reasons
+        df.to_csv(args.out, index=False)
+        print(f"✓ Saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Local stand-in for the Ollama HTTP API, for benchmarks and dry runs.
+
+Serves /api/tags and /api/generate the way the humanize scripts use them:
+plain and streamed responses, num_predict (done_reason 'length'), `stop`
+sequences, packed requests with a JSON `format`, an empty prompt as a model
+load, and a one-slot system-prompt cache so prefix reuse shows up in
+prompt_eval_count.
+
+Timing is simulated with sleeps: a per-request overhead, prompt evaluation
+per token, and generation at a token rate drawn per request from a
+log-normal distribution. Rewrites are "Honestly, " plus the pledge, or -
+with a replay file - real responses recorded for the same pledge (any CSV
+with original/humanized or pledge/humanized_pledge columns, such as
+test_results.csv or a finished output CSV). Replayed rows also reuse the
+recorded eval_count and latency_s when the CSV has them.
+
+    python mock_ollama.py [--port 11434] [--tokens-per-sec 40] [--replay test_results.csv]
+"""
+import argparse
+import csv
+import json
+import math
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==================== CONFIGURATION ====================
+MODEL = 'llama3:8b'
+TOKENS_PER_SEC = 40.0                 # Median generation speed
+TOKEN_RATE_SIGMA = 0.2                # Log-normal spread of the per-request token rate
+PREFILL_MS_PER_TOKEN = 0.3            # Prompt evaluation cost
+OVERHEAD_MS = 5.0                     # Median per-request overhead (HTTP, scheduling)
+OVERHEAD_SIGMA = 0.5                  # Log-normal spread of the overhead
+LOAD_SECS = 0.0                       # Model load time paid by the first request
+RUNAWAY_RATE = 0.0                    # Share of rewrites that ramble on until num_predict
+LEAK_RATE = 0.0                       # Share of rewrites followed by a "(Note: ...)" leak
+PACK_LOSS = 0.0                       # Share of packed items left out of the JSON reply
+ERROR_RATE = 0.0                      # Share of requests answered with HTTP 500 (not seeded, so retries can pass)
+DEFAULT_NUM_PREDICT = 450
+
+ORIGINAL_COLUMNS = ('original', 'pledge')
+HUMANIZED_COLUMNS = ('humanized', 'humanized_pledge')
+LEAK = "\n\n(Note: I kept the original meaning and made it sound more natural.)"
+PACK_ITEM_RE = re.compile(r'^\[(\d+)\] (.*)$', re.M)
+
+
+def normalize(text):
+    return ' '.join(str(text).split())
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def load_replay(path):
+    """{normalized original: [(response, eval_count or None, latency_s or None), ...]}"""
+    recordings = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fields = reader.fieldnames or []
+        original = next((c for c in ORIGINAL_COLUMNS if c in fields), None)
+        humanized = next((c for c in HUMANIZED_COLUMNS if c in fields), None)
+        if not original or not humanized:
+            raise ValueError(f"{path} needs one of {ORIGINAL_COLUMNS} and one of {HUMANIZED_COLUMNS}")
+        for row in reader:
+            if not row[original] or not row[humanized]:
+                continue
+            tokens = row.get('eval_count')
+            latency = row.get('latency_s')
+            recordings.setdefault(normalize(row[original]), []).append((
+                row[humanized],
+                int(float(tokens)) if tokens else None,
+                float(latency) if latency else None,
+            ))
+    return recordings
+
+
+class QuietServer(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer that ignores clients hanging up mid-response and
+    tracks open connections, so a stopped mock also cuts its keep-alive
+    clients off like a real server going down
+    """
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self.connections_lock:
+            self.connections.add(request)
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self.connections_lock:
+            self.connections.discard(request)
+        super().shutdown_request(request)
+
+    def close_connections(self):
+        with self.connections_lock:
+            for request in self.connections:
+                try:
+                    request.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return                            # Client cancelled (early stop) or timed out
+        super().handle_error(request, client_address)
+
+
+class MockOllama:
+    """Threaded mock server; use as a context manager or call start()/stop()"""
+
+    def __init__(self, port=0, host='127.0.0.1', tokens_per_sec=TOKENS_PER_SEC,
+                 token_rate_sigma=TOKEN_RATE_SIGMA, prefill_ms_per_token=PREFILL_MS_PER_TOKEN,
+                 overhead_ms=OVERHEAD_MS, overhead_sigma=OVERHEAD_SIGMA, load_secs=LOAD_SECS,
+                 runaway_rate=RUNAWAY_RATE, leak_rate=LEAK_RATE, pack_loss=PACK_LOSS,
+                 error_rate=ERROR_RATE, replay=None, models=(MODEL,), seed=None):
+        self.tokens_per_sec = tokens_per_sec
+        self.token_rate_sigma = token_rate_sigma
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.overhead_ms = overhead_ms
+        self.overhead_sigma = overhead_sigma
+        self.load_secs = load_secs
+        self.runaway_rate = runaway_rate
+        self.leak_rate = leak_rate
+        self.pack_loss = pack_loss
+        self.error_rate = error_rate
+        self.replay = load_replay(replay) if replay else {}
+        self.models = list(models)
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.last_system = None
+        self.requests = 0
+        self.replayed = 0
+        self.server = QuietServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # ---------- simulation ----------
+
+    def _random(self, prompt):
+        """
+        Random source seeded by the prompt, so a pledge gets the same timing
+        and text on every run whatever order concurrent requests arrive in
+        """
+        return random.Random(f"{self.seed}:{prompt}") if self.seed is not None else random.Random()
+
+    def _draw(self, rng):
+        """(seconds of overhead, tokens/sec) for one request"""
+        overhead = self.overhead_ms / 1000 * math.exp(rng.gauss(0, self.overhead_sigma))
+        rate = self.tokens_per_sec * math.exp(rng.gauss(0, self.token_rate_sigma))
+        return overhead, rate
+
+    def _load(self):
+        """Seconds of model load this request pays"""
+        with self.lock:
+            self.requests += 1
+            load = 0.0 if self.loaded else self.load_secs
+            self.loaded = True
+        return load
+
+    def _prefill_tokens(self, system, prompt):
+        """Prompt tokens evaluated; the system prompt is free if it matches the last one"""
+        with self.lock:
+            reused = system == self.last_system
+            self.last_system = system
+        return estimate_tokens(prompt) + (0 if reused or not system else estimate_tokens(system))
+
+    def rewrite(self, text, rng):
+        """(response text, recorded eval_count, recorded latency_s) for one pledge"""
+        recorded = self.replay.get(normalize(text))
+        if recorded:
+            with self.lock:
+                self.replayed += 1
+            return rng.choice(recorded)
+        out = "Honestly, " + normalize(text)
+        if rng.random() < self.runaway_rate:
+            out += " and so on" * 200
+        if rng.random() < self.leak_rate:
+            out += LEAK
+        return out, None, None
+
+    # ---------- HTTP ----------
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, obj, code=200):
+                body = json.dumps(obj).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.rstrip('/') == '/api/tags':
+                    self._send({'models': [{'name': m, 'model': m, 'modified_at': '2024-01-01T00:00:00Z',
+                                            'size': 0, 'digest': '', 'details': {}} for m in mock.models]})
+                elif self.path.rstrip('/') == '/api/version':
+                    self._send({'version': 'mock'})
+                else:
+                    self._send({'error': 'not found'}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if self.path.rstrip('/') != '/api/generate':
+                    return self._send({'error': 'not found'}, 404)
+                if body.get('model') not in mock.models:
+                    return self._send({'error': f"model '{body.get('model')}' not found"}, 404)
+                mock.generate(self, body)
+
+            def stream(self, chunks):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for delay, chunk in chunks:
+                        if delay:
+                            time.sleep(delay)
+                        line = json.dumps(chunk).encode() + b'\n'
+                        self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+                        self.wfile.flush()
+                    self.wfile.write(b'0\r\n\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    pass                      # Client cancelled (early stop)
+
+        return Handler
+
+    def generate(self, handler, body):
+        model, prompt = body.get('model'), body.get('prompt') or ''
+        options = body.get('options') or {}
+        base = {'model': model, 'created_at': '2024-01-01T00:00:00Z', 'done': True}
+
+        load = self._load()
+        if prompt and random.random() < self.error_rate:
+            return handler._send({'error': 'mock failure'}, 500)
+        if not prompt:
+            time.sleep(load)
+            return handler._send(dict(base, response='', done_reason='load',
+                                      load_duration=int(load * 1e9), total_duration=int(load * 1e9)))
+
+        rng = self._random(prompt)
+        overhead, rate = self._draw(rng)
+        prompt_tokens = self._prefill_tokens(body.get('system'), prompt)
+        prefill = prompt_tokens * self.prefill_ms_per_token / 1000
+        num_predict = options.get('num_predict') or DEFAULT_NUM_PREDICT
+
+        if body.get('format'):
+            text, recorded_tokens, recorded_latency = self._packed(prompt, rng)
+        else:
+            pledge = prompt.split('Original pledge:')[-1].split('Human version:')[0]
+            text, recorded_tokens, recorded_latency = self.rewrite(pledge, rng)
+
+        done_reason = 'stop'
+        for stop in options.get('stop') or []:
+            if stop and stop in text:
+                text = text[:text.index(stop)]
+        words = re.findall(r'\S+\s*', text)
+        tokens = recorded_tokens or estimate_tokens(text)
+        if tokens > num_predict:
+            words = words[:max(1, len(words) * num_predict // tokens)]
+            text, tokens, done_reason = ''.join(words), num_predict, 'length'
+            recorded_latency = None
+        generation = tokens / rate
+        if recorded_latency:
+            generation = max(recorded_latency - prefill - overhead, 0.0)
+
+        time.sleep(load + overhead + prefill)
+        final = dict(base, response='', done_reason=done_reason, eval_count=tokens,
+                     eval_duration=int(generation * 1e9), prompt_eval_count=prompt_tokens,
+                     prompt_eval_duration=int(prefill * 1e9), load_duration=int(load * 1e9),
+                     total_duration=int((load + overhead + prefill + generation) * 1e9))
+        if not body.get('stream', False):
+            time.sleep(generation)
+            return handler._send(dict(final, response=text))
+
+        per_chunk = generation / max(len(words), 1)
+        chunks = [(per_chunk, dict(base, response=w, done=False)) for w in words]
+        handler.stream(chunks + [(0, final)])
+
+    def _packed(self, prompt, rng):
+        """JSON reply for a packed prompt of `[n] pledge` lines"""
+        rewrites = []
+        for n, pledge in PACK_ITEM_RE.findall(prompt):
+            if rng.random() < self.pack_loss:
+                continue
+            rewrites.append({'id': int(n), 'text': self.rewrite(pledge, rng)[0]})
+        return json.dumps({'rewrites': rewrites}, ensure_ascii=False), None, None
+
+    # ---------- lifecycle ----------
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server.close_connections()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Ollama server for benchmarks")
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--tokens-per-sec', type=float, default=TOKENS_PER_SEC)
+    parser.add_argument('--overhead-ms', type=float, default=OVERHEAD_MS)
+    parser.add_argument('--load-secs', type=float, default=LOAD_SECS)
+    parser.add_argument('--runaway-rate', type=float, default=RUNAWAY_RATE)
+    parser.add_argument('--leak-rate', type=float, default=LEAK_RATE)
+    parser.add_argument('--pack-loss', type=float, default=PACK_LOSS)
+    parser.add_argument('--error-rate', type=float, default=ERROR_RATE)
+    parser.add_argument('--replay', help="CSV of recorded responses to serve for matching pledges")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    mock = MockOllama(port=args.port, tokens_per_sec=args.tokens_per_sec, overhead_ms=args.overhead_ms,
+                      load_secs=args.load_secs, runaway_rate=args.runaway_rate, leak_rate=args.leak_rate,
+                      pack_loss=args.pack_loss, error_rate=args.error_rate, replay=args.replay, seed=args.seed)
+    print(f"✓ Mock Ollama serving {', '.join(mock.models)} at {mock.url} (Ctrl+C to stop)")
+    if mock.replay:
+        print(f"✓ Replaying responses for {len(mock.replay)} pledges from {args.replay}")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n✓ Served {mock.requests} requests ({mock.replayed} replayed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Near-duplicate clustering for pledges (MinHash + LSH).
+
+Exact dedupe (dedupe.py) misses template copies with small edits ("As a
+Doctor, I will..." / "As a Farmer, I will..."). Here each normalized pledge
+is cut into character SHINGLE_SIZE-grams, hashed, and summarized by a
+NUM_PERM-value MinHash signature - all in NumPy arrays. LSH banding hashes
+BAND_ROWS-value slices of every signature; rows that collide in any band
+are candidates, a candidate pair is kept when its signatures agree on at
+least THRESHOLD of their values (≈ Jaccard similarity), and kept pairs are
+merged by a vectorized union-find. Cost is linear in the text plus a sort
+per band, so millions of rows never meet the O(n²) pair comparison.
+
+near_duplicate_groups() returns group ids in the same form as
+dedupe.duplicate_groups(). The clusters are for picking representatives to
+rate or sample (--representatives), never for copying rewrites between rows:
+near-duplicates can differ in the occupation or a number.
+
+    python near_dup.py all_pledges_rated.csv --column pledge_text --out clusters.csv
+    python near_dup.py all_pledges_rated.csv --column pledge_text --representatives to_rate.csv
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from dedupe import normalize_text
+
+# ==================== CONFIGURATION ====================
+SHINGLE_SIZE = 5                      # Characters per shingle
+NUM_PERM = 128                        # MinHash values per signature
+BAND_ROWS = 8                         # Signature values per LSH band (NUM_PERM / BAND_ROWS bands)
+THRESHOLD = 0.8                       # Estimated Jaccard similarity to call two rows near-duplicates
+CHUNK_ROWS = 100_000                  # Rows shingled and signed at a time (bounds memory)
+SEED = 1
+
+MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def shingle_hashes(texts, k=SHINGLE_SIZE):
+    """
+    (row, hash) arrays of the distinct k-byte shingles of every text, sorted
+    by row. Texts shorter than k are one shingle.
+    """
+    padded = texts.str.pad(k, side='right')
+    encoded = padded.str.encode('utf-8')
+    lengths = encoded.str.len().to_numpy(dtype=np.int64)
+    data = np.frombuffer(b''.join(encoded.tolist()), dtype=np.uint8).astype(np.uint64)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    # Every position that begins a full shingle inside its own text
+    counts = lengths - k + 1
+    rows = np.repeat(np.arange(len(texts), dtype=np.uint64), counts)
+    positions = np.arange(counts.sum()) + np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+
+    h = np.zeros(len(positions), dtype=np.uint64)
+    for j in range(k):
+        h = h * np.uint64(257) + data[positions + j]
+    h = (h * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)      # Mix down to 32 bits
+
+    keys = np.sort((rows << np.uint64(32)) | h)                    # Sorted by row, then hash
+    keys = keys[np.r_[True, keys[1:] != keys[:-1]]]                # Distinct shingles per row
+    return keys >> np.uint64(32), (keys & MASK32).astype(np.uint32)
+
+
+def minhash_signatures(rows, hashes, n, num_perm=NUM_PERM, seed=SEED):
+    """(n, num_perm) uint32 MinHash signatures from shingle_hashes() output"""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 32, num_perm, dtype=np.uint32) | np.uint32(1)
+    b = rng.integers(0, 2 ** 32, num_perm, dtype=np.uint32)
+    signatures = np.full((num_perm, n), np.iinfo(np.uint32).max, dtype=np.uint32)
+    firsts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+    owners = rows[firsts].astype(np.int64)
+    for p in range(num_perm):
+        # a*x + b mod 2**32 with odd a permutes the 32-bit shingle hashes
+        values = hashes * a[p]
+        values += b[p]
+        signatures[p, owners] = np.minimum.reduceat(values, firsts)
+    return np.ascontiguousarray(signatures.T)
+
+
+def signatures_for(texts, chunk_rows=CHUNK_ROWS):
+    """MinHash signatures of a Series of texts, CHUNK_ROWS rows at a time"""
+    parts = []
+    for lo in range(0, len(texts), chunk_rows):
+        chunk = texts.iloc[lo:lo + chunk_rows]
+        rows, hashes = shingle_hashes(chunk)
+        parts.append(minhash_signatures(rows, hashes, len(chunk)))
+    return np.concatenate(parts) if parts else np.empty((0, NUM_PERM), dtype=np.uint32)
+
+
+def candidate_pairs(signatures, band_rows=BAND_ROWS, threshold=THRESHOLD, seed=SEED):
+    """Pairs that share an LSH band bucket and whose signatures agree on >= threshold"""
+    rng = np.random.default_rng(seed + 1)
+    multipliers = rng.integers(1, 2 ** 63, band_rows, dtype=np.uint64) | np.uint64(1)
+    left, right = [], []
+    for lo in range(0, signatures.shape[1] - band_rows + 1, band_rows):
+        keys = (signatures[:, lo:lo + band_rows].astype(np.uint64) * multipliers).sum(axis=1)
+        order = np.argsort(keys, kind='stable')
+        same = keys[order[1:]] == keys[order[:-1]]
+        # Neighbours in a bucket are enough: union-find joins the rest of it
+        u, v = order[:-1][same], order[1:][same]
+        agree = (signatures[u] == signatures[v]).mean(axis=1) >= threshold
+        left.append(u[agree])
+        right.append(v[agree])
+    if not left:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(left), np.concatenate(right)
+
+
+def union_find(n, left, right):
+    """Component label per node: edges are merged by min-label hooking plus pointer jumping"""
+    labels = np.arange(n)
+    while True:
+        lowest = np.minimum(labels[left], labels[right])
+        before = labels.copy()
+        np.minimum.at(labels, labels[left], lowest)               # Hook roots onto the smaller label
+        np.minimum.at(labels, labels[right], lowest)
+        while True:                                                # Pointer jumping to the roots
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, before):
+            return labels
+
+
+def near_duplicate_groups(series, threshold=THRESHOLD):
+    """Group id per row (near-duplicate rows share an id; blanks get -1), like duplicate_groups()"""
+    text = normalize_text(series)
+    blank = text.isna().to_numpy()
+    live = text[~blank].reset_index(drop=True)
+    groups = np.full(len(series), -1, dtype=np.int64)
+    if len(live):
+        signatures = signatures_for(live)
+        left, right = candidate_pairs(signatures, threshold=threshold)
+        labels = union_find(len(live), left, right)
+        groups[~blank], _ = pd.factorize(labels)
+    return pd.Series(groups, index=series.index)
+
+
+def cluster_table(df, groups):
+    """df with cluster_id and cluster_size columns"""
+    out = df.copy()
+    out['cluster_id'] = groups
+    sizes = groups[groups != -1].value_counts()
+    out['cluster_size'] = groups.map(sizes).fillna(1).astype(int)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate pledges with MinHash/LSH")
+    parser.add_argument('csv')
+    parser.add_argument('--column', default='pledge', help="text column")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help="estimated Jaccard to merge rows")
+    parser.add_argument('--out', help="write the CSV with cluster_id/cluster_size columns")
+    parser.add_argument('--representatives', help="write one row per cluster (e.g. to rate or humanize)")
+    args = parser.parse_args(argv)
+
+    df = pd.read_csv(args.csv)
+    groups = near_duplicate_groups(df[args.column], args.threshold)
+    table = cluster_table(df, groups)
+    live = groups[groups != -1]
+    clusters = live.nunique()
+    multi = (live.value_counts() > 1).sum()
+    print(f"✓ {len(df)} rows -> {clusters} clusters ({multi} with near-duplicates, "
+          f"{len(live) - clusters} rows collapsible)")
+    for cluster_id, size in live.value_counts().head(5).items():
+        if size < 2:
+            break
+        sample = str(df.at[live.index[live == cluster_id][0], args.column])
+        print(f"  {size:>4} x {sample[:90]}{'...' if len(sample) > 90 else ''}")
+
+    if args.out:
+        table.to_csv(args.out, index=False)
+        print(f"✓ Saved to {args.out}")
+    if args.representatives:
+        first = ~groups.duplicated() | (groups == -1)
+        table[first.to_numpy()].to_csv(args.representatives, index=False)
+        print(f"✓ {first.sum()} representatives saved to {args.representatives}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,18 +3,21 @@ AI Humanizer Testing & Optimization Script
 Runs multiple prompts, tests outputs, and finds the best approach
 """
 import pandas as pd
-import ollama
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from gen_cache import cached_generate, cache_report
+from sampler import stratified_sample
+from cleanup import clean_output
+from failures import error_class
 
 # Load sample data
 df = pd.read_csv("final_pledges_merged.csv")
 
-# Test samples (different occupations/styles)
-test_samples = [
-    df.at[0, 'pledge'],   # Doctor 1
-    df.at[5, 'pledge'],   # Doctor 2
-    df.at[100, 'pledge'], # Different context
-]
+# Test samples: stratified by occupation, gender and length, reproducible from the seed
+SAMPLE_SIZE = 12
+SAMPLE_SEED = 42
+test_samples = stratified_sample(df, SAMPLE_SIZE, seed=SAMPLE_SEED)['pledge'].tolist()
 
 # Different prompt strategies to test
 PROMPTS = {
@@ -55,66 +58,97 @@ Original: {text}
 Human version:"""
 }
 
+OPTIONS = {'temperature': 0.85, 'top_p': 0.9, 'num_predict': 350}
+WORKERS = 4                           # Matrix cells generated in parallel
+
 def humanize(text, prompt_template, model='llama3:8b'):
-    """Humanize text with given prompt"""
-    prompt = prompt_template.format(text=text)
-    response = ollama.generate(
-        model=model,
-        prompt=prompt,
-        options={'temperature': 0.85, 'top_p': 0.9, 'num_predict': 350}
-    )
-    result = response['response'].strip()
-    
-    # Clean up
-    for prefix in ['Rewritten:', 'Your version:', 'Your natural rewrite:', 'Rewrite:', 'Human version:']:
-        result = result.replace(prefix, '').strip()
-    if '(Note:' in result:
-        result = result.split('(Note:')[0].strip()
-    if '\n\n' in result:
-        result = result.split('\n\n')[0].strip()
-    result = result.strip('"').strip("'")
-    
-    return result
+    """Humanize text with given prompt; returns (cleaned text, raw response dict)"""
+    response = cached_generate(model, prompt_template, text, options=OPTIONS)
+    return clean_output(response['response'], 'optimize_prompts'), response
+
+def run_cell(sample_idx, sample, prompt_name, prompt_template):
+    """One (prompt, sample) cell of the matrix with its metrics"""
+    start = time.time()
+    humanized, response = humanize(sample, prompt_template)
+    # Model-reported generation time, so cached cells keep their original numbers
+    duration = response.get('total_duration')
+    latency = duration / 1e9 if duration else time.time() - start
+    return {
+        'sample_idx': sample_idx + 1,
+        'prompt_version': prompt_name,
+        'original': sample,
+        'humanized': humanized,
+        'latency_s': round(latency, 2),
+        'eval_count': response.get('eval_count'),
+        'length_ratio': round(len(humanized) / len(sample), 2) if sample else None,
+        'cached': response['cached'],
+    }
 
 def main():
     print("=" * 70)
     print("AI HUMANIZER - PROMPT TESTING & OPTIMIZATION")
     print("=" * 70)
-    print(f"\nTesting {len(PROMPTS)} different prompts on {len(test_samples)} samples")
-    print("This will generate outputs for you to test on AI detectors\n")
+    cells = [(i, sample, name, template)
+             for i, sample in enumerate(test_samples)
+             for name, template in PROMPTS.items()]
+    print(f"\nTesting {len(PROMPTS)} different prompts on {len(test_samples)} samples "
+          f"({len(cells)} cells, {WORKERS} in parallel)")
+    print("Cells already generated with the same prompt, sample and options come from the cache\n")
     
     results = []
+    failed = {}                               # Error class -> failed cells
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        futures = {pool.submit(run_cell, *cell): cell for cell in cells}
+        for future in as_completed(futures):
+            sample_idx, _, prompt_name, _ = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"⚠ Sample {sample_idx + 1} / {prompt_name} failed: {e}")
+                failed[error_class(e)] = failed.get(error_class(e), 0) + 1
+    elapsed = time.time() - start
+    failure_summary = ", ".join(f"{name} x{count}" for name, count in sorted(failed.items()))
     
-    for sample_idx, sample in enumerate(test_samples):
+    if not results:
+        print(f"\n❌ All {len(cells)} cells failed ({failure_summary}) - test_results.csv left unchanged")
+        print("Check that Ollama is running and the model is pulled")
+        sys.exit(1)
+    
+    # Save all results for testing (matrix order, whatever order cells finished in)
+    results_df = pd.DataFrame(results).sort_values(['sample_idx', 'prompt_version'])
+    results_df.to_csv("test_results.csv", index=False)
+    
+    for sample_idx, group in results_df.groupby('sample_idx'):
         print(f"\n{'='*70}")
-        print(f"SAMPLE {sample_idx + 1}")
+        print(f"SAMPLE {sample_idx}")
         print(f"{'='*70}")
-        print(f"ORIGINAL ({len(sample)} chars):")
-        print(f"{sample[:200]}...")
-        print()
-        
-        for prompt_name, prompt_template in PROMPTS.items():
-            print(f"\n--- {prompt_name} ---")
-            humanized = humanize(sample, prompt_template)
-            print(f"OUTPUT: {humanized[:200]}...")
-            print(f"Length: {len(humanized)} chars")
-            
-            results.append({
-                'sample_idx': sample_idx + 1,
-                'prompt_version': prompt_name,
-                'original': sample,
-                'humanized': humanized
-            })
-            time.sleep(1)
+        original = group['original'].iloc[0]
+        print(f"ORIGINAL ({len(original)} chars):")
+        print(f"{original[:200]}...")
+        for row in group.itertuples():
+            print(f"\n--- {row.prompt_version} ---")
+            print(f"OUTPUT: {row.humanized[:200]}...")
+            print(f"Length: {len(row.humanized)} chars")
     
-    # Save all results for testing
-    results_df = pd.DataFrame(results)
-    results_df.to_csv("test_results.csv", index=False)
+    table = results_df.groupby('prompt_version').agg(
+        cells=('humanized', 'size'),
+        latency_s=('latency_s', 'mean'),
+        eval_count=('eval_count', 'mean'),
+        length_ratio=('length_ratio', 'mean'),
+        cached=('cached', 'sum'),
+    ).round(2)
     
     print("\n" + "=" * 70)
     print("RESULTS SAVED!")
     print("=" * 70)
-    print(f"\nAll outputs saved to: test_results.csv")
+    print(f"\n{table.to_string()}")
+    print(f"\n{len(results)} cells in {elapsed:.1f}s ({int(results_df['cached'].sum())} from cache)")
+    if failed:
+        print(f"⚠ {sum(failed.values())} cells failed: {failure_summary}")
+    print(f"All outputs saved to: test_results.csv")
+    if cache_report():
+        print(cache_report())
     print("\nNEXT STEPS:")
     print("1. Open test_results.csv")
     print("2. Copy 'humanized' texts to https://gptzero.me/ or https://zerogpt.com/")
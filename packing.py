@@ -0,0 +1,228 @@
+"""
+Packed mode: several pledges per generate() call.
+
+The humanize prompt's instruction block is several times longer than a
+typical pledge, and single-row mode re-sends it for every row. A packed
+request sends it once with K numbered pledges and asks, through Ollama's
+`format` option, for JSON of the form {"rewrites": [{"id": n, "text": ...}]}.
+
+Entries are matched back by id, so a reply with a missing, empty or
+duplicated entry only loses those pledges - the caller retries just them on
+the single-row path. K is tuned while running: it grows while rows/sec
+keeps improving, steps back when the previous K was faster, and shrinks
+when packs start losing items.
+"""
+import json
+import statistics
+import time
+
+import ollama
+
+from cleanup import clean_output
+from gen_cache import GenerationCache, get_cache
+
+# JSON schema passed as `format`
+PACK_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'rewrites': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {'id': {'type': 'integer'}, 'text': {'type': 'string'}},
+                'required': ['id', 'text'],
+            },
+        },
+    },
+    'required': ['rewrites'],
+}
+
+JSON_TOKENS_PER_ITEM = 16             # num_predict allowance for the JSON wrapping per item
+
+# Counters of a packed response shared out between its pledges for per-row stats
+SPLIT_FIELDS = ('eval_count', 'prompt_eval_count', 'eval_duration', 'prompt_eval_duration',
+                'load_duration', 'total_duration')
+
+
+def format_items(texts):
+    """Numbered pledge list for the {items} slot of a packed prompt"""
+    return "\n".join(f"[{n}] {' '.join(str(t).split())}" for n, t in enumerate(texts, 1))
+
+
+def parse_packed(raw, count):
+    """
+    {position: cleaned rewrite} for the usable entries of a packed reply.
+    Entries with an unknown or repeated id, or no text left after cleanup,
+    are dropped (their pledges get retried).
+    """
+    try:
+        entries = json.loads(raw).get('rewrites', [])
+    except (json.JSONDecodeError, AttributeError):
+        return {}
+    results = {}
+    seen = set()
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        n, text = entry.get('id'), entry.get('text')
+        if not isinstance(n, int) or not 1 <= n <= count or not isinstance(text, str):
+            continue
+        if n in seen:
+            results.pop(n - 1, None)          # Two answers for one pledge: trust neither
+            continue
+        seen.add(n)
+        cleaned = clean_output(text)
+        if cleaned:
+            results[n - 1] = cleaned
+    return results
+
+
+def split_response(response, texts, elapsed):
+    """
+    Share one packed response between the pledges it answered, by length:
+    (response-like dict, latency) per text, with token counts and durations
+    that add up to the pack's
+    """
+    chars = sum(len(str(t)) for t in texts) or 1
+    weights = [len(str(t)) / chars for t in texts]
+    shares = [{'response': '', 'done_reason': response.get('done_reason'), 'cached': False} for _ in texts]
+    for field in SPLIT_FIELDS:
+        total = response.get(field) or 0
+        parts = [int(total * w) for w in weights]
+        parts[-1] += total - sum(parts)
+        for share, part in zip(shares, parts):
+            share[field] = part
+    return [(share, elapsed * w) for share, w in zip(shares, weights)]
+
+
+class Packer:
+    """Runs packed requests and tunes the pack size K"""
+
+    def __init__(self, model, template, options, k=4, k_max=8, auto=True,
+                 decide_every=3, max_loss=0.25, keep_alive=None, on_response=None,
+                 on_item=None, client=None, log=print):
+        self.model = model
+        self.template = template
+        self.options = options
+        self.k = k
+        self.k_max = k_max
+        self.auto = auto
+        self.decide_every = decide_every
+        self.max_loss = max_loss
+        self.keep_alive = keep_alive
+        self.on_response = on_response       # Called with every raw packed response
+        self.on_item = on_item               # Called with (position, response share, latency) per answered text
+        self.client = client or ollama
+        self.log = log
+        self.rates = {}                   # K -> rows/sec of recent packs
+        self.settled = False
+        self.requests = 0
+        self.rows = 0
+        self.retried = 0
+        self.count_mismatches = 0
+        self.prompt_tokens = 0
+        self.cached = 0
+        self.elapsed = 0.0
+
+    def _key(self, text):
+        return GenerationCache.make_key(self.model, self.template, text, self.options, format='packed')
+
+    def run_pack(self, texts, num_predict=None, refresh=()):
+        """
+        Humanize `texts` in one request. Returns one entry per text: the
+        cleaned rewrite, or None if that pledge needs a single-row retry.
+        Exceptions from Ollama propagate (the whole pack is then retried).
+        Positions in `refresh` skip the cache lookup.
+        """
+        results = [None] * len(texts)
+        cache = get_cache()
+        todo = []
+        for pos, text in enumerate(texts):
+            hit = cache.get(self._key(text)) if cache and pos not in refresh else None
+            if hit is not None:
+                results[pos] = clean_output(hit['response'])
+                self.cached += 1
+                if self.on_item:
+                    self.on_item(pos, dict(hit, cached=True), 0.0)
+            else:
+                todo.append(pos)
+        if not todo:
+            return results
+
+        options = dict(self.options)
+        if num_predict:
+            options['num_predict'] = num_predict + JSON_TOKENS_PER_ITEM * len(todo)
+        prompt = self.template.format(items=format_items([texts[p] for p in todo]))
+        start = time.time()
+        response = self.client.generate(model=self.model, prompt=prompt, options=options,
+                                        format=PACK_SCHEMA, keep_alive=self.keep_alive)
+        elapsed = time.time() - start
+        if self.on_response:
+            self.on_response(response)
+
+        parsed = parse_packed(response['response'], len(todo))
+        for n, cleaned in parsed.items():
+            pos = todo[n]
+            results[pos] = cleaned
+            if cache:
+                cache.put(self._key(texts[pos]), self.model, {'response': cleaned, 'done_reason': 'stop'})
+        if len(parsed) != len(todo):
+            self.count_mismatches += 1
+        if self.on_item and parsed:
+            answered = [todo[n] for n in sorted(parsed)]
+            for pos, (share, latency) in zip(answered, split_response(response, [texts[p] for p in answered], elapsed)):
+                self.on_item(pos, share, latency)
+
+        self.requests += 1
+        self.rows += len(parsed)
+        self.retried += len(todo) - len(parsed)
+        self.prompt_tokens += response.get('prompt_eval_count') or 0
+        self.elapsed += elapsed
+        self._tune(len(todo), len(parsed), elapsed)
+        return results
+
+    def _tune(self, sent, ok, elapsed):
+        """Move K after enough packs at the current size"""
+        if not self.auto:
+            return
+        k = self.k
+        if sent and (sent - ok) / sent > self.max_loss:
+            if k > 1:
+                self.k = self.k_max = k - 1
+                self.log(f"⚙ Pack: K {k} → {self.k} ({sent - ok}/{sent} items lost)")
+            return
+        if sent < k:
+            return                            # Short pack (cache hits or end of rows) - not comparable
+        self.rates.setdefault(k, []).append(ok / elapsed if elapsed > 0 else 0.0)
+        if self.settled or len(self.rates[k]) < self.decide_every:
+            return
+        rate = statistics.median(self.rates[k][-self.decide_every:])
+        below = self.rates.get(k - 1)
+        if below and statistics.median(below[-self.decide_every:]) > rate:
+            self.k = k - 1
+            self.settled = True
+            self.log(f"⚙ Pack: settled on K {self.k} ({rate:.2f} rows/sec at K {k} was slower)")
+        elif k < self.k_max:
+            self.k = k + 1
+            self.log(f"⚙ Pack: K {k} → {self.k} ({rate:.2f} rows/sec)")
+        else:
+            self.settled = True
+
+    def report(self, baseline_rate=None, baseline_prompt_tokens=None):
+        """Summary lines, compared with single-row numbers when given"""
+        if not self.requests:
+            return ["Packed: no packed requests made"]
+        rate = self.rows / self.elapsed if self.elapsed > 0 else 0.0
+        per_row = self.prompt_tokens / self.rows if self.rows else 0.0
+        lines = [f"Packed: {self.rows} rows in {self.requests} requests (final K {self.k}) | "
+                 f"{self.retried} items retried single-row | {self.count_mismatches} packs with missing items"]
+        line = f"Throughput: {rate:.2f} rows/sec packed"
+        if baseline_rate:
+            line += f" vs {baseline_rate:.2f} single-row ({rate / baseline_rate:.1f}x)"
+        lines.append(line)
+        line = f"Prompt tokens: {per_row:.0f}/row packed"
+        if baseline_prompt_tokens:
+            line += (f" vs {baseline_prompt_tokens:.0f}/row single-row "
+                     f"({1 - per_row / baseline_prompt_tokens:.0%} saved)")
+        lines.append(line)
+        return lines
@@ -0,0 +1,172 @@
+"""
+Post-run quality gate for the humanized output.
+
+Every row of OUTPUT_CSV is scored in one vectorized pandas pass - no
+per-row Python loop - against five checks:
+
+  empty       no output for a non-blank pledge (unless the junk
+              pre-filter skipped it)
+  length      output/pledge length ratio outside MIN_/MAX_LENGTH_RATIO
+              (truncated answers, runaway generations)
+  marker      cleanup markers or a leaked intro ("Here's the rewritten
+              text:") still in the output
+  repetition  share of word NGRAMs repeating an earlier one in the same row
+  identical   output equals the pledge once case and punctuation are ignored
+              (e.g. an old run that copied the pledge on error)
+
+With --requeue only the failing rows are sent back: they are dropped from
+the journal, emptied in OUTPUT_CSV and queued in the failure queue, so
+`humanizer.py run --retry-failed` regenerates just those rows (skipping the
+generation cache, which holds the rejected answers).
+
+    python quality_gate.py [--requeue] [--examples N]
+"""
+import argparse
+import os
+
+import pandas as pd
+
+from cleanup import MARKER_RE, LEADING_RE
+from failures import FailureQueue
+from journal import RowJournal, atomic_write_csv
+
+# ==================== CONFIGURATION ====================
+OUTPUT_CSV = "final_pledges_humanized.csv"
+JOURNAL_FILE = "final_pledges_humanized.journal.jsonl"
+FAILURES_FILE = "final_pledges_humanized.failures.jsonl"
+PLEDGE_COLUMN = 'pledge'
+NEW_COLUMN = 'humanized_pledge'
+JUNK_COLUMN = 'junk_reason'           # Rows the junk pre-filter skipped may stay empty
+
+MIN_LENGTH_RATIO = 0.5                # Output shorter than half the pledge was cut short
+MAX_LENGTH_RATIO = 3.0                # The prompt adds fillers; 3x the pledge is a runaway
+NGRAM = 3                             # Words per n-gram for the repetition check
+MAX_REPEATED_SHARE = 0.2              # Share of n-grams that repeat an earlier one in the row
+MIN_REPEATED = 3                      # ...and at least this many, so short rows aren't flagged
+EXAMPLES = 3                          # Failing rows printed per check
+
+WORD_RE = r"[a-z0-9']+"
+CHECKS = ('empty', 'length', 'marker', 'repetition', 'identical')
+
+
+class QualityCheckFailed(Exception):
+    """Failure-queue error for rows the gate rejected (message = failed checks)"""
+
+
+def repeated_ngrams(text, n=NGRAM):
+    """(repeated, total) word n-grams per row, from one exploded frame"""
+    words = text.fillna('').str.lower().str.findall(WORD_RE).explode().dropna()
+    if words.empty:
+        zero = pd.Series(0, index=text.index)
+        return zero, zero
+    grams = words.astype(str)
+    by_row = words.groupby(level=0)
+    for k in range(1, n):
+        grams = grams + ' ' + by_row.shift(-k)
+    grams = grams.dropna()
+    frame = pd.DataFrame({'row': grams.index, 'gram': grams.to_numpy()})
+    repeated = frame.duplicated(['row', 'gram']).groupby(frame['row']).sum()
+    total = frame.groupby('row').size()
+    return (repeated.reindex(text.index, fill_value=0),
+            total.reindex(text.index, fill_value=0))
+
+
+def normalized(text):
+    """Lowercase words only, for the identity check"""
+    return text.fillna('').str.lower().str.findall(WORD_RE).str.join(' ')
+
+
+def score(df, source=PLEDGE_COLUMN, output=NEW_COLUMN):
+    """
+    One row of metrics per input row plus a boolean column per check
+    (True = failed) and 'reasons', the failed checks joined by commas.
+    Rows with a blank pledge are never flagged.
+    """
+    pledge = df[source].astype('string')
+    text = df[output].astype('string')
+    has_input = pledge.fillna('').str.strip().str.len() > 0
+    stripped = text.fillna('').str.strip()
+    has_output = stripped.str.len() > 0
+
+    result = pd.DataFrame(index=df.index)
+    result['length_ratio'] = (stripped.str.len() / pledge.str.strip().str.len()).astype(float).where(has_output)
+    repeated, total = repeated_ngrams(text)
+    result['repeated_ngrams'] = repeated
+    result['repeated_share'] = (repeated / total.where(total > 0)).fillna(0.0)
+
+    live = has_input & has_output
+    junk = df[JUNK_COLUMN].fillna('').astype(str).ne('') if JUNK_COLUMN in df else False
+    result['empty'] = has_input & ~has_output & ~junk
+    result['length'] = live & ~result['length_ratio'].between(MIN_LENGTH_RATIO, MAX_LENGTH_RATIO)
+    result['marker'] = live & (stripped.str.contains(MARKER_RE, na=False)
+                               | stripped.str.contains(LEADING_RE, na=False))
+    result['repetition'] = live & (result['repeated_share'] > MAX_REPEATED_SHARE) \
+        & (result['repeated_ngrams'] >= MIN_REPEATED)
+    result['identical'] = live & (normalized(text) == normalized(pledge))
+    for check in CHECKS:
+        result[check] = result[check].fillna(False).astype(bool)
+
+    flags = result[list(CHECKS)]
+    result['reasons'] = flags.dot(pd.Index([f"{c}," for c in CHECKS])).str.rstrip(',')
+    result['passed'] = ~flags.any(axis=1)
+    return result
+
+
+def requeue(df, scores, output_csv=OUTPUT_CSV, journal_file=JOURNAL_FILE,
+            failures_file=FAILURES_FILE, column=NEW_COLUMN):
+    """Drop failing rows from the journal and output CSV and queue them for --retry-failed"""
+    failing = scores.index[~scores['passed']]
+    bad = set(int(i) for i in failing)
+    journal = RowJournal(journal_file)
+    if journal.exists():
+        journal.compact(lambda row: row not in bad)
+    df.loc[failing, column] = pd.NA
+    atomic_write_csv(df, output_csv)
+    failures = FailureQueue(failures_file)
+    for i in failing:
+        failures.record(i, QualityCheckFailed(scores.at[i, 'reasons']))
+    return len(bad)
+
+
+def print_report(df, scores, examples=EXAMPLES):
+    total = len(scores)
+    failing = (~scores['passed']).sum()
+    print(f"✓ Scored {total} rows: {total - failing} passed, {failing} failed")
+    ratio = scores['length_ratio'].dropna()
+    if len(ratio):
+        print(f"  Length ratio: median {ratio.median():.2f} | "
+              f"p5 {ratio.quantile(0.05):.2f} | p95 {ratio.quantile(0.95):.2f}")
+    for check in CHECKS:
+        rows = scores.index[scores[check]]
+        if not len(rows):
+            continue
+        print(f"⚠ {check}: {len(rows)} rows")
+        for i in rows[:examples]:
+            preview = str(df.at[i, NEW_COLUMN]) if pd.notna(df.at[i, NEW_COLUMN]) else ''
+            preview = preview.replace('\n', ' ')
+            print(f"    row {i}: {preview[:80]}{'...' if len(preview) > 80 else ''}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score the humanized output and requeue failing rows")
+    parser.add_argument('--csv', default=OUTPUT_CSV, help="output CSV to check")
+    parser.add_argument('--requeue', action='store_true',
+                        help="clear failing rows and queue them for `humanizer.py run --retry-failed`")
+    parser.add_argument('--examples', type=int, default=EXAMPLES, help="failing rows shown per check")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.csv):
+        print(f"❌ {args.csv} not found - run the humanizer first")
+        return 1
+    df = pd.read_csv(args.csv)
+    scores = score(df)
+    print_report(df, scores, args.examples)
+    if args.requeue and not scores['passed'].all():
+        queued = requeue(df, scores, output_csv=args.csv)
+        print(f"✓ Requeued {queued} rows in {FAILURES_FILE} - regenerate them with "
+              f"`python humanizer.py run --retry-failed`")
+    return 0 if scores['passed'].all() else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,6 +1,7 @@
 """Quick 3-sample test with optimized prompt"""
 import pandas as pd
-import ollama
+from gen_cache import cached_generate, cache_report
+from cleanup import clean_output
 
 df = pd.read_csv("final_pledges_merged.csv")
 
@@ -19,12 +20,9 @@ Original: {text}
 Rewrite:"""
 
 def humanize(text):
-    r = ollama.generate(model='llama3:8b', prompt=PROMPT.format(text=text),
+    r = cached_generate('llama3:8b', PROMPT, text,
                         options={'temperature': 0.95, 'num_predict': 400})
-    result = r['response'].strip()
-    for m in ['Rewrite:', '(Note', 'Here is', '\n\n']:
-        if m in result: result = result.split(m)[0].strip()
-    return result.strip('"\'')
+    return clean_output(r['response'], 'quick_3_samples')
 
 samples = [df.at[0, 'pledge'], df.at[100, 'pledge'], df.at[500, 'pledge']]
 results = []
@@ -39,3 +37,5 @@ for i, s in enumerate(samples):
 
 pd.DataFrame(results).to_csv("quick_samples.csv", index=False)
 print("Saved to quick_samples.csv")
+if cache_report():
+    print(cache_report())
@@ -0,0 +1,107 @@
+"""
+Request pacing for the humanize scripts.
+
+FixedDelay   - the original behaviour: a random DELAY_MIN..DELAY_MAX sleep per row.
+AdaptiveDelay - AIMD controller: shrinks the delay step by step while Ollama
+                latency and error rate stay healthy, and multiplies it when
+                they degrade. Local models have no rate limit, so a healthy
+                server quickly runs with no sleep at all.
+"""
+import random
+import statistics
+import time
+from collections import deque
+
+
+class FixedDelay:
+    """Random sleep between delay_min and delay_max seconds (legacy mode)"""
+
+    def __init__(self, delay_min, delay_max):
+        self.delay_min = delay_min
+        self.delay_max = delay_max
+
+    def next_delay(self):
+        return random.uniform(self.delay_min, self.delay_max)
+
+    def record(self, latency, ok):
+        pass
+
+    def wait(self):
+        time.sleep(self.next_delay())
+
+
+class AdaptiveDelay:
+    """
+    Additive-decrease / multiplicative-increase on the inter-request delay.
+
+    Every `decide_every` requests the last `window` latencies are compared
+    with a target. The target is `target_latency` if given, otherwise
+    `tolerance` x the median latency of the first window (the server's
+    unloaded baseline). Healthy -> delay -= step. Slow or error rate above
+    `max_error_rate` -> delay *= backoff (at least `step`).
+    """
+
+    def __init__(self, initial_delay=0.5, min_delay=0.0, max_delay=10.0,
+                 step=0.05, backoff=2.0, target_latency=None, tolerance=1.5,
+                 window=20, decide_every=5, max_error_rate=0.1, log=print):
+        self.delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.step = step
+        self.backoff = backoff
+        self.target_latency = target_latency
+        self.tolerance = tolerance
+        self.decide_every = decide_every
+        self.max_error_rate = max_error_rate
+        self.log = log
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.count = 0
+
+    def next_delay(self):
+        return self.delay
+
+    def wait(self):
+        if self.delay > 0:
+            time.sleep(self.delay)
+
+    def record(self, latency, ok):
+        """Feed one request result; may adjust the delay"""
+        self.outcomes.append(ok)
+        if ok:
+            self.latencies.append(latency)
+        self.count += 1
+
+        if self.target_latency is None:
+            if len(self.latencies) >= self.latencies.maxlen:
+                self.target_latency = statistics.median(self.latencies) * self.tolerance
+                self.log(f"⚙ Rate: latency target set to {self.target_latency:.2f}s")
+            return
+
+        if self.count % self.decide_every == 0:
+            self._decide()
+
+    def _decide(self):
+        error_rate = self.outcomes.count(False) / len(self.outcomes)
+        latency = statistics.median(self.latencies) if self.latencies else float('inf')
+        old = self.delay
+
+        if error_rate > self.max_error_rate or latency > self.target_latency:
+            self.delay = min(self.max_delay, max(self.delay, self.step) * self.backoff)
+            reason = "backing off"
+        else:
+            self.delay = max(self.min_delay, round(self.delay - self.step, 6))
+            reason = "speeding up"
+
+        if self.delay != old:
+            self.log(f"⚙ Rate: {reason} - delay {old:.2f}s → {self.delay:.2f}s "
+                     f"(median latency {latency:.2f}s, errors {error_rate:.0%})")
+
+
+def make_pacer(mode, delay_min, delay_max, log=print):
+    """Build the pacer for RATE_MODE ('adaptive' or 'fixed')"""
+    if mode == 'fixed':
+        return FixedDelay(delay_min, delay_max)
+    if mode == 'adaptive':
+        return AdaptiveDelay(initial_delay=delay_min, max_delay=max(delay_max * 4, 1.0), log=log)
+    raise ValueError(f"Unknown RATE_MODE: {mode!r} (use 'adaptive' or 'fixed')")
@@ -0,0 +1,277 @@
+"""
+Per-row generation stats for the humanize pipeline.
+
+Every real or cached generation is recorded with its token count and latency.
+For rows the client cut short (done_reason 'early_stop') the tokens and time
+saved are estimated as if the model had run on to num_predict at the speed it
+was generating - an upper bound, since it might have stopped on its own first.
+When rows ran with per-row num_predict budgets, the report compares latency
+and tokens of budgeted rows against rows that still had the full budget.
+Prompt evaluation is split into the first row of each prompt prefix (nothing
+to reuse yet) and the steady state after it (prefix already evaluated) - a
+first-row vs steady-state figure, not a comparison with a prompt layout
+that has no shared prefix.
+
+Every Ollama timing field is kept. Rows go to disk as they finish - a
+CSV spool that write_csv() moves into place at the end, and with a metrics
+path a JSONL side-car, so a long run can be inspected (or survives a crash)
+- and memory holds only running totals, the rows since the last batch and
+a window of recent latencies, flat however many rows a streamed run has.
+The end-of-run report reads its columns back from the spool.
+batch_summary() condenses the rows since the previous call into tokens/sec
+and a prompt / generation / load split, and prometheus() renders running
+totals in the Prometheus text format for a textfile collector or /metrics.
+"""
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+
+LATENCY_WINDOW = 1000                 # Recent live rows behind the Prometheus latency quantiles
+
+FIELDS = ['row', 'cached', 'tokens', 'prompt_tokens', 'eval_ms', 'prompt_eval_ms', 'load_ms',
+          'total_ms', 'tokens_per_sec', 'prefix', 'latency_ms', 'num_predict', 'hit_budget',
+          'early_stop', 'tokens_saved', 'ms_saved']
+
+# Running totals exported to Prometheus: entry field -> (metric, help text, scale)
+PROMETHEUS_COUNTERS = {
+    'tokens': ('humanizer_generated_tokens_total', 'Tokens generated', 1),
+    'prompt_tokens': ('humanizer_prompt_tokens_total', 'Prompt tokens evaluated', 1),
+    'eval_ms': ('humanizer_generation_seconds_total', 'Time generating tokens', 1e-3),
+    'prompt_eval_ms': ('humanizer_prompt_eval_seconds_total', 'Time evaluating prompts', 1e-3),
+    'load_ms': ('humanizer_load_seconds_total', 'Time loading the model', 1e-3),
+    'total_ms': ('humanizer_model_seconds_total', 'Total time reported by Ollama', 1e-3),
+    'early_stop': ('humanizer_early_stop_rows_total', 'Rows cut short at meta-text', 1),
+    'hit_budget': ('humanizer_budget_hit_rows_total', 'Rows cut at their num_predict budget', 1),
+}
+
+
+def ms(response, field):
+    """A nanosecond duration field of an Ollama response in milliseconds"""
+    return round((response.get(field) or 0) / 1e6, 1)
+
+
+def inference_line(live):
+    """Tokens/sec and where Ollama's time went, for a frame of non-cached rows"""
+    eval_s, prompt_s = live['eval_ms'].sum() / 1000, live['prompt_eval_ms'].sum() / 1000
+    load_s, total_s = live['load_ms'].sum() / 1000, live['total_ms'].sum() / 1000
+    line = (f"Inference: {len(live)} rows | {live['tokens'].sum() / eval_s if eval_s else 0:.1f} tok/s "
+            f"generating | {live['prompt_tokens'].sum() / prompt_s if prompt_s else 0:.0f} tok/s prompt eval")
+    if total_s:
+        other = max(total_s - eval_s - prompt_s - load_s, 0)
+        line += (f" | split: prompt {prompt_s / total_s:.0%} / generation {eval_s / total_s:.0%}"
+                 f" / load {load_s / total_s:.0%} / other {other / total_s:.0%}")
+    return line
+
+
+class RunStats:
+    """Thread-safe collector of per-row generation stats"""
+
+    def __init__(self, num_predict, metrics_path=None):
+        self.num_predict = num_predict
+        self.metrics_path = metrics_path
+        self.metrics_file = None
+        self.spool_path = None
+        self.spool = None
+        self.writer = None
+        self.batch = []                   # Live rows since the last batch_summary()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.totals = dict.fromkeys([*PROMETHEUS_COUNTERS, 'latency_ms'], 0.0)
+        self.live_rows = 0
+        self.cached_rows = 0
+        self.lock = threading.Lock()
+
+    def record(self, row, response, latency, num_predict=None, prefix=''):
+        """Record one generate() result (dict from gen_cache) for `row`"""
+        num_predict = num_predict or self.num_predict
+        cached = bool(response.get('cached'))
+        tokens = response.get('eval_count') or 0
+        early = response.get('done_reason') == 'early_stop' and not cached
+        tokens_saved = ms_saved = 0
+        if early and tokens:
+            tokens_saved = max(num_predict - tokens, 0)
+            ms_per_token = (response.get('eval_duration') or 0) / tokens / 1e6
+            ms_saved = tokens_saved * ms_per_token
+        eval_ms = ms(response, 'eval_duration')
+        entry = {
+            'row': row,
+            'cached': cached,
+            'tokens': tokens,
+            'prompt_tokens': response.get('prompt_eval_count') or 0,
+            'eval_ms': eval_ms,
+            'prompt_eval_ms': ms(response, 'prompt_eval_duration'),
+            'load_ms': ms(response, 'load_duration'),
+            'total_ms': ms(response, 'total_duration'),
+            'tokens_per_sec': round(tokens / eval_ms * 1000, 1) if eval_ms else 0.0,
+            'prefix': prefix,
+            'latency_ms': round(latency * 1000, 1),
+            'num_predict': num_predict,
+            'hit_budget': response.get('done_reason') == 'length' and not cached,
+            'early_stop': early,
+            'tokens_saved': tokens_saved,
+            'ms_saved': round(ms_saved, 1),
+        }
+        with self.lock:
+            if self.spool is None:
+                fd, self.spool_path = tempfile.mkstemp(prefix='run_stats_', suffix='.csv')
+                self.spool = os.fdopen(fd, 'w', newline='', encoding='utf-8')
+                self.writer = csv.DictWriter(self.spool, FIELDS)
+                self.writer.writeheader()
+            self.writer.writerow(entry)
+            if cached:
+                self.cached_rows += 1
+            else:
+                self.live_rows += 1
+                self.batch.append(entry)
+                self.latencies.append(entry['latency_ms'])
+                for field in self.totals:
+                    self.totals[field] += entry[field]
+            if self.metrics_path:
+                if self.metrics_file is None:
+                    self.metrics_file = open(self.metrics_path, 'a', encoding='utf-8')
+                self.metrics_file.write(json.dumps(dict(entry, time=round(time.time(), 3)),
+                                                   default=str) + '\n')
+                self.metrics_file.flush()
+        return entry
+
+    def live_totals(self):
+        """(live rows, copy of the running totals) - diff two calls to measure a stretch of rows"""
+        with self.lock:
+            return self.live_rows, dict(self.totals)
+
+    def frame(self):
+        """Every row recorded since the last write_csv(), read back from the spool"""
+        with self.lock:
+            if self.spool is None:
+                return pd.DataFrame(columns=FIELDS)
+            self.spool.flush()
+            df = pd.read_csv(self.spool_path, keep_default_na=False)
+        for field in ('cached', 'hit_budget', 'early_stop'):
+            df[field] = df[field].astype(str).eq('True')
+        return df
+
+    def batch_summary(self):
+        """One line for the live rows recorded since the previous call (None if there were none)"""
+        with self.lock:
+            batch, self.batch = self.batch, []
+        if not batch:
+            return None
+        return inference_line(pd.DataFrame(batch))
+
+    def prometheus(self):
+        """Running totals and latency quantiles in the Prometheus text format"""
+        with self.lock:
+            totals = dict(self.totals)
+            live_rows, cached_rows = self.live_rows, self.cached_rows
+            latencies = list(self.latencies)
+        lines = ['# HELP humanizer_rows_total Rows generated, by whether the cache answered',
+                 '# TYPE humanizer_rows_total counter',
+                 f'humanizer_rows_total{{cached="false"}} {live_rows}',
+                 f'humanizer_rows_total{{cached="true"}} {cached_rows}']
+        for field, (metric, help_text, scale) in PROMETHEUS_COUNTERS.items():
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter',
+                      f'{metric} {totals[field] * scale:g}']
+        if latencies:
+            quantiles = pd.Series(latencies).quantile([0.5, 0.95, 0.99]) / 1000
+            lines += ['# HELP humanizer_request_seconds Wall time of model requests',
+                      '# TYPE humanizer_request_seconds summary']
+            lines += [f'humanizer_request_seconds{{quantile="{q:g}"}} {v:.4f}' for q, v in quantiles.items()]
+            lines += [f'humanizer_request_seconds_sum {totals["latency_ms"] / 1000:g}',
+                      f'humanizer_request_seconds_count {live_rows}']
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Rewrite a textfile-collector file atomically"""
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+    def serve_prometheus(self, port, host='0.0.0.0'):
+        """Serve prometheus() at http://host:port/metrics from a daemon thread"""
+        stats = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = stats.prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def close(self):
+        with self.lock:
+            if self.metrics_file is not None:
+                self.metrics_file.close()
+                self.metrics_file = None
+
+    def report(self):
+        """Summary lines for end-of-run output (empty if nothing was generated)"""
+        df = self.frame()
+        if df.empty:
+            return []
+        live = df[~df['cached']]
+        lines = [f"Generated: {len(live)} rows, {int(live['tokens'].sum()):,} tokens "
+                 f"({len(df) - len(live)} from cache)"]
+        if len(live):
+            latency = live['latency_ms']
+            lines.append(f"Latency: p50 {latency.quantile(0.5) / 1000:.2f}s | "
+                         f"p95 {latency.quantile(0.95) / 1000:.2f}s | max {latency.max() / 1000:.2f}s")
+            lines.append(inference_line(live))
+            full = live[live['num_predict'] >= self.num_predict]
+            budgeted = live[live['num_predict'] < self.num_predict]
+            if len(full) and len(budgeted):
+                lines.append(
+                    f"Budget: {len(budgeted)} rows with per-row num_predict vs {len(full)} at "
+                    f"{self.num_predict} | p95 {budgeted['latency_ms'].quantile(0.95) / 1000:.2f}s vs "
+                    f"{full['latency_ms'].quantile(0.95) / 1000:.2f}s | "
+                    f"{budgeted['tokens'].mean():.0f} vs {full['tokens'].mean():.0f} tokens/row | "
+                    f"{int(budgeted['hit_budget'].sum())} cut at budget")
+            first = ~live['prefix'].duplicated()
+            cold, warm = live[first], live[~first]
+            if len(warm):
+                cold_ms, warm_ms = cold['prompt_eval_ms'].mean(), warm['prompt_eval_ms'].mean()
+                change = ""
+                if cold_ms:
+                    ratio = 1 - warm_ms / cold_ms
+                    change = f" ({abs(ratio):.0%} {'less' if ratio >= 0 else 'more'} than the first row)"
+                lines.append(
+                    f"Prompt eval, first row vs steady state: {cold_ms:.0f} ms / "
+                    f"{cold['prompt_tokens'].mean():.0f} tokens for the first row of {len(cold)} prefix(es), "
+                    f"then {warm_ms:.0f} ms / {warm['prompt_tokens'].mean():.0f} tokens per row{change}")
+        stopped = live[live['early_stop']]
+        if len(stopped):
+            lines.append(f"Early stop: {len(stopped)} rows cut at meta-text, saving up to "
+                         f"{int(stopped['tokens_saved'].sum()):,} tokens / "
+                         f"{stopped['ms_saved'].sum() / 1000:.1f}s of generation")
+        return lines
+
+    def write_csv(self, path):
+        """Move the spool (rows in the order they finished) to `path`; later rows start a new one"""
+        with self.lock:
+            if self.spool is None:
+                return
+            self.spool.close()
+            self.spool = self.writer = None
+            shutil.move(self.spool_path, f"{path}.tmp")
+            os.replace(f"{path}.tmp", path)
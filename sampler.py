@@ -0,0 +1,112 @@
+"""
+Stratified, reproducible samples for prompt evaluation runs.
+
+Instead of hand-picked row indices, strata are built from occupation, gender
+and pledge-length quantiles, and every stratum gets rows in proportion to its
+size. Everything is one vectorized pass over the DataFrame, and the same seed
+always gives the same rows.
+
+Usage: python sampler.py [n] [seed]   -> writes eval_sample.csv
+"""
+import sys
+
+import numpy as np
+import pandas as pd
+
+# ==================== CONFIGURATION ====================
+INPUT_CSV = "final_pledges_merged.csv"
+OUTPUT_CSV = "eval_sample.csv"
+TEXT_COLUMN = 'pledge'
+STRATA = ('occupation', 'gender')     # Columns missing from a CSV are skipped
+LENGTH_BINS = 4                       # Length quantiles (4 = quartiles)
+DEFAULT_SIZE = 20
+DEFAULT_SEED = 42
+
+
+def strata_labels(df, strata=STRATA, text_column=TEXT_COLUMN, length_bins=LENGTH_BINS):
+    """DataFrame of the stratification keys (categoricals + length quantile)"""
+    keys = pd.DataFrame(index=df.index)
+    for col in strata:
+        if col in df.columns:
+            keys[col] = df[col].astype('string').str.strip().str.title().fillna('(blank)')
+    if length_bins and text_column in df.columns:
+        length = df[text_column].astype('string').str.len().fillna(0)
+        bins = min(length_bins, len(df))
+        keys['length_q'] = pd.qcut(length.rank(method='first'), bins, labels=False)
+    return keys
+
+
+def stratified_sample(df, n, seed=DEFAULT_SEED, strata=STRATA,
+                      text_column=TEXT_COLUMN, length_bins=LENGTH_BINS):
+    """
+    Proportional stratified sample of exactly min(n, len(df)) rows.
+
+    Rows are sorted by the strata keys (random order inside each stratum) and
+    every (len/n)-th row is taken from a random start - systematic sampling,
+    so every stratum gets its proportional share even when n is smaller than
+    the number of strata.
+    Returned in original row order with the index preserved.
+    """
+    n = min(n, len(df))
+    if n <= 0:
+        return df.iloc[:0]
+    keys = strata_labels(df, strata, text_column, length_bins)
+    rng = np.random.default_rng(seed)
+
+    # Serpentine sort: each key's order flips in every other parent group, so
+    # neighbouring picks also alternate gender/length across occupations
+    # Coarsest variables lead, so gender and length quartile are exact to
+    # within one row and occupation is spread as evenly as n allows
+    columns = sorted(keys.columns, key=lambda c: keys[c].nunique())
+    sort_keys = []
+    parent = np.zeros(len(df), dtype=int)
+    for col in columns:
+        codes = pd.factorize(keys[col], sort=True)[0]
+        codes = np.where(parent % 2 == 1, codes.max() - codes, codes)
+        sort_keys.append(codes)
+        parent = pd.DataFrame(sort_keys).T.groupby(list(range(len(sort_keys)))).ngroup().to_numpy()
+
+    # np.lexsort treats the last key as primary; the random key shuffles within strata
+    order = np.lexsort([rng.random(len(df))] + sort_keys[::-1])
+
+    step = len(df) / n
+    positions = (rng.uniform(0, step) + step * np.arange(n)).astype(int)
+    picked = df.index[order[positions]]
+    return df.loc[picked.sort_values()]
+
+
+def sample_indices(df, n, seed=DEFAULT_SEED, **kwargs):
+    """Row indices of stratified_sample(), for scripts that use df.at[idx, ...]"""
+    return stratified_sample(df, n, seed=seed, **kwargs).index.tolist()
+
+
+def coverage(df, sample, strata=STRATA, text_column=TEXT_COLUMN, length_bins=LENGTH_BINS):
+    """Population vs sample share for each stratification variable"""
+    keys = strata_labels(df, strata, text_column, length_bins)
+    rows = []
+    for col in keys.columns:
+        population = keys[col].value_counts(normalize=True)
+        picked = keys.loc[sample.index, col].value_counts(normalize=True)
+        for value, pop_share in population.items():
+            rows.append({'variable': col, 'value': value,
+                         'population': pop_share, 'sample': picked.get(value, 0.0)})
+    return pd.DataFrame(rows)
+
+
+def main(n=DEFAULT_SIZE, seed=DEFAULT_SEED):
+    df = pd.read_csv(INPUT_CSV)
+    sample = stratified_sample(df, n, seed=seed)
+    sample.to_csv(OUTPUT_CSV, index_label='row_index')
+
+    report = coverage(df, sample)
+    worst = (report['population'] - report['sample']).abs().max()
+    print(f"✓ {len(sample)} of {len(df)} rows sampled (seed {seed}) -> {OUTPUT_CSV}")
+    for col, part in report.groupby('variable', sort=False):
+        covered = (part['sample'] > 0).sum()
+        print(f"  {col}: {covered}/{len(part)} values covered")
+    print(f"  Largest share difference vs population: {worst:.1%}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_SIZE,
+         int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_SEED)
@@ -1,5 +1,6 @@
 """Single sample humanizer - generates one sample at a time for testing"""
 import ollama
+from cleanup import clean_output
 
 # Sample pledge to humanize
 SAMPLE = """I gotta be sure every single time 'cause lives are on the line here. But sometimes, man, I just wonder if I'm good enough, you know? Like, did I miss something obvious or did I overthink it again? It's crazy how much pressure there is and how little sleep I get. Maybe I should've stayed a barista."""
@@ -26,15 +27,7 @@ response = ollama.generate(
     options={'temperature': 0.9, 'top_p': 0.92, 'num_predict': 400}
 )
 
-result = response['response'].strip()
-
-# Clean
-for marker in ['Rewrite:', 'Here is', 'Here\'s', '(Note', '(I aimed', '(I used', 'I tried']:
-    if marker in result:
-        result = result.split(marker)[0].strip() if marker != 'Rewrite:' else result.replace(marker, '').strip()
-if '\n\n' in result:
-    result = result.split('\n\n')[0].strip()
-result = result.strip('"\'')
+result = clean_output(response['response'], 'single_test')
 
 print("\n" + "=" * 70)
 print("ORIGINAL:")
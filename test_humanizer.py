@@ -6,6 +6,7 @@ Run this first to verify Ollama is working correctly!
 import pandas as pd
 import ollama
 from datetime import datetime
+from cleanup import clean_output
 
 # Configuration
 INPUT_CSV = "final_pledges_merged.csv"
@@ -68,10 +69,7 @@ def humanize_text(text):
         prompt=prompt,
         options={'temperature': 0.8, 'top_p': 0.9, 'num_predict': 300}
     )
-    result = response['response'].strip()
-    result = result.replace('Rewritten:', '').strip()
-    result = result.strip('"').strip("'")
-    return result
+    return clean_output(response['response'], 'test_humanizer')
 
 
 def main():
@@ -0,0 +1,98 @@
+"""
+Per-row num_predict budgets sized to the input.
+
+A fixed num_predict lets a one-line pledge run on for hundreds of tokens when
+the model rambles, and those runaway rows set the tail latency. Instead each
+row gets ceil(estimated input tokens x expansion ratio) + padding tokens.
+
+The ratio is calibrated from finished rows: output tokens / estimated input
+tokens, taking a high quantile of the recent window so most rewrites still fit.
+Until CALIBRATE_AFTER rows have finished, every row gets the max budget
+(the old fixed behaviour). Rows cut by the budget (done_reason 'length') are
+left out of calibration and counted, so over-tight budgets are visible, and
+the scripts regenerate them once at the max budget (rerun_needed) rather
+than saving a truncated rewrite.
+"""
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+# ==================== CONFIGURATION ====================
+CHARS_PER_TOKEN = 4.0                 # Rough English average for llama-style tokenizers
+QUANTILE = 0.95                       # Ratio quantile used for the budget
+PADDING = 32                          # Extra tokens on top of the scaled estimate
+MIN_TOKENS = 64
+CALIBRATE_AFTER = 20                  # Finished rows needed before budgets kick in
+WINDOW = 200                          # Recent rows the ratio is taken from
+
+
+def estimate_tokens(text):
+    """Cheap input token estimate (no tokenizer needed)"""
+    return max(1, math.ceil(len(str(text)) / CHARS_PER_TOKEN))
+
+
+class TokenBudget:
+    """Input-aware num_predict with an output/input ratio learned from finished rows"""
+
+    def __init__(self, max_tokens, ratio=None, quantile=QUANTILE, padding=PADDING,
+                 min_tokens=MIN_TOKENS, calibrate_after=CALIBRATE_AFTER, window=WINDOW):
+        self.max_tokens = max_tokens
+        self.fixed_ratio = ratio              # Set to skip calibration entirely
+        self.quantile = quantile
+        self.padding = padding
+        self.min_tokens = min_tokens
+        self.calibrate_after = calibrate_after
+        self.ratios = deque(maxlen=window)
+        self.truncated = 0
+        self.reruns = 0
+        self.lock = threading.Lock()
+
+    def ratio(self):
+        """Current expansion ratio, or None while still calibrating"""
+        if self.fixed_ratio is not None:
+            return self.fixed_ratio
+        with self.lock:
+            if len(self.ratios) < self.calibrate_after:
+                return None
+            return float(np.quantile(self.ratios, self.quantile))
+
+    def budget(self, text):
+        """num_predict for this input"""
+        ratio = self.ratio()
+        if ratio is None:
+            return self.max_tokens
+        tokens = math.ceil(estimate_tokens(text) * ratio) + self.padding
+        return int(min(self.max_tokens, max(self.min_tokens, tokens)))
+
+    def options(self, text, options):
+        """Copy of the generate options with this row's num_predict"""
+        return dict(options, num_predict=self.budget(text))
+
+    def observe(self, text, response):
+        """Feed a finished (non-cached) response back into the calibration"""
+        tokens = response.get('eval_count')
+        if not tokens:
+            return
+        with self.lock:
+            if response.get('done_reason') == 'length':
+                self.truncated += 1
+                return
+            self.ratios.append(tokens / estimate_tokens(text))
+
+    def rerun_needed(self, response, num_predict):
+        """True if a reduced budget cut this response short - rerun it once at max_tokens"""
+        if response.get('done_reason') != 'length' or num_predict >= self.max_tokens:
+            return False
+        with self.lock:
+            self.reruns += 1
+        return True
+
+    def report(self):
+        ratio = self.ratio()
+        if ratio is None:
+            return f"Token budget: still calibrating ({len(self.ratios)}/{self.calibrate_after} rows)"
+        return (f"Token budget: {ratio:.2f}x input tokens + {self.padding} "
+                f"(p{self.quantile * 100:.0f} of output/input) | {self.truncated} rows hit their budget, "
+                f"{self.reruns} rerun at {self.max_tokens}")
@@ -0,0 +1,112 @@
+"""
+Model warm-up and keep-alive for long runs.
+
+check_ollama() only lists models, so without a warm-up the first real row
+pays the whole model load. warm_up() sends Ollama an empty prompt, which
+loads MODEL and pins it for keep_alive without generating anything.
+
+ModelKeeper then watches every response's load_duration: anything above
+RELOAD_ALERT_SECS means Ollama had unloaded the model and loaded it again
+mid-run. While requests are flowing each one renews keep_alive by itself;
+a background thread pings the model only when no request has gone out for
+a while (long backoffs, retries), so it is never unloaded between rows.
+"""
+import threading
+import time
+
+import ollama
+
+# ==================== CONFIGURATION ====================
+RELOAD_ALERT_SECS = 1.0               # load_duration above this counts as a reload
+PING_IDLE_SECS = 120                  # Ping the model after this long without a request
+
+
+def warm_up(model, keep_alive, client=None):
+    """Load `model` with an empty prompt; returns (wall seconds, load seconds)"""
+    start = time.time()
+    response = (client or ollama).generate(model=model, prompt='', keep_alive=keep_alive)
+    return time.time() - start, (response.get('load_duration') or 0) / 1e9
+
+
+class ModelKeeper:
+    """Tracks load_duration and time to first row, and keeps the model loaded while idle"""
+
+    def __init__(self, model, keep_alive, clients=None, alert_secs=RELOAD_ALERT_SECS,
+                 ping_idle=PING_IDLE_SECS, log=print):
+        self.model = model
+        self.keep_alive = keep_alive
+        self.clients = clients or [ollama]
+        self.alert_secs = alert_secs
+        self.ping_idle = ping_idle
+        self.log = log
+        self.started = time.time()
+        self.first_row = None
+        self.warmup_secs = 0.0
+        self.reloads = 0
+        self.load_secs = 0.0
+        self.last_request = time.time()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def warm_up(self):
+        """Load the model on every client before the first row"""
+        for client in self.clients:
+            wall, load = warm_up(self.model, self.keep_alive, client)
+            self.warmup_secs += wall
+            self.log(f"✓ Warm-up: {self.model} ready in {wall:.1f}s "
+                     f"(load {load:.1f}s, kept alive {self.keep_alive})")
+        self.last_request = time.time()
+
+    def record(self, response):
+        """Feed one real (non-cached) response; alerts if the model was reloaded"""
+        load = (response.get('load_duration') or 0) / 1e9
+        with self.lock:
+            self.last_request = time.time()
+            if load < self.alert_secs:
+                return
+            self.reloads += 1
+            self.load_secs += load
+        self.log(f"⚠ Model reloaded mid-run (load took {load:.1f}s) - "
+                 f"raise KEEP_ALIVE or check Ollama memory")
+
+    def row_done(self):
+        """Call when a row finishes; the first call fixes the time to first row"""
+        if self.first_row is None:
+            self.first_row = time.time() - self.started
+
+    def _ping_loop(self):
+        while not self.stop_event.wait(min(self.ping_idle / 4, 30)):
+            with self.lock:
+                idle = time.time() - self.last_request
+            if idle < self.ping_idle:
+                continue
+            for client in self.clients:
+                try:
+                    client.generate(model=self.model, prompt='', keep_alive=self.keep_alive)
+                except Exception as e:
+                    self.log(f"⚠ Keep-alive ping failed: {e}")
+            with self.lock:
+                self.last_request = time.time()
+
+    def start(self):
+        """Start the idle keep-alive thread"""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._ping_loop, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+            self.thread = None
+
+    def report(self):
+        lines = []
+        if self.first_row is not None:
+            lines.append(f"Time to first row: {self.first_row:.1f}s (warm-up {self.warmup_secs:.1f}s)")
+        if self.reloads:
+            lines.append(f"Model reloads mid-run: {self.reloads} ({self.load_secs:.1f}s spent loading)")
+        else:
+            lines.append("Model reloads mid-run: none")
+        return lines